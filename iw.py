@@ -6,17 +6,17 @@ cc = Client(logging=False, creds="./sample_export/config.json")
 
 did = cf['documentId']
 
-doc = cc.get_document(did).json()
+doc = cc.get_document(did)
 
 wid = doc['defaultWorkspace']['id']
 
-asses = cc.list_elements(did, wid, args={'elementType': 'ASSEMBLY'}).json()
+asses = cc.list_elements(did, wid, args={'elementType': 'ASSEMBLY'})
 
 aid = '617633ce069df90a46077e98'
 
-ass = cc.get_assembly(did, wid, aid).json()
+ass = cc.get_assembly(did, wid, aid)
 
-fes = cc.get_features(did, wid, aid).json()
+fes = cc.get_features(did, wid, aid)
 
 fs = fes['features']
 fss = fes['featureStates']
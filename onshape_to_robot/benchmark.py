@@ -0,0 +1,122 @@
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+import timeit
+
+import commentjson
+from colorama import Fore, Style
+
+from .onshape_api.replay import ReplayServer
+from .onshape_api import codec
+from . import onshape_to_robot
+
+
+def peakMemory():
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.uname().sysname == 'Darwin':
+        peak /= 1024
+    return peak / 1024.
+
+
+def benchmark(robot_folder_path, fixtures_dir, latency=0., bandwidth=None, throttle_rate=0.,
+              redirect=True, cold=False, seed=None):
+    '''
+    Runs the whole export of a robot against a replay of recorded API responses
+
+    Returns:
+        - dict: wall time (s), peak memory (MiB), requests and cache counters
+    '''
+
+    # Cold runs use an empty cache of their own, leaving the shared one as it is
+    cacheDir = tempfile.mkdtemp(prefix='onshape-to-robot-bench-') if cold else None
+
+    server = ReplayServer(fixtures_dir, latency=latency, bandwidth=bandwidth, throttle_rate=throttle_rate,
+                          redirect=redirect, seed=seed)
+    with server:
+        start = time.perf_counter()
+        try:
+            client = onshape_to_robot.export(robot_folder_path, base_url=server.url, cache_dir=cacheDir)
+            wallTime = time.perf_counter() - start
+        finally:
+            if cacheDir is not None:
+                shutil.rmtree(cacheDir, ignore_errors=True)
+
+    summary = client.metrics_summary(table=False)
+    requests = summary['requests'].values()
+    cache = summary['cache'].values()
+
+    return {
+        'wallTime': wallTime,
+        'peakMemory': peakMemory(),
+        'requests': sum(entry['count'] for entry in requests),
+        'retries': sum(entry['retries'] for entry in requests),
+        'redirects': sum(entry['redirects'] for entry in requests),
+        'errors': sum(entry['errors'] for entry in requests),
+        'bytes': sum(entry['bytes'] for entry in requests),
+        'cacheHits': sum(entry['hits'] for entry in cache),
+        'cacheMisses': sum(entry['misses'] for entry in cache),
+        'server': dict(server.stats),
+        'endpoints': summary['requests']
+    }
+
+
+def printReport(report):
+    print("\n" + Style.BRIGHT + "* Benchmark" + Style.RESET_ALL)
+    print('wall time: %.2f s' % report['wallTime'])
+    print('peak memory: %.1f MiB' % report['peakMemory'])
+    print('requests: %d (%d retries, %d redirects, %d errors), %.1f kB' % (
+        report['requests'], report['retries'], report['redirects'], report['errors'], report['bytes'] / 1024.))
+    print('cache: %d hits, %d misses' % (report['cacheHits'], report['cacheMisses']))
+    print('server: ' + ', '.join('%s %d' % item for item in report['server'].items()))
+    if report['server']['missing']:
+        print(Fore.YELLOW + 'WARNING: some requests had no recorded response' + Style.RESET_ALL)
+
+
+def writeReport(report, fileName):
+    with open(fileName, 'wb') as f:
+        f.write(codec.dumps_bytes(report))
+
+
+def codecBenchmark(fileName, repeat=20):
+    '''
+    Times the decoding and encoding of a (recorded) JSON payload, e.g. an assembly,
+    with the standard library, commentjson and the codec backend
+
+    Returns:
+        - dict: codec name -> {'loads': mean time (s), 'dumps': mean time (s)}
+    '''
+
+    with open(fileName, 'rb') as f:
+        data = f.read()
+    obj = codec.loads(data)
+
+    codecs = {
+        'json': (json.loads, json.dumps),
+        'commentjson': (lambda data: commentjson.loads(data.decode('utf-8')), commentjson.dumps),
+    }
+    if codec.backend != 'json':
+        codecs[codec.backend] = (codec.loads, codec.dumps_bytes)
+
+    report = {'bytes': len(data)}
+    for name, (loads, dumps) in codecs.items():
+        # commentjson is orders of magnitude slower, it is only run once
+        number = 1 if name == 'commentjson' else repeat
+        report[name] = {
+            'loads': timeit.timeit(lambda: loads(data), number=number) / number,
+            'dumps': timeit.timeit(lambda: dumps(obj), number=number) / number
+        }
+
+    return report
+
+
+def printCodecReport(report):
+    print(Style.BRIGHT + '* JSON codecs on %.1f kB (backend: %s)' % (report['bytes'] / 1024., codec.backend) +
+          Style.RESET_ALL)
+    print('%-12s %12s %12s' % ('codec', 'loads (ms)', 'dumps (ms)'))
+    for name, entry in report.items():
+        if name != 'bytes':
+            print('%-12s %12.2f %12.2f' % (name, 1000 * entry['loads'], 1000 * entry['dumps']))
@@ -1,4 +1,4 @@
-import json
+import commentjson as json
 import os
 import sys
 
@@ -67,6 +67,15 @@ def parse_config(robot_folder_path):
     config.checkField('simplifySTLs', 'no', valuesList=[
         'no', 'visual', 'collision', 'all'])
 
+    # Merged and simplified STLs of unchanged links are kept from the previous export
+    config.checkField('incrementalBuild', True)
+
+    # Parts STLs are hardlinks to the cache (they must not be edited)
+    config.checkField('hardlinkMeshes', False)
+
+    # Writes what the export resolved (microversions, parts) to robot.lock.json
+    config.checkField('lockFile', False)
+
     # Post-import commands to execute
     config.checkField('postImportCommands', [])
 
@@ -76,6 +85,40 @@ def parse_config(robot_folder_path):
     # Add collisions=true configuration on parts
     config.checkField('useCollisionsConfigurations', True)
 
+    # Maximum number of keep-alive connections kept open per API host
+    config.checkField('connectionPoolSize', 16)
+
+    # Requests pacing and retries when the API throttles or fails transiently
+    config.checkField('requestsPerSecond', None, hasDefault=True)
+    config.checkField('maxRetries', 5)
+
+    # Time (s) the host a request was redirected to is remembered, to go there directly
+    config.checkField('redirectCacheTtl', 300)
+
+    # JSON-lines file (relative to the output directory) receiving a record per request
+    config.checkField('requestsLog', None, hasDefault=True)
+
+    # Directory (relative to the output directory) where the API responses are recorded, for replays
+    config.checkField('recordDirectory', None, hasDefault=True)
+
+    # Directory of the cache, by default $ONSHAPE_TO_ROBOT_CACHE or the XDG cache directory
+    config.checkField('cacheDirectory', None, hasDefault=True)
+
+    # Size (MB) of the cache above which the least recently used entries are evicted
+    config.checkField('cacheMaxSize', None, hasDefault=True)
+
+    # URL of a cache server sharing the responses of versions and microversions
+    config.checkField('cacheServer', None, hasDefault=True)
+
+    # Number of parallel workers fetching the parts STLs, metadata and mass properties
+    config.checkField('prefetchWorkers', 8)
+
+    # Fetching metadata and mass properties of all the parts of a part studio at once
+    config.checkField('bulkPartsFetch', True)
+
+    # Building the parts meshes from the tessellation of whole part studios
+    config.checkField('useTessellation', False)
+
     # ROS support
     config.checkField('packageName', '')
     config.checkField('addDummyBaseLink', False)
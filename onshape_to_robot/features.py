@@ -5,14 +5,11 @@ joint_features = {}
 configuration_parameters = {}
 
 
-def init(client, config, root, workspaceId, assemblyId):
+def init(client, config, root, wvmId, assemblyId, wvm='w'):
     global configuration_parameters, joint_features
 
     # Load joint features to get limits later
-    if config['versionId'] == '':
-        joint_features = client.get_features( config['documentId'], workspaceId, assemblyId).json()
-    else:
-        joint_features = client.get_features( config['documentId'], config['versionId'], assemblyId, type='v').json()
+    joint_features = client.get_features(config['documentId'], wvmId, assemblyId, type=wvm)
 
     # Retrieving root configuration parameters
     configuration_parameters = {}
@@ -1,4 +1,5 @@
 import math
+import os
 import uuid
 from sys import exit
 
@@ -7,42 +8,102 @@ import numpy as np
 
 from .features import init as features_init, getLimits
 from .onshape_api.client import Client
+from .onshape_api.onshape import OnshapeError
+from .onshape_api.metrics import JsonLinesSink
 from .config import parse_config
+from .lockfile import readLockFile, lockedParts
 
-def load_rob(robot_folder_path):
+def load_rob(robot_folder_path, base_url=None, cache_dir=None, locked=False):
     config = parse_config(robot_folder_path)
 
-    client = Client(logging=False, creds=config['configPath'])
+    if cache_dir is None and config['cacheDirectory'] is not None:
+        cache_dir = os.path.join(config['outputDirectory'], os.path.expanduser(config['cacheDirectory']))
+
+    record_dir = None
+    # Replays are not recorded again
+    if config['recordDirectory'] is not None and base_url is None:
+        record_dir = os.path.join(config['outputDirectory'], config['recordDirectory'])
+
+    client = Client(
+        logging=False,
+        creds=config['configPath'],
+        pool_maxsize=config['connectionPoolSize'],
+        requests_per_second=config['requestsPerSecond'],
+        max_retries=config['maxRetries'],
+        redirect_ttl=config['redirectCacheTtl'],
+        base_url=base_url,
+        record_dir=record_dir,
+        cache_dir=cache_dir,
+        cache_max_size=None if config['cacheMaxSize'] is None else int(config['cacheMaxSize'] * 1024 * 1024),
+        cache_server=config['cacheServer'])
     client.useCollisionsConfigurations = config['useCollisionsConfigurations']
+    client.useTessellation = config['useTessellation']
+    if config['requestsLog'] is not None:
+        client.add_metrics_sink(JsonLinesSink(os.path.join(config['outputDirectory'], config['requestsLog'])))
 
     document_id = config['documentId']
-    document = client.get_document(document_id).json()
-
-    # TODO: for now just use the default workspace, more functionality can be added later
-    workspace_id = document['defaultWorkspace']['id']
-
-    # get the elements json?
-    # print("\n" + Style.BRIGHT + '* Retrieving elements in the document, searching for the assembly...' + Style.RESET_ALL)
-    # if config['versionId'] != '':
-    #     elements = client.list_elements(document_id, config['versionId'], 'v').json()
-    # else:
-    # TODO: add options for specifying a version (as was removed and is commented above, but the client function was changed)
-    assemblies = client.list_elements(document_id, workspace_id, args={'elementType': 'ASSEMBLY'}).json()
-
-    # TODO: add other options for specifying the assembly aside from the name
-    assembly_id = None
-    assembly_name = None
-    for assembly in assemblies:
-        if assembly['name'] == config['assemblyName']:
-            assembly_id = assembly['id']
-            assembly_name = assembly['name']
-            break
-    if not assembly_id:
-        raise Exception("ERROR: Unable to find assembly of the given name in this document (this is currently the only way to specify the assembly).")
+
+    # The document state is identified by a version (immutable), or by the current
+    # microversion of the workspace, so that everything below can be cached
+    workspace_id = None
+    if locked:
+        # Replaying the state resolved by a previous export (see lockfile), the
+        # assembly and features then come from the cache
+        lock = readLockFile(config['outputDirectory'], config)
+        print(Style.BRIGHT + '* Using the state of the document recorded in the lockfile' + Style.RESET_ALL)
+        if lock['versionId'] is not None:
+            wvm, wvm_id = 'v', lock['versionId']
+        else:
+            wvm, wvm_id = 'm', lock['microversion']
+        workspace_id = lock['workspaceId']
+    elif config['versionId'] != '':
+        wvm, wvm_id = 'v', config['versionId']
+    else:
+        workspace_id = config['workspaceId']
+        if workspace_id == '':
+            # The default workspace of the document is taken from the cache when possible
+            document = client.get_document(document_id, revalidate=False)
+            workspace_id = document['defaultWorkspace']['id']
+        try:
+            microversion_id = client.get_current_microversion(document_id, workspace_id)
+        except OnshapeError as error:
+            if config['workspaceId'] != '' or error.status not in (403, 404):
+                raise
+            # The cached default workspace may be outdated
+            document = client.get_document(document_id)
+            workspace_id = document['defaultWorkspace']['id']
+            microversion_id = client.get_current_microversion(document_id, workspace_id)
+        wvm, wvm_id = 'm', microversion_id
+
+    if locked:
+        assembly_id = lock['assemblyId']
+        assembly_name = lock['assemblyName']
+    else:
+        assemblies = client.list_elements(document_id, wvm_id, wvm, args={'elementType': 'ASSEMBLY'})
+
+        # TODO: add other options for specifying the assembly aside from the name
+        assembly_id = None
+        assembly_name = None
+        for assembly in assemblies:
+            if assembly['name'] == config['assemblyName']:
+                assembly_id = assembly['id']
+                assembly_name = assembly['name']
+                break
+        if not assembly_id:
+            raise Exception("ERROR: Unable to find assembly of the given name in this document (this is currently the only way to specify the assembly).")
+
+    # What was resolved, recorded in the lockfile
+    config['resolved'] = {
+        'workspaceId': workspace_id,
+        'versionId': wvm_id if wvm == 'v' else None,
+        'microversion': wvm_id if wvm == 'm' else None,
+        'assemblyId': assembly_id,
+        'assemblyName': assembly_name
+    }
 
     # Retrieving the assembly
     print("\n" + Style.BRIGHT + '* Retrieving assembly "' + assembly_name + '" with id ' + assembly_id + Style.RESET_ALL)
-    assembly = client.get_assembly(document_id, workspace_id, assembly_id).json()
+    assembly = client.get_assembly(document_id, wvm_id, assembly_id, wvm)
 
     root = assembly['rootAssembly']
 
@@ -100,7 +161,7 @@ def load_rob(robot_folder_path):
                 occurrences[occurrence_path]['assignation'] = parent
 
 
-    features_init(client, config, root, workspace_id, assembly_id)
+    features_init(client, config, root, wvm_id, assembly_id, wvm)
 
     # First, features are scanned to find the DOFs. Links that they connects
     # are then tagged
@@ -326,5 +387,9 @@ def load_rob(robot_folder_path):
 
 
     tree = collect(trunk)
+
+    if locked and lockedParts(occurrences) != lock['parts']:
+        print(Fore.YELLOW + 'WARNING: the parts of the assembly differ from the ones of the lockfile' +
+              Style.RESET_ALL)
     
     return config, client, tree, occurrences, frames
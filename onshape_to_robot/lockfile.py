@@ -0,0 +1,64 @@
+import json
+import os
+
+fileName = 'robot.lock.json'
+version = 1
+
+
+def lockedParts(occurrences):
+    # (documentId, microversion, elementId, partId, configuration) of the parts of the assembly
+    parts = set()
+    for occurrence in occurrences.values():
+        part = occurrence['instance']
+        if part is not None and part['type'] == 'Part' and not part['suppressed']:
+            parts.add((part['documentId'], part['documentMicroversion'], part['elementId'], part['partId'],
+                       part['configuration']))
+    return [list(part) for part in sorted(parts)]
+
+
+def writeLockFile(directory, config, resolved, occurrences):
+    '''
+    Records what an export resolved: the document, workspace or version, the
+    microversion and assembly that were read, and the parts used
+    '''
+
+    lock = {
+        'version': version,
+        'documentId': config['documentId'],
+        'workspaceId': resolved['workspaceId'],
+        'versionId': resolved['versionId'],
+        'microversion': resolved['microversion'],
+        'assemblyId': resolved['assemblyId'],
+        'assemblyName': resolved['assemblyName'],
+        'parts': lockedParts(occurrences)
+    }
+
+    path = os.path.join(directory, fileName)
+    # Indented, so that it can be versioned along with the robot
+    with open(path + '.tmp', 'w') as f:
+        json.dump(lock, f, indent=2)
+        f.write('\n')
+    os.replace(path + '.tmp', path)
+
+
+def readLockFile(directory, config):
+    '''
+    Reads the lockfile written by a previous export, that has to match the
+    document and assembly of the config
+
+    Returns:
+        - dict: Content of the lockfile
+    '''
+
+    path = os.path.join(directory, fileName)
+    if not os.path.exists(path):
+        raise Exception('ERROR: No ' + fileName + ' in ' + directory + ', export once with lockFile enabled')
+
+    with open(path) as f:
+        lock = json.load(f)
+    if lock.get('version') != version:
+        raise Exception('ERROR: Unsupported ' + fileName + ' version, export again without --locked')
+    if lock['documentId'] != config['documentId'] or lock['assemblyName'] != config['assemblyName']:
+        raise Exception('ERROR: ' + fileName + ' doesn\'t match the document or assembly of config.json, '
+                        'export again without --locked')
+    return lock
@@ -0,0 +1,76 @@
+import hashlib
+import os
+
+from .onshape_api import codec
+
+
+def fingerprint(data):
+    # Fingerprint of JSON-serializable data
+    return hashlib.sha256(codec.dumps_bytes(data)).hexdigest()
+
+
+class BuildManifest:
+    """
+    Records, in the output directory, the fingerprint of the inputs of each link
+    and the files that were produced for it, so that the merged (and simplified)
+    meshes of unchanged links are not produced again, and the cached files the
+    parts meshes were materialized from (see materialize)
+    """
+
+    fileName = '.onshape_to_robot_build.json'
+    version = 1
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.links = {}
+        self.materializedFiles = {}
+        path = os.path.join(directory, self.fileName)
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    data = codec.loads(f.read())
+                if data.get('version') == self.version:
+                    self.links = data['links']
+                    self.materializedFiles = data.get('materialized', {})
+            except ValueError:
+                pass
+
+    def fileStat(self, fileName):
+        stat = os.stat(os.path.join(self.directory, fileName))
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def unchanged(self, link, linkFingerprint, fileName):
+        # The file was produced from the same inputs, and wasn't touched since
+        entry = self.links.get(link)
+        if entry is None or entry['fingerprint'] != linkFingerprint or fileName not in entry['files']:
+            return False
+        try:
+            return self.fileStat(fileName) == entry['files'][fileName]
+        except FileNotFoundError:
+            return False
+
+    def record(self, link, linkFingerprint, fileName):
+        entry = self.links.get(link)
+        if entry is None or entry['fingerprint'] != linkFingerprint:
+            entry = self.links[link] = {'fingerprint': linkFingerprint, 'files': {}}
+        entry['files'][fileName] = self.fileStat(fileName)
+
+    def materialized(self, fileName, source):
+        # The file is a copy of source, and wasn't touched since
+        entry = self.materializedFiles.get(fileName)
+        if entry is None or entry['source'] != source:
+            return False
+        try:
+            return self.fileStat(fileName) == entry['stat']
+        except FileNotFoundError:
+            return False
+
+    def recordMaterialized(self, fileName, source):
+        self.materializedFiles[fileName] = {'source': source, 'stat': self.fileStat(fileName)}
+
+    def save(self):
+        path = os.path.join(self.directory, self.fileName)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(codec.dumps_bytes({'version': self.version, 'links': self.links,
+                                       'materialized': self.materializedFiles}))
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,89 @@
+import filecmp
+import os
+import shutil
+import sys
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl cloning a file on copy-on-write filesystems (btrfs, xfs...), from linux/fs.h
+FICLONE = 0x40049409
+
+
+def reflink(source, destination):
+    # Shares the extents of the source, without copying the data
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return True
+        except OSError:
+            return False
+
+
+def copyRange(source, destination):
+    # Copies in the kernel, without going through Python memory
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        try:
+            while os.copy_file_range(src.fileno(), dst.fileno(), 1 << 30):
+                pass
+            return True
+        except OSError:
+            return False
+
+
+def hardlink(source, destination):
+    try:
+        os.link(source, destination)
+        return True
+    except OSError:
+        return False
+
+
+def identical(source, destination):
+    try:
+        if os.path.samefile(source, destination):
+            return True
+        return filecmp.cmp(source, destination, shallow=False)
+    except FileNotFoundError:
+        return False
+
+
+def materialize(source, directory, fileName, link=False, manifest=None):
+    '''
+    Puts a copy of a (read-only) cached file in the output directory, by hardlink
+    (when link is True), reflink or in-kernel copy, falling back to a regular
+    copy (shutil.copyfile, which uses sendfile where available). Nothing is
+    written if the file already has the same content: the build manifest, if
+    given, records the files that were materialized so that unchanged ones
+    aren't even read again.
+
+    Returns:
+        - bool: Whether the file was written
+    '''
+
+    destination = os.path.join(directory, fileName)
+    if manifest is not None and manifest.materialized(fileName, source):
+        return False
+
+    if not identical(source, destination):
+        # Written next to the destination and renamed, so that it is never partial
+        tmpFileName = destination + '.tmp'
+        if os.path.exists(tmpFileName):
+            os.remove(tmpFileName)
+        if not ((link and hardlink(source, tmpFileName)) or reflink(source, tmpFileName)
+                or copyRange(source, tmpFileName)):
+            shutil.copyfile(source, tmpFileName)
+        os.replace(tmpFileName, destination)
+        written = True
+    else:
+        written = False
+
+    if manifest is not None:
+        manifest.recordMaterialized(fileName, source)
+    return written
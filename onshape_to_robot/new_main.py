@@ -11,13 +11,13 @@ client = Client(logging=False, creds=config['configPath'])
 client.useCollisionsConfigurations = config['useCollisionsConfigurations']
 
 document_id = config['documentId']
-document = client.get_document(document_id).json()
+document = client.get_document(document_id)
 
 # TODO: for now just use the default workspace, more functionality can be added later
 workspace_id = document['defaultWorkspace']['id']
 
 # TODO: add options for specifying a version (as was removed and it used to be commented above (enjoy lol :D), but the client function was changed)
-assemblies = client.list_elements(document_id, workspace_id, args={'elementType': 'ASSEMBLY'}).json()
+assemblies = client.list_elements(document_id, workspace_id, args={'elementType': 'ASSEMBLY'})
 
 # TODO: add other options for specifying the assembly aside from the name
 assembly_id = None
@@ -32,7 +32,7 @@ if not assembly_id:
 
 # Retrieving the assembly
 # print("\n" + Style.BRIGHT + '* Retrieving assembly "' + assembly_name + '" with id ' + assembly_id + Style.RESET_ALL)
-assembly = client.get_assembly(document_id, workspace_id, assembly_id).json()
+assembly = client.get_assembly(document_id, workspace_id, assembly_id)
 root_ass = assembly['rootAssembly']
 
 # REVISE: I think we can pretty much say all occurences become links
@@ -50,7 +50,7 @@ for occ_i, occ in enumerate(occurrences):
         else:
             raise Exception('There should be exactly 1 fixed occurrence, found multiple.')
 
-feature_data = client.get_features(document_id, workspace_id, assembly_id).json()
+feature_data = client.get_features(document_id, workspace_id, assembly_id)
 features = feature_data['features']
 feature_states = feature_data['featureStates']
 
@@ -8,4 +8,4 @@ Demonstrates usage of API keys for the Onshape REST API
 __copyright__ = 'Copyright (c) 2016 Onshape, Inc.'
 __license__ = 'All rights reserved.'
 __title__ = 'onshape_api'
-__all__ = ['onshape', 'client', 'utils']
+__all__ = ['onshape', 'client', 'async_client', 'utils']
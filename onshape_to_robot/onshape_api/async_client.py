@@ -0,0 +1,627 @@
+'''
+async_client
+============
+
+asyncio counterpart of the Client, for embedding the exporter in async services
+'''
+
+from .onshape import Onshape, OnshapeError
+from .scheduler import RETRY_STATUSES, FAILED, status_outcome
+from .client import args_key, collisions_configuration
+from .cache import CacheStore, default_cache_dir
+from .remote_cache import HttpCache, TieredCache
+from .client import double_escape_slash, escape_slash
+from . import utils
+from . import codec
+
+from colorama import Fore, Style
+import asyncio
+import contextlib
+import hashlib
+import os
+import threading
+import time
+import urllib
+from urllib.parse import urlparse
+from urllib.parse import parse_qs
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+__all__ = [
+    'AsyncClient'
+]
+
+
+class AsyncClient():
+    '''
+    Coroutine version of the Client methods used for the export.
+
+    Requests are signed the same way as the blocking client, paced and retried
+    by the same scheduler (see scheduler.RequestScheduler), and share the same
+    on-disk cache. Identical requests issued concurrently are only sent once,
+    all the callers awaiting the same result.
+
+    Attributes:
+        - stack (str, default='https://cad.onshape.com'): Base URL
+        - logging (bool, default=True): Turn logging on or off
+        - max_connections (int, default=100): Maximum number of simultaneous connections
+    '''
+
+    def __init__(
+            self,
+            stack='https://cad.onshape.com',
+            logging=True,
+            creds='./config.json',
+            max_connections=100,
+            requests_per_second=None,
+            max_retries=5,
+            cache_dir=None,
+            cache_max_size=None,
+            cache_server=None):
+        '''
+        Instantiates a new asynchronous Onshape client.
+
+        Args:
+            - stack (str, default='https://cad.onshape.com'): Base URL
+            - logging (bool, default=True): Turn logging on or off
+            - creds (str, default='./config.json'): Credentials location
+            - max_connections (int, default=100): Maximum number of simultaneous connections
+            - requests_per_second (float, default=None): Requests budget shared by all callers, None for no limit
+            - max_retries (int, default=5): Number of retries of throttled or failed requests
+            - cache_dir (str, default=None): Directory of the cache, see cache.default_cache_dir
+            - cache_max_size (int, default=None): Size (bytes) above which the least recently used entries are evicted
+            - cache_server (str, default=None): URL of a cache server (see remote_cache.CacheServer) sharing the
+              entries of versions and microversions
+        '''
+
+        if aiohttp is None:
+            raise ImportError(
+                'AsyncClient requires aiohttp, install it with: pip install onshape-to-robot[async]')
+
+        # The blocking API object is only used for credentials, request signing
+        # and its scheduler
+        self._api = Onshape(
+            stack=stack,
+            logging=logging,
+            creds=creds,
+            pool_maxsize=max_connections,
+            requests_per_second=requests_per_second,
+            max_retries=max_retries)
+        self._scheduler = self._api._scheduler
+        self._logging = logging
+        self._max_connections = max_connections
+        self._session = None
+        self._inflight = {}
+        # Parts indexes, see get_parts_index
+        self._parts_indexes = {}
+        self._cache = CacheStore(cache_dir or default_cache_dir(), cache_max_size)
+        if cache_server is not None:
+            self._cache = TieredCache(self._cache, HttpCache(cache_server))
+        # The entries used since then are kept when the cache is trimmed
+        self._started = time.time()
+        self.useCollisionsConfigurations = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        '''
+        Closes the underlying HTTP session, and trims the cache (see Client.trim_cache)
+        '''
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await asyncio.to_thread(self._cache.flush)
+        await asyncio.to_thread(self._cache.trim, self._started)
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections))
+        return self._session
+
+    async def _single_flight(self, key, coroutine_function):
+        '''
+        Runs coroutine_function() once for all the concurrent callers using the same key
+
+        Args:
+            - key (hashable): Identifies the work
+            - coroutine_function (callable): Returns the coroutine to run
+
+        Returns:
+            - The result of the coroutine
+        '''
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_function())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shielding, so that one caller being cancelled doesn't cancel the
+        # request for the others
+        return await asyncio.shield(task)
+
+    async def request(self, method, path, query={}, headers={}, body={}, base_url=None, fileName=None):
+        '''
+        Issues a request to Onshape
+
+        Args:
+            - method (str): HTTP method
+            - path (str): Path  e.g. /api/documents/:id
+            - query (dict, default={}): Query params in key-value pairs
+            - headers (dict, default={}): Key-value pairs of headers
+            - body (dict, default={}): Body for POST request
+            - base_url (str, default=None): Host, including scheme and port (if different from creds file)
+            - fileName (str, default=None): If set, the body is streamed to this file instead
+
+        Returns:
+            - bytes: Content of the response (or fileName if it was set)
+        '''
+
+        _, _, content = await self._fetch(method, path, query, headers, body, base_url, fileName)
+        return content
+
+    async def _acquire(self):
+        '''
+        Takes a slot of the scheduler without blocking the event loop. If the task is
+        cancelled, no slot is kept.
+        '''
+
+        loop = asyncio.get_running_loop()
+        released = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(released.set)
+
+        self._scheduler.add_waiter(wake)
+        try:
+            while True:
+                released.clear()
+                wait = self._scheduler.try_acquire()
+                if wait == 0:
+                    break
+                try:
+                    await asyncio.wait_for(released.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._scheduler.remove_waiter(wake)
+
+        try:
+            delay = self._scheduler.pace()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._scheduler.release(FAILED)
+            raise
+
+    async def _send(self, method, url, path, query, headers, body):
+        '''
+        Sends a request through the scheduler, retrying it when the API throttles
+        or fails transiently (see Onshape._send)
+
+        Returns:
+            - aiohttp.ClientResponse: Response, whose body is left unread
+        '''
+
+        attempt = 0
+        while True:
+            # Signing again on each attempt, since the nonce can't be reused
+            req_headers = self._api._make_headers(method, path, query, headers)
+
+            await self._acquire()
+            # Any other error (or the task being cancelled) also gives the slot back
+            outcome = FAILED
+            res = None
+            try:
+                res = await self._get_session().request(
+                    method,
+                    url,
+                    headers=req_headers,
+                    data=body,
+                    allow_redirects=False)
+                outcome = status_outcome(res.status)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                if attempt >= self._scheduler.max_retries:
+                    raise OnshapeError('Error while using OnShape API: ' + str(error), url)
+                reason = str(error)
+            finally:
+                self._scheduler.release(outcome)
+
+            if res is None:
+                delay = self._scheduler.retry_delay(attempt)
+            else:
+                if res.status not in RETRY_STATUSES or attempt >= self._scheduler.max_retries:
+                    return res
+                reason = 'status ' + str(res.status)
+                delay = self._scheduler.retry_delay(attempt, res.headers.get('Retry-After'))
+                # Releases the connection to the pool
+                res.release()
+
+            print(Fore.YELLOW + 'WARNING: OnShape API request failed (' + reason + '), retrying in ' +
+                  ('%.1f' % delay) + 's' + Style.RESET_ALL)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _fetch(self, method, path, query={}, headers={}, body={}, base_url=None, fileName=None):
+        '''
+        Same as request, also giving the status and headers of the response (a
+        304 Not Modified answer to a conditional request has no content)
+
+        Returns:
+            - tuple: (status, headers, content)
+        '''
+
+        if base_url is None:
+            base_url = self._api._url
+        url = base_url + path + '?' + urllib.parse.urlencode(query)
+
+        if self._logging:
+            utils.log('request url: ' + url)
+
+        body = codec.dumps(body) if isinstance(body, dict) else body
+
+        res = await self._send(method, url, path, query, headers, body)
+        async with res:
+            if res.status == 307:
+                location = urlparse(res.headers['Location'])
+                querystring = parse_qs(location.query)
+
+                if self._logging:
+                    utils.log('request redirected to: ' + location.geturl())
+
+                new_query = {}
+                new_base_url = location.scheme + '://' + location.netloc
+
+                for key in querystring:
+                    # won't work for repeated query params
+                    new_query[key] = querystring[key][0]
+            elif res.status == 304:
+                return res.status, res.headers, b''
+            elif not 200 <= res.status <= 206:
+                text = await res.text()
+                raise OnshapeError(
+                    'ERROR (' + str(res.status) + ') while using OnShape API' +
+                    ('\n! ' + text if text else ''),
+                    url,
+                    res.status)
+            elif fileName is not None:
+                await self._write_stream(fileName, res)
+                return res.status, res.headers, fileName
+            else:
+                return res.status, res.headers, await res.read()
+
+        return await self._fetch(
+            method,
+            location.path,
+            query=new_query,
+            headers=headers,
+            base_url=new_base_url,
+            fileName=fileName)
+
+    async def _write_stream(self, fileName, res, chunk_size=1 << 16):
+        # Same as client.cache_write_stream: temporary file, length check and rename
+        tmpFileName = fileName + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.' + str(id(res))
+        length = 0
+        try:
+            with open(tmpFileName, 'wb') as f:
+                async for chunk in res.content.iter_chunked(chunk_size):
+                    f.write(chunk)
+                    length += len(chunk)
+
+            expected = res.headers.get('Content-Length')
+            if expected is not None and 'Content-Encoding' not in res.headers \
+                    and int(expected) != length:
+                raise OnshapeError('Incomplete download, got ' + str(length) + ' bytes out of ' + expected,
+                                   str(res.url), res.status)
+
+            os.replace(tmpFileName, fileName)
+        finally:
+            if os.path.exists(tmpFileName):
+                os.remove(tmpFileName)
+
+    @contextlib.asynccontextmanager
+    async def _entry_lock(self, method, key):
+        '''
+        Holds CacheStore.lock on an entry, across threads and processes, waiting for
+        it in a thread. If the task is cancelled while waiting, the lock is released
+        as soon as the thread gets it.
+        '''
+
+        lock = self._cache.lock(method, key)
+        acquired = asyncio.ensure_future(asyncio.to_thread(lock.__enter__))
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            acquired.add_done_callback(
+                lambda future: future.exception() is None and lock.__exit__(None, None, None))
+            raise
+        try:
+            yield
+        finally:
+            lock.__exit__(None, None, None)
+
+    async def cache_get(self, method, key, callback, isString=False):
+        '''
+        Gets an entry from the on-disk cache shared with the blocking Client,
+        fetching it with the callback coroutine if it's missing
+        '''
+
+        async def fill():
+            result = await asyncio.to_thread(self._cache.get, method, key)
+            if result is None:
+                # Another thread or process may be filling the same entry
+                async with self._entry_lock(method, key):
+                    result = await asyncio.to_thread(self._cache.get, method, key)
+                    if result is None:
+                        result = await callback()
+                        await asyncio.to_thread(self._cache.put, method, key, result)
+            return result
+
+        result = await self._single_flight(('cache', method, key), fill)
+        if isString and isinstance(result, bytes):
+            result = result.decode('utf-8')
+        return result
+
+    async def cache_get_file(self, method, key, callback):
+        '''
+        Same as cache_get, but callback(fileName) streams the response to the
+        entry, whose path is returned
+        '''
+
+        async def fill():
+            fileName = await asyncio.to_thread(self._cache.path, method, key)
+            if fileName is None:
+                async with self._entry_lock(method, key):
+                    fileName = await asyncio.to_thread(self._cache.path, method, key)
+                    if fileName is None:
+                        tmpFileName = self._cache.temp_file_name()
+                        await callback(tmpFileName)
+                        fileName = await asyncio.to_thread(self._cache.put_raw_file, method, key, tmpFileName)
+            return fileName
+
+        return await self._single_flight(('cache', method, key), fill)
+
+    async def cache_revalidate(self, method, key, callback):
+        '''
+        Same as Client.cache_revalidate: the cached response is sent back with its
+        validators, and kept if the API answers 304 Not Modified
+
+        Args:
+            - method (str): Name of the cached call
+            - key (str or tuple): Key of the entry
+            - callback (callable): Returns the coroutine issuing the request (see _fetch), given the
+              conditional headers
+
+        Returns:
+            - bytes: Content of the response
+        '''
+
+        async def fill():
+            result, validators = await asyncio.to_thread(self._cache.get, method, key, True)
+            validators = validators or {}
+
+            headers = {}
+            if 'etag' in validators:
+                headers['If-None-Match'] = validators['etag']
+            if 'lastModified' in validators:
+                headers['If-Modified-Since'] = validators['lastModified']
+
+            status, res_headers, content = await callback(headers)
+            if status == 304 and result is not None:
+                return result
+
+            validators = {}
+            if 'ETag' in res_headers:
+                validators['etag'] = res_headers['ETag']
+            if 'Last-Modified' in res_headers:
+                validators['lastModified'] = res_headers['Last-Modified']
+            await asyncio.to_thread(self._cache.put, method, key, content, validators)
+            return content
+
+        return await self._single_flight(('cache', method, key), fill)
+
+    async def cache_wvm(self, method, key, type, callback):
+        '''
+        Same as Client.cache_wvm: versions and microversions are cached for good,
+        workspaces are revalidated
+        '''
+
+        if type in ('v', 'm'):
+            async def invoke():
+                _, _, content = await callback({})
+                return content
+
+            return await self.cache_get(method, key, invoke)
+        return await self.cache_revalidate(method, key, callback)
+
+#-------------------------------------------------------------------------------
+
+    async def get_assembly(self, did, wid, eid, type='w', configuration='default', args={}):
+        '''
+        Gets the assembly definition, see Client.get_assembly
+
+        Returns:
+            - dict: Decoded assembly
+        '''
+
+        def invoke(headers):
+            return self._fetch(
+                'get',
+                '/api/assemblies/d/' + did + '/' + type + '/' + wid + '/e/' + eid,
+                query={
+                    'includeMateFeatures': 'true',
+                    'includeMateConnectors': 'true',
+                    'includeNonSolids': 'true',
+                    'configuration': configuration} | args,
+                headers=headers)
+
+        return codec.loads(
+            await self.cache_wvm(
+                'assembly',
+                (did, type, wid, eid, configuration, args_key(args)),
+                type,
+                invoke))
+
+    async def get_features(self, did, wid, eid, type='w', args={}):
+        '''
+        Gets the feature list of an assembly, see Client.get_features
+
+        Returns:
+            - dict: Decoded features
+        '''
+
+        def invoke(headers):
+            return self._fetch(
+                'get',
+                '/api/assemblies/d/' + did + '/' + type + '/' + wid + '/e/' + eid + '/features',
+                query=args,
+                headers=headers)
+
+        return codec.loads(
+            await self.cache_wvm(
+                'features',
+                (did, type, wid, eid, args_key(args)),
+                type,
+                invoke))
+
+    async def get_parts(self, did, mid, eid, configuration):
+        def invoke():
+            return self.request(
+                'get',
+                '/api/parts/d/' + did + '/m/' + mid + '/e/' + eid,
+                query={'configuration': configuration})
+
+        return codec.loads(
+            await self.cache_get(
+                'parts_list',
+                (did, mid, eid, configuration),
+                invoke))
+
+    async def get_parts_index(self, did, mid, eid, configuration):
+        '''
+        Indexes the parts list of an element, see Client.get_parts_index
+
+        Returns:
+            - dict: {'byId': partId -> name, 'byName': name -> partId}
+        '''
+
+        key = ('parts_index', did, mid, eid, configuration)
+
+        async def build():
+            index = {'byId': {}, 'byName': {}}
+            for entry in await self.get_parts(did, mid, eid, configuration):
+                index['byId'][entry['partId']] = entry['name']
+                index['byName'].setdefault(entry['name'], entry['partId'])
+            self._parts_indexes[key] = index
+            return index
+
+        if key in self._parts_indexes:
+            return self._parts_indexes[key]
+        return await self._single_flight(key, build)
+
+    async def find_new_partid(
+            self,
+            did,
+            mid,
+            eid,
+            partid,
+            configuration_before,
+            configuration):
+        name = (await self.get_parts_index(did, mid, eid, configuration_before))['byId'].get(partid)
+
+        if name is not None:
+            after = (await self.get_parts_index(did, mid, eid, configuration))['byName']
+            if name in after:
+                return after[name]
+        else:
+            print("OnShape ERROR: Can't find new partid for " + str(partid))
+
+        return partid
+
+    def hash_partid(self, data):
+        m = hashlib.sha1()
+        m.update(data.encode('utf-8'))
+        return m.hexdigest()
+
+    async def part_studio_stl_m(
+            self,
+            did,
+            mid,
+            eid,
+            partid,
+            configuration='default'):
+        if self.useCollisionsConfigurations:
+            configuration_before = configuration
+            configuration, partIdChanged = collisions_configuration(configuration)
+
+            if partIdChanged:
+                partid = await self.find_new_partid(
+                    did, mid, eid, partid, configuration_before, configuration)
+
+        def invoke(fileName):
+            return self.request(
+                'get',
+                '/api/parts/d/' + did + '/m/' + mid + '/e/' + eid +
+                '/partid/' + escape_slash(partid) + '/stl',
+                query={
+                    'mode': 'binary',
+                    'units': 'meter',
+                    'configuration': configuration},
+                headers={'Accept': 'application/vnd.onshape.v1+octet-stream'},
+                fileName=fileName)
+
+        return await self.cache_get_file(
+            'part_stl',
+            (did, mid, eid, self.hash_partid(partid), configuration),
+            invoke)
+
+    async def part_get_metadata(
+            self,
+            did,
+            mid,
+            eid,
+            partid,
+            configuration='default'):
+        def invoke():
+            return self.request(
+                'get',
+                '/api/parts/d/' + did + '/m/' + mid + '/e/' + eid +
+                '/partid/' + double_escape_slash(partid) + '/metadata',
+                query={'configuration': configuration})
+
+        return codec.loads(
+            await self.cache_get(
+                'metadata',
+                (did, mid, eid, self.hash_partid(partid), configuration),
+                invoke,
+                True))
+
+    async def part_mass_properties(
+            self,
+            did,
+            mid,
+            eid,
+            partid,
+            configuration='default'):
+        def invoke():
+            return self.request(
+                'get',
+                '/api/parts/d/' + did + '/m/' + mid + '/e/' + eid +
+                '/partid/' + escape_slash(partid) + '/massproperties',
+                query={'configuration': configuration})
+
+        return codec.loads(
+            await self.cache_get(
+                'massproperties',
+                (did, mid, eid, self.hash_partid(partid), configuration),
+                invoke,
+                True))
@@ -0,0 +1,1142 @@
+'''
+cache
+=====
+
+On-disk cache of the API responses: content-addressed blobs, indexed in SQLite
+'''
+
+from . import codec
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = [
+    'CacheBackend',
+    'CacheStore',
+    'default_cache_dir'
+]
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        raw_size INTEGER,
+        compression TEXT,
+        copy_size INTEGER
+    )''',
+    '''CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        hash TEXT NOT NULL,
+        endpoint TEXT NOT NULL,
+        document TEXT,
+        meta TEXT,
+        created REAL NOT NULL,
+        last_access REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash)',
+    'CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)'
+]
+
+# Columns added to the tables of the caches written by previous versions
+MIGRATIONS = [
+    ('blobs', 'raw_size', 'INTEGER'),
+    ('blobs', 'compression', 'TEXT'),
+    ('blobs', 'copy_size', 'INTEGER')
+]
+
+# Size of the blobs and of their decompressed copies
+TOTAL_SIZE = 'SELECT COALESCE(SUM(size), 0) + COALESCE(SUM(copy_size), 0) FROM blobs'
+
+# Format of the index keys (PRAGMA user_version), see entry_key
+KEY_VERSION = 1
+
+# Compression of the entries, per endpoint (None to store them raw), the others
+# use zstd if available. The compressed entries used as files, such as the
+# meshes, get a decompressed copy (see CacheStore.raw_copy)
+COMPRESSION = {}
+DEFAULT_COMPRESSION = 'zlib' if zstandard is None else 'zstd'
+CODEC_ERRORS = (zlib.error,) if zstandard is None else (zlib.error, zstandard.ZstdError)
+
+# Resolution (s) of the last access times: hits only write the index when the
+# recorded access is older than this
+ACCESS_GRANULARITY = 60.
+
+# Last access age buckets of the stats, (label, maximum age in seconds)
+AGES = [
+    ('< 1 day', 86400),
+    ('< 1 week', 7 * 86400),
+    ('< 1 month', 30 * 86400),
+    ('older', None)
+]
+
+
+def default_cache_dir():
+    '''
+    Gets the directory of the cache: $ONSHAPE_TO_ROBOT_CACHE if set, else
+    onshape-to-robot in the XDG cache directory ($XDG_CACHE_HOME or ~/.cache)
+
+    Returns:
+        - str: Directory of the cache
+    '''
+
+    if os.environ.get('ONSHAPE_TO_ROBOT_CACHE'):
+        return os.path.expanduser(os.environ['ONSHAPE_TO_ROBOT_CACHE'])
+
+    xdg = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(xdg, 'onshape-to-robot')
+
+
+def legacy_cache_dir():
+    '''
+    Returns:
+        - str: Directory of the cache of the previous versions, inside the package
+    '''
+
+    return os.path.dirname(os.path.abspath(__file__)) + '/cache'
+
+
+def share(path, mode=0o060):
+    '''
+    Gives the group of a file (or directory, with mode 0o070) created in the cache
+    the same permissions as its owner, whatever the umask, so that the users of a
+    group can share the cache
+
+    Args:
+        - path (str): File or directory
+        - mode (int, default=0o060): Group permission bits to add
+    '''
+
+    try:
+        os.chmod(path, os.stat(path).st_mode | mode)
+    except OSError:
+        # Owned by another user, who shared it when creating it
+        pass
+
+
+def make_shared_dirs(path):
+    '''
+    Creates a directory of the cache (and its parents), shared with the group
+    '''
+
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+        share(path, 0o070)
+
+
+def canonical_json(obj):
+    '''
+    Encodes data as compact JSON, whatever the codec backend (the standard library
+    and orjson don't space the separators the same way)
+
+    Returns:
+        - str: JSON text
+    '''
+
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def entry_key(method, key):
+    '''
+    Builds the index key of an entry, tuples keys are encoded as a JSON list so
+    that their components can't be confused. Keys are canonical, so that they
+    are the same whether orjson is installed or not.
+
+    Args:
+        - method (str): Name of the cached call, e.g. part_stl
+        - key (str or tuple): Key of the entry
+
+    Returns:
+        - str: Index key
+    '''
+
+    return canonical_json([method] + (list(key) if isinstance(key, tuple) else [key]))
+
+
+def workspace_entry(method, key):
+    '''
+    Returns:
+        - bool: Whether the entry depends on the state of a workspace (documents,
+          and (did, 'w', wid, ...) keys), versions and microversions never change
+    '''
+
+    return method == 'document' or (isinstance(key, tuple) and key[1:2] == ('w',))
+
+
+def compressor(compression):
+    # Streaming compressor, with compress(chunk) and flush()
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return zlib.compressobj(6)
+
+
+def compress(data, compression):
+    compressobj = compressor(compression)
+    return compressobj.compress(data) + compressobj.flush()
+
+
+def decompress_chunks(f, compression, chunk_size=1 << 16):
+    '''
+    Decompresses a file chunk by chunk
+
+    Args:
+        - f (file): Binary file object of the compressed content
+        - compression (str): Codec
+
+    Yields:
+        - bytes: Chunks of raw content
+
+    Raises:
+        - ValueError: if the content is corrupted or truncated, or its codec isn't available
+    '''
+
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError('Can\'t decompress a cache entry (zstd): zstandard is not installed')
+    if compression == 'zstd':
+        decompressobj = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressobj = zlib.decompressobj()
+
+    try:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            yield decompressobj.decompress(chunk)
+    except CODEC_ERRORS as e:
+        raise ValueError('Can\'t decompress a cache entry (' + compression + '): ' + str(e))
+    if not getattr(decompressobj, 'eof', True):
+        raise ValueError('Can\'t decompress a cache entry (' + compression + '): truncated content')
+
+
+def decompress(data, compression):
+    '''
+    Raises:
+        - ValueError: if the data is corrupted, or its codec isn't available
+    '''
+
+    return b''.join(decompress_chunks(io.BytesIO(data), compression))
+
+
+def compress_entry(method, data):
+    '''
+    Compresses the content of an entry, with the codec of its endpoint (see
+    COMPRESSION). Contents that don't compress well are stored raw.
+
+    Returns:
+        - tuple: (stored bytes, compression codec or None)
+    '''
+
+    compression = COMPRESSION.get(method, DEFAULT_COMPRESSION)
+    if compression is not None:
+        compressed = compress(data, compression)
+        if len(compressed) < 0.9 * len(data):
+            return compressed, compression
+    return data, None
+
+
+def file_digest(fileName):
+    '''
+    Returns:
+        - str: sha256 of the content of a file (the name of its blob)
+    '''
+
+    sha256 = hashlib.sha256()
+    with open(fileName, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def blob_digest(fileName, compression):
+    '''
+    Returns:
+        - str: sha256 of the raw content of a blob file, None if it can't be decompressed
+    '''
+
+    if compression is None:
+        return file_digest(fileName)
+    sha256 = hashlib.sha256()
+    with open(fileName, 'rb') as f:
+        try:
+            for chunk in decompress_chunks(f, compression):
+                sha256.update(chunk)
+        except ValueError:
+            return None
+    return sha256.hexdigest()
+
+
+class CacheBackend():
+    '''
+    Interface of the caches of the API responses: entries are identified by the
+    name of the cached call (method) and a key (str, or tuple starting with the
+    document ID), and hold bytes and a metadata dict (e.g. validators)
+    '''
+
+    def get(self, method, key, with_meta=False):
+        '''
+        Returns:
+            - bytes: Content of the entry, None if it doesn't exist (or tuple (content, meta dict))
+        '''
+
+        raise NotImplementedError
+
+    def put(self, method, key, data, meta=None):
+        raise NotImplementedError
+
+    def contains(self, method, key):
+        '''
+        Returns:
+            - bool: Whether the entry is in the cache
+        '''
+
+        raise NotImplementedError
+
+    def contains_many(self, method, keys):
+        '''
+        Checks several entries of a cached call at once
+
+        Returns:
+            - set: The keys in the cache
+        '''
+
+        return set(key for key in keys if self.contains(method, key))
+
+    def remove(self, method, key):
+        raise NotImplementedError
+
+    def flush(self):
+        '''
+        Waits for the writes done in the background, if any
+        '''
+
+        pass
+
+    def close(self):
+        pass
+
+
+class CacheStore(CacheBackend):
+    '''
+    Cache of the API responses. The content of the entries is stored once per
+    distinct content (blobs/<hash[:2]>/<sha256>), and an SQLite index maps the
+    entries keys to their blob, with the endpoint, the document, the creation and
+    last access times. Blobs are compressed according to the endpoint of their
+    entry (see COMPRESSION), and named after the sha256 of their raw content.
+    The decompressed copies of the compressed blobs used as files (raw/, see
+    raw_copy) are counted in the size of the store, and removed with their blob
+    or, first, by evict.
+
+    When max_size is set, trim() evicts the least recently used entries once the
+    blobs exceed it. Writes never evict, so that the paths handed out stay valid
+    until the caller trims the cache (e.g. at the end of an export).
+
+    The store can be shared by several processes: blobs are written to temporary
+    files and renamed, the index is updated in SQLite transactions, and lock()
+    serializes the fills of a given entry. The files and directories it creates
+    are writable by their group (see share), so that several users can share it
+    if the root directory belongs to their common group, with the setgid bit
+    (chmod g+s) so that this group is inherited.
+
+    Attributes:
+        - root (str): Directory of the cache
+        - max_size (int, default=None): Maximum size (bytes) of the blobs on disk, None for no limit
+    '''
+
+    def __init__(self, root, max_size=None):
+        self.root = root
+        self.max_size = max_size
+        make_shared_dirs(root)
+        for name in ['blobs', 'tmp', 'locks']:
+            make_shared_dirs(os.path.join(root, name))
+
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._db = sqlite3.connect(
+            os.path.join(root, 'index.sqlite'),
+            timeout=60,
+            isolation_level=None,
+            check_same_thread=False)
+        # SQLite gives the -wal and -shm files the permissions of the database
+        share(os.path.join(root, 'index.sqlite'))
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        with self._transaction():
+            for statement in SCHEMA:
+                self._db.execute(statement)
+            for table, column, type in MIGRATIONS:
+                columns = [row[1] for row in self._db.execute('PRAGMA table_info(' + table + ')')]
+                if column not in columns:
+                    self._db.execute('ALTER TABLE ' + table + ' ADD COLUMN ' + column + ' ' + type)
+            if self._db.execute('PRAGMA user_version').fetchone()[0] < KEY_VERSION:
+                # Keys written through the standard json backend had spaced separators
+                for key, in self._db.execute('SELECT key FROM entries').fetchall():
+                    canonical = canonical_json(json.loads(key))
+                    if canonical != key:
+                        self._db.execute('UPDATE OR REPLACE entries SET key = ? WHERE key = ?', (canonical, key))
+                self._db.execute('PRAGMA user_version = ' + str(KEY_VERSION))
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # Write transaction, excluding the other processes until it ends
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    @contextlib.contextmanager
+    def lock(self, method, key):
+        '''
+        Holds an exclusive lock on an entry, across threads and processes, so that
+        only one of them fills it. Callers check the entry again once they have it.
+        Without fcntl (Windows), the lock only excludes the threads of this process.
+
+        Args:
+            - method (str): Name of the cached call
+            - key (str or tuple): Key of the entry
+        '''
+
+        digest = hashlib.sha1(entry_key(method, key).encode('utf-8')).hexdigest()
+        if fcntl is None:
+            with self._lock:
+                lock = self._key_locks.setdefault(digest, threading.Lock())
+            with lock:
+                yield
+            return
+
+        # flock is held by the open file, so it also excludes the other threads
+        fileName = os.path.join(self.root, 'locks', digest[:2], digest)
+        make_shared_dirs(os.path.dirname(fileName))
+        with open(fileName, 'a+b') as f:
+            share(fileName)
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    def temp_file_name(self):
+        '''
+        Returns:
+            - str: Path of a new temporary file in the cache directory (to be passed to put_raw_file)
+        '''
+
+        return os.path.join(self.root, 'tmp', str(os.getpid()) + '.' + str(threading.get_ident()) + '.' +
+                            str(time.monotonic_ns()))
+
+    def _lookup(self, method, key):
+        key = entry_key(method, key)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT entries.hash, meta, compression, last_access FROM entries '
+                'LEFT JOIN blobs ON blobs.hash = entries.hash WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[3] > ACCESS_GRANULARITY:
+                self._db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+        return row[:3]
+
+    def contains(self, method, key):
+        '''
+        Returns:
+            - bool: Whether the entry is in the cache
+        '''
+
+        with self._lock:
+            return self._db.execute(
+                'SELECT 1 FROM entries WHERE key = ?', (entry_key(method, key),)).fetchone() is not None
+
+    def contains_many(self, method, keys):
+        '''
+        Returns:
+            - set: The keys in the cache
+        '''
+
+        keys = {entry_key(method, key): key for key in keys}
+        found = set()
+        names = list(keys)
+        with self._lock:
+            # Bounded by the maximum number of SQLite parameters
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                found.update(row[0] for row in self._db.execute(
+                    'SELECT key FROM entries WHERE key IN (' + ','.join('?' * len(chunk)) + ')', chunk))
+        return set(keys[name] for name in found)
+
+    def path(self, method, key, with_meta=False):
+        '''
+        Returns:
+            - str: Path of the (read-only) blob of the entry, None if the entry doesn't exist
+              (or tuple (path, meta dict)). For a compressed entry, this is a decompressed
+              copy of the blob, see raw_copy
+        '''
+
+        row = self._lookup(method, key)
+        path, meta = None, None
+        if row is not None:
+            digest, rowMeta, compression = row
+            try:
+                if compression is None:
+                    path = self.blob_path(digest)
+                    if not os.path.exists(path):
+                        raise FileNotFoundError(path)
+                else:
+                    path = self.raw_copy(digest, compression)
+                meta = codec.loads(rowMeta) if rowMeta else {}
+            except (FileNotFoundError, ValueError):
+                # The blob was removed under our feet or is corrupted, the entry is dropped
+                path = None
+                self.remove(method, key)
+
+        if with_meta:
+            return path, meta
+        return path
+
+    def raw_path(self, digest):
+        return os.path.join(self.root, 'raw', digest[:2], digest)
+
+    def raw_copy(self, digest, compression):
+        '''
+        Gets a decompressed copy of a compressed blob, so that it can be used as a
+        file. The blob stays compressed, the copy is made once, counted in the size
+        of the cache, and removed with the blob (or before it, see evict).
+
+        Returns:
+            - str: Path of the copy
+
+        Raises:
+            - FileNotFoundError: if the blob was removed
+            - ValueError: if the blob can't be decompressed
+        '''
+
+        path = self.raw_path(digest)
+        if os.path.exists(path):
+            return path
+
+        tmpFileName = self.temp_file_name()
+        try:
+            with open(self.blob_path(digest), 'rb') as blob, open(tmpFileName, 'wb') as f:
+                for chunk in decompress_chunks(blob, compression):
+                    f.write(chunk)
+        except BaseException:
+            if os.path.exists(tmpFileName):
+                os.remove(tmpFileName)
+            raise
+
+        return self._keep_copy(digest, tmpFileName)
+
+    def _keep_copy(self, digest, tmpFileName):
+        # Moves the raw content of a blob in as its decompressed copy, while the blob
+        # is known, so that the copy is removed with it (see _drop_blob). Returns the
+        # path of the raw content
+        with self._transaction():
+            row = self._db.execute('SELECT compression FROM blobs WHERE hash = ?', (digest,)).fetchone()
+            if row is None:
+                os.remove(tmpFileName)
+                raise FileNotFoundError(self.blob_path(digest))
+            if row[0] is None:
+                # Stored raw (e.g. by another process), no copy is needed
+                os.remove(tmpFileName)
+                return self.blob_path(digest)
+
+            path = self.raw_path(digest)
+            if os.path.exists(path):
+                os.remove(tmpFileName)
+            else:
+                make_shared_dirs(os.path.dirname(path))
+                share(tmpFileName)
+                size = os.path.getsize(tmpFileName)
+                os.replace(tmpFileName, path)
+                self._db.execute('UPDATE blobs SET copy_size = ? WHERE hash = ?', (size, digest))
+
+        return path
+
+    def open_entry(self, method, key, with_meta=False):
+        '''
+        Opens the (raw) content of an entry
+
+        Returns:
+            - file: Binary file object, None if the entry doesn't exist (or tuple (file, meta dict))
+        '''
+
+        row = self._lookup(method, key)
+        f, meta = None, None
+        if row is not None:
+            digest, rowMeta, compression = row
+            try:
+                if compression is None:
+                    f = open(self.blob_path(digest), 'rb')
+                else:
+                    try:
+                        f = open(self.raw_path(digest), 'rb')
+                    except FileNotFoundError:
+                        with open(self.blob_path(digest), 'rb') as blob:
+                            f = io.BytesIO(decompress(blob.read(), compression))
+                meta = codec.loads(rowMeta) if rowMeta else {}
+            except (FileNotFoundError, ValueError):
+                # The blob was removed under our feet or is corrupted, the entry is dropped
+                self.remove(method, key)
+
+        if with_meta:
+            return f, meta
+        return f
+
+    def get(self, method, key, with_meta=False):
+        '''
+        Args:
+            - method (str): Name of the cached call
+            - key (str or tuple): Key of the entry
+            - with_meta (bool, default=False): Also returns the metadata stored with the entry
+
+        Returns:
+            - bytes: Content of the entry, None if it doesn't exist (or tuple (content, meta dict))
+        '''
+
+        f, meta = self.open_entry(method, key, with_meta=True)
+        data = None
+        if f is not None:
+            with f:
+                data = f.read()
+
+        if with_meta:
+            return data, meta
+        return data
+
+    def put(self, method, key, data, meta=None):
+        '''
+        Stores an entry
+
+        Args:
+            - method (str): Name of the cached call
+            - key (str or tuple): Key of the entry
+            - data (bytes): Content
+            - meta (dict, default=None): Metadata kept in the index (e.g. validators)
+
+        Returns:
+            - str: Path of the (possibly compressed) blob
+        '''
+
+        stored, compression = compress_entry(method, data)
+        tmpFileName = self.temp_file_name()
+        with open(tmpFileName, 'wb') as f:
+            f.write(stored)
+        return self.put_file(method, key, tmpFileName, hashlib.sha256(data).hexdigest(), meta, compression,
+                             len(data))
+
+    def put_stream(self, method, key, chunks, meta=None):
+        '''
+        Stores an entry from an iterable of chunks, without holding it in memory
+        (see put_raw_file). If the iteration raises, nothing is stored.
+
+        Returns:
+            - str: Path of the raw content of the entry (see path)
+        '''
+
+        tmpFileName = self.temp_file_name()
+        digest = hashlib.sha256()
+        try:
+            with open(tmpFileName, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmpFileName)
+            raise
+
+        return self.put_raw_file(method, key, tmpFileName, digest.hexdigest(), meta)
+
+    def compress_file(self, method, tmpFileName):
+        '''
+        Compresses a temporary file holding the raw content of an entry, chunk by
+        chunk, with the codec of its endpoint (see COMPRESSION). Contents that don't
+        compress well are stored raw.
+
+        Returns:
+            - tuple: (file to store, compression codec or None), the raw file is left
+              in place when a compressed file is given
+        '''
+
+        compression = COMPRESSION.get(method, DEFAULT_COMPRESSION)
+        if compression is None:
+            return tmpFileName, None
+
+        compressedFileName = self.temp_file_name()
+        compressobj = compressor(compression)
+        with open(tmpFileName, 'rb') as source, open(compressedFileName, 'wb') as f:
+            for chunk in iter(lambda: source.read(1 << 16), b''):
+                f.write(compressobj.compress(chunk))
+            f.write(compressobj.flush())
+
+        if os.path.getsize(compressedFileName) < 0.9 * os.path.getsize(tmpFileName):
+            return compressedFileName, compression
+        os.remove(compressedFileName)
+        return tmpFileName, None
+
+    def put_raw_file(self, method, key, tmpFileName, digest=None, meta=None, keep_copy=True):
+        '''
+        Stores an entry from a complete temporary file holding its raw content,
+        compressed according to its endpoint (see compress_file). The raw file is
+        then kept as the decompressed copy of the blob, since the entries written
+        from files (e.g. streamed meshes) are used as files right away.
+
+        Args:
+            - tmpFileName (str): Temporary file
+            - digest (str, default=None): sha256 of the content, computed from the file if not given
+            - keep_copy (bool, default=True): Whether the raw file is kept as the copy, or removed
+
+        Returns:
+            - str: Path of the raw content of the entry (see path), the blob if keep_copy is False
+        '''
+
+        if digest is None:
+            digest = file_digest(tmpFileName)
+        fileName, compression = self.compress_file(method, tmpFileName)
+        if compression is None:
+            return self.put_file(method, key, tmpFileName, digest, meta)
+
+        try:
+            blobPath = self.put_file(method, key, fileName, digest, meta, compression,
+                                     os.path.getsize(tmpFileName))
+        except BaseException:
+            os.remove(tmpFileName)
+            raise
+        if not keep_copy:
+            os.remove(tmpFileName)
+            return blobPath
+        return self._keep_copy(digest, tmpFileName)
+
+    def put_file(self, method, key, tmpFileName, digest=None, meta=None, compression=None, raw_size=None):
+        '''
+        Stores an entry from a complete temporary file (see temp_file_name), which
+        is moved to the blobs as it is (see put_raw_file to compress it).
+
+        Args:
+            - tmpFileName (str): Temporary file
+            - digest (str, default=None): sha256 of the raw content, computed from the file if not given
+            - compression (str, default=None): Codec the file content is compressed with (see put)
+            - raw_size (int, default=None): Size of the raw content, if compressed
+
+        Returns:
+            - str: Path of the blob
+        '''
+
+        if digest is None:
+            digest = file_digest(tmpFileName)
+
+        document = key[0] if isinstance(key, tuple) and len(key) else None
+        return self._store_file(entry_key(method, key), method, document, tmpFileName, digest,
+                                codec.dumps(meta) if meta else None, compression=compression, raw_size=raw_size)
+
+    def _store_file(self, ekey, endpoint, document, tmpFileName, digest, meta, created=None, compression=None,
+                    raw_size=None):
+        # Moves the file to the blobs and indexes the entry, tmpFileName is None
+        # when the blob is already stored
+        blobPath = self.blob_path(digest)
+        size = os.path.getsize(blobPath if tmpFileName is None else tmpFileName)
+        now = time.time()
+
+        with self._transaction():
+            known = self._db.execute('SELECT 1 FROM blobs WHERE hash = ?', (digest,)).fetchone() is not None
+            if tmpFileName is not None:
+                if known and os.path.exists(blobPath):
+                    os.remove(tmpFileName)
+                else:
+                    # New blob (a file left by an interrupted write is replaced, it may be compressed differently)
+                    make_shared_dirs(os.path.dirname(blobPath))
+                    share(tmpFileName)
+                    os.replace(tmpFileName, blobPath)
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO blobs (hash, size, raw_size, compression) VALUES (?, ?, ?, ?)',
+                        (digest, size, size if raw_size is None else raw_size, compression))
+
+            previous = self._db.execute('SELECT hash FROM entries WHERE key = ?', (ekey,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries (key, hash, endpoint, document, meta, created, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (ekey, digest, endpoint, document, meta, now if created is None else created, now))
+            if previous is not None and previous[0] != digest:
+                self._drop_blob(previous[0])
+
+        return blobPath
+
+    def update_meta(self, method, key, meta):
+        with self._lock:
+            self._db.execute('UPDATE entries SET meta = ? WHERE key = ?',
+                             (codec.dumps(meta) if meta else None, entry_key(method, key)))
+
+    def _drop_blob(self, digest):
+        # Removes a blob if no entry refers to it anymore, the lock is held.
+        # Returns the size freed
+        if self._db.execute('SELECT 1 FROM entries WHERE hash = ? LIMIT 1', (digest,)).fetchone() is not None:
+            return 0
+        row = self._db.execute('SELECT size + COALESCE(copy_size, 0) FROM blobs WHERE hash = ?',
+                               (digest,)).fetchone()
+        self._db.execute('DELETE FROM blobs WHERE hash = ?', (digest,))
+        for path in [self.blob_path(digest), self.raw_path(digest)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return 0 if row is None else row[0]
+
+    def _drop_copy(self, digest):
+        # Removes the decompressed copy of a blob, the lock is held
+        try:
+            os.remove(self.raw_path(digest))
+        except FileNotFoundError:
+            pass
+        self._db.execute('UPDATE blobs SET copy_size = NULL WHERE hash = ?', (digest,))
+
+    def remove(self, method, key):
+        ekey = entry_key(method, key)
+        with self._transaction():
+            row = self._db.execute('SELECT hash FROM entries WHERE key = ?', (ekey,)).fetchone()
+            if row is not None:
+                self._db.execute('DELETE FROM entries WHERE key = ?', (ekey,))
+                self._drop_blob(row[0])
+
+    def size(self):
+        '''
+        Returns:
+            - int: Total size (bytes) of the blobs and of their decompressed copies
+        '''
+
+        with self._lock:
+            return self._db.execute(TOTAL_SIZE).fetchone()[0]
+
+    def evict(self, max_size, slack=0.9, accessed_before=None):
+        '''
+        Removes the least recently used entries until the blobs fit in max_size
+        (with some slack, 90% of it by default, so that eviction doesn't run on
+        each trim). The decompressed copies of the blobs (see raw_copy) are removed
+        first, the least recently used first, their blob being kept.
+
+        Args:
+            - max_size (int): Size (bytes)
+            - slack (float, default=0.9): Fraction of max_size the blobs are reduced to
+            - accessed_before (float, default=None): If set, only the entries whose last access
+              precedes this timestamp are removed (the entries in use are kept). Last accesses
+              being recorded to within ACCESS_GRANULARITY, so is this timestamp
+
+        Returns:
+            - int: Number of entries removed
+        '''
+
+        if self.size() <= max_size:
+            return 0
+        if accessed_before is not None:
+            accessed_before -= ACCESS_GRANULARITY
+
+        removed = 0
+        with self._transaction():
+            total = self._db.execute(TOTAL_SIZE).fetchone()[0]
+            copies = self._db.execute(
+                'SELECT blobs.hash, copy_size, MAX(last_access) AS accessed FROM blobs '
+                'JOIN entries ON entries.hash = blobs.hash WHERE copy_size IS NOT NULL '
+                'GROUP BY blobs.hash ORDER BY accessed').fetchall()
+            for digest, copySize, accessed in copies:
+                if total <= slack * max_size or (accessed_before is not None and accessed >= accessed_before):
+                    break
+                self._drop_copy(digest)
+                total -= copySize
+
+            if total <= slack * max_size:
+                return 0
+            if accessed_before is None:
+                rows = self._db.execute('SELECT key, hash FROM entries ORDER BY last_access').fetchall()
+            else:
+                rows = self._db.execute('SELECT key, hash FROM entries WHERE last_access < ? ORDER BY last_access',
+                                        (accessed_before,)).fetchall()
+            for key, digest in rows:
+                if total <= slack * max_size:
+                    break
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= self._drop_blob(digest)
+                removed += 1
+
+        return removed
+
+    def trim(self, accessed_before=None):
+        '''
+        Evicts the least recently used entries if the blobs exceed max_size (see evict)
+
+        Returns:
+            - int: Number of entries removed
+        '''
+
+        if self.max_size is None:
+            return 0
+        return self.evict(self.max_size, accessed_before=accessed_before)
+
+    def stats(self):
+        '''
+        Returns:
+            - dict: entries and blobs counts, size (bytes of the blobs on disk) and rawSize
+              (bytes decompressed), copies and copySize (decompressed copies, see raw_copy),
+              and {'entries', 'size', 'rawSize'} per endpoint, per document and per last
+              access age (see AGES)
+        '''
+
+        now = time.time()
+        endpoints, documents = {}, {}
+        ages = {label: {'entries': 0, 'size': 0, 'rawSize': 0} for label, _ in AGES}
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            blobs, size, rawSize, copies, copySize = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(COALESCE(raw_size, size)), 0), '
+                'COUNT(copy_size), COALESCE(SUM(copy_size), 0) FROM blobs').fetchone()
+            rows = self._db.execute(
+                'SELECT endpoint, document, last_access, blobs.size, COALESCE(blobs.raw_size, blobs.size) '
+                'FROM entries JOIN blobs ON blobs.hash = entries.hash').fetchall()
+
+        for endpoint, document, lastAccess, entrySize, entryRawSize in rows:
+            for label, maxAge in AGES:
+                if maxAge is None or now - lastAccess < maxAge:
+                    break
+            for group, name in [(endpoints, endpoint), (documents, document), (ages, label)]:
+                group.setdefault(name, {'entries': 0, 'size': 0, 'rawSize': 0})
+                group[name]['entries'] += 1
+                group[name]['size'] += entrySize
+                group[name]['rawSize'] += entryRawSize
+
+        return {'entries': entries, 'blobs': blobs, 'size': size, 'rawSize': rawSize, 'copies': copies,
+                'copySize': copySize, 'endpoints': endpoints, 'documents': documents, 'ages': ages}
+
+    def select(self, document=None, element=None, endpoint=None, accessed_before=None, workspace=False):
+        '''
+        Selects entries, all the given criteria have to match
+
+        Args:
+            - document (str, default=None): Document ID
+            - element (str, default=None): Element ID (any component of the key)
+            - endpoint (str, default=None): Name of the cached call, e.g. part_stl
+            - accessed_before (float, default=None): Timestamp the last access has to precede
+            - workspace (bool, default=False): Only the entries that depend on the state of a
+              workspace (documents, and elements, assemblies and features of a workspace)
+
+        Returns:
+            - list: Index keys of the entries
+        '''
+
+        conditions, params = [], []
+        if document is not None:
+            conditions.append('document = ?')
+            params.append(document)
+        if element is not None:
+            # Keys are JSON lists, the IDs appear as quoted strings
+            conditions.append('instr(key, ?) > 0')
+            params.append(canonical_json(element))
+        if endpoint is not None:
+            conditions.append('endpoint = ?')
+            params.append(endpoint)
+        if accessed_before is not None:
+            conditions.append('last_access < ?')
+            params.append(accessed_before)
+
+        query = 'SELECT key, endpoint FROM entries'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+
+        if workspace:
+            rows = [(key, endpoint) for key, endpoint in rows
+                    if workspace_entry(endpoint, tuple(codec.loads(key)[1:]))]
+
+        return [key for key, _ in rows]
+
+    def remove_entries(self, keys):
+        '''
+        Args:
+            - keys (list): Index keys of the entries (see select)
+
+        Returns:
+            - int: Size (bytes) freed
+        '''
+
+        freed = 0
+        with self._transaction():
+            for key in keys:
+                row = self._db.execute('SELECT hash FROM entries WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                    freed += self._drop_blob(row[0])
+
+        return freed
+
+    def verify(self, fix=False):
+        '''
+        Checks that the blobs exist and that their content matches their hash, as
+        well as the content of their decompressed copies (which are hardlinked to the
+        output directories with hardlinkMeshes)
+
+        Args:
+            - fix (bool, default=False): Removes the entries of the missing or corrupted
+              blobs, the corrupted copies and the blobs no entry refers to
+
+        Returns:
+            - dict: number of blobs checked, and lists of the missing, corrupted, orphan
+              blobs and corruptedCopies hashes
+        '''
+
+        with self._lock:
+            blobs = self._db.execute('SELECT hash, compression, copy_size FROM blobs').fetchall()
+
+        missing, corrupted, corruptedCopies = [], [], []
+        for digest, compression, copySize in blobs:
+            try:
+                if blob_digest(self.blob_path(digest), compression) != digest:
+                    corrupted.append(digest)
+            except FileNotFoundError:
+                missing.append(digest)
+            try:
+                if copySize is not None and file_digest(self.raw_path(digest)) != digest:
+                    corruptedCopies.append(digest)
+            except FileNotFoundError:
+                pass
+
+        # Blobs are only moved in while the index is locked, see _store_file
+        with self._transaction():
+            known = set(row[0] for row in self._db.execute('SELECT hash FROM blobs'))
+            orphans = {}
+            for directory, _, names in os.walk(os.path.join(self.root, 'blobs')):
+                orphans.update((name, os.path.join(directory, name)) for name in names if name not in known)
+
+            if fix:
+                for digest in corruptedCopies:
+                    self._drop_copy(digest)
+                for digest in missing + corrupted:
+                    self._db.execute('DELETE FROM entries WHERE hash = ?', (digest,))
+                    self._drop_blob(digest)
+                for orphan in orphans.values():
+                    os.remove(orphan)
+
+        return {'checked': len(blobs), 'missing': missing, 'corrupted': corrupted, 'orphans': list(orphans),
+                'corruptedCopies': corruptedCopies}
+
+    def export_archive(self, fileName, keys):
+        '''
+        Writes entries and their blobs (as they are stored) to a tar archive
+        (compressed if fileName ends with .gz), that can be imported in another cache
+
+        Args:
+            - fileName (str): Archive
+            - keys (list): Index keys of the entries (see select)
+
+        Returns:
+            - int: Number of entries exported
+        '''
+
+        with self._lock:
+            rows = []
+            for key in keys:
+                row = self._db.execute(
+                    'SELECT key, entries.hash, endpoint, document, meta, created, raw_size, compression '
+                    'FROM entries JOIN blobs ON blobs.hash = entries.hash WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    rows.append(dict(zip(['key', 'hash', 'endpoint', 'document', 'meta', 'created', 'rawSize',
+                                          'compression'], row)))
+
+        index = codec.dumps_bytes(rows)
+        with tarfile.open(fileName, 'w:gz' if fileName.endswith('.gz') else 'w') as archive:
+            info = tarfile.TarInfo('index.json')
+            info.size = len(index)
+            info.mtime = time.time()
+            archive.addfile(info, io.BytesIO(index))
+            for digest in sorted(set(row['hash'] for row in rows)):
+                archive.add(self.blob_path(digest), 'blobs/' + digest)
+
+        return len(rows)
+
+    def import_archive(self, fileName):
+        '''
+        Imports the entries of an archive written by export_archive, the blobs
+        that don't match their hash (or can't be decompressed) are skipped
+
+        Returns:
+            - int: Number of entries imported
+        '''
+
+        imported = 0
+        with tarfile.open(fileName, 'r:*') as archive:
+            rows = codec.loads(archive.extractfile('index.json').read())
+            compressions = {row['hash']: row.get('compression') for row in rows}
+            blobs = {}
+            for member in archive:
+                if member.isfile() and member.name.startswith('blobs/'):
+                    digest = member.name[6:]
+                    tmpFileName = self.temp_file_name()
+                    with archive.extractfile(member) as source, open(tmpFileName, 'wb') as f:
+                        shutil.copyfileobj(source, f)
+                    if blob_digest(tmpFileName, compressions.get(digest)) == digest:
+                        blobs[digest] = tmpFileName
+                    else:
+                        os.remove(tmpFileName)
+
+            for row in rows:
+                if row['hash'] not in blobs:
+                    continue
+                # Archives written before the keys were canonical may have spaced keys
+                key = canonical_json(json.loads(row['key']))
+                # The temporary file is consumed by the first entry of the blob
+                self._store_file(key, row['endpoint'], row['document'], blobs[row['hash']], row['hash'],
+                                 row['meta'], row['created'], row.get('compression'), row.get('rawSize'))
+                blobs[row['hash']] = None
+                imported += 1
+
+            for tmpFileName in blobs.values():
+                if tmpFileName is not None:
+                    os.remove(tmpFileName)
+
+        self.trim()
+
+        return imported
+
+    def clear(self):
+        '''
+        Removes all the entries and blobs, and the temporary files left by
+        interrupted downloads
+        '''
+
+        with self._transaction():
+            self._db.execute('DELETE FROM entries')
+            self._db.execute('DELETE FROM blobs')
+            shutil.rmtree(os.path.join(self.root, 'blobs'), ignore_errors=True)
+            shutil.rmtree(os.path.join(self.root, 'raw'), ignore_errors=True)
+            make_shared_dirs(os.path.join(self.root, 'blobs'))
+
+        # Other processes may be writing their temporary files right now
+        for name in os.listdir(os.path.join(self.root, 'tmp')):
+            fileName = os.path.join(self.root, 'tmp', name)
+            try:
+                if os.path.getmtime(fileName) < time.time() - 3600:
+                    os.remove(fileName)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
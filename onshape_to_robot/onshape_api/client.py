@@ -5,14 +5,20 @@ client
 Convenience functions for working with the Onshape API
 '''
 
-from .onshape import Onshape
+from .onshape import Onshape, OnshapeError
+from .memo import SingleFlightMemo
+from .cache import CacheStore, default_cache_dir
+from .remote_cache import HttpCache, TieredCache
+from . import tessellation
+from . import codec
 
 import mimetypes
 import random
 import string
 import os
-import json
 import hashlib
+import time
+import urllib
 
 
 def double_escape_slash(s):
@@ -23,6 +29,83 @@ def escape_slash(s):
     return s.replace('/', '%2f')
 
 
+def args_key(args):
+    '''
+    Turns extra query arguments into a cache key component
+    '''
+
+    return urllib.parse.urlencode(sorted(args.items()))
+
+
+def cache_write_stream(store, method, key, response, chunk_size=1 << 16):
+    '''
+    Streams the body of a response to a cache entry, without holding it in memory.
+    The chunks are decoded (if the response is compressed), and the length received
+    is checked against the Content-Length before the entry is stored. If the
+    responses are recorded, the chunks are also written to the recording.
+
+    Args:
+        - store (CacheStore): Cache
+        - method (str): Name of the cached call
+        - key (str or tuple): Key of the entry
+        - response (requests.Response): Streamed response
+        - chunk_size (int, default=64k): Size of the chunks
+
+    Returns:
+        - tuple: (path of the entry, size of the decoded body)
+    '''
+
+    length = 0
+    # Set when the responses are recorded, see Onshape.request
+    recorder = getattr(response, 'recorder', None)
+
+    def chunks():
+        nonlocal length
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            length += len(chunk)
+            if recorder is not None:
+                recorder.write(chunk)
+            yield chunk
+
+        # Content-Length is the size on the wire, before decoding
+        expected = response.headers.get('Content-Length')
+        if expected is not None and int(expected) != response.raw.tell():
+            raise OnshapeError('Incomplete download, got ' + str(response.raw.tell()) + ' bytes out of ' + expected,
+                               response.url, response.status_code)
+
+    try:
+        fileName = store.put_stream(method, key, chunks())
+    except BaseException:
+        if recorder is not None:
+            recorder.abort()
+        raise
+    if recorder is not None:
+        recorder.close()
+    return fileName, length
+
+
+def collisions_configuration(configuration):
+    '''
+    Forces collisions=true in a configuration string, if the configuration has
+    a collisions parameter
+
+    Returns:
+        - tuple: (new configuration, whether it was changed)
+    '''
+
+    parts = configuration.split(';')
+    changed = False
+    for k, part in enumerate(parts):
+        kv = part.split('=')
+        if len(kv) == 2:
+            if kv[0] == 'collisions':
+                kv[1] = 'true'
+                changed = True
+        parts[k] = '='.join(kv)
+
+    return ';'.join(parts), changed
+
+
 class Client():
     '''
     Defines methods for testing the Onshape API. Comes with several methods:
@@ -40,42 +123,209 @@ class Client():
             self,
             stack='https://cad.onshape.com',
             logging=True,
-            creds='./config.json'):
+            creds='./config.json',
+            pool_maxsize=16,
+            requests_per_second=None,
+            max_retries=5,
+            memo_size=4096,
+            redirect_ttl=300,
+            base_url=None,
+            record_dir=None,
+            cache_dir=None,
+            cache_max_size=None,
+            cache_server=None):
         '''
         Instantiates a new Onshape client.
 
         Args:
             - stack (str, default='https://cad.onshape.com'): Base URL
             - logging (bool, default=True): Turn logging on or off
+            - pool_maxsize (int, default=16): Maximum number of keep-alive connections per host
+            - requests_per_second (float, default=None): Requests budget shared by all callers, None for no limit
+            - max_retries (int, default=5): Number of retries of throttled or failed requests
+            - memo_size (int, default=4096): Number of resolved part calls kept in memory
+            - redirect_ttl (float, default=300): Time (s) redirect targets are remembered, 0 to disable
+            - base_url (str, default=None): Overrides the API URL of the credentials
+            - record_dir (str, default=None): Directory where the requests and responses are recorded
+            - cache_dir (str, default=None): Directory of the cache, see cache.default_cache_dir
+            - cache_max_size (int, default=None): Size (bytes) above which the least recently used entries are evicted
+            - cache_server (str, default=None): URL of a cache server (see remote_cache.CacheServer) sharing the
+              entries of versions and microversions
         '''
 
-        self._metadata_cache = {}
-        self._massproperties_cache = {}
+        self._cache = CacheStore(cache_dir or default_cache_dir(), cache_max_size)
+        if cache_server is not None:
+            self._cache = TieredCache(self._cache, HttpCache(cache_server))
+        # The entries used since then are kept by trim_cache
+        self._started = time.time()
+
+        # Parsed part lists, metadata, mass properties and STL paths, keyed on
+        # (call, document, microversion, element, partId, configuration)
+        self._memo = SingleFlightMemo(memo_size)
         self._stack = stack
-        self._api = Onshape(stack=stack, logging=logging, creds=creds)
+        self._api = Onshape(
+            stack=stack,
+            logging=logging,
+            creds=creds,
+            pool_maxsize=pool_maxsize,
+            requests_per_second=requests_per_second,
+            max_retries=max_retries,
+            redirect_ttl=redirect_ttl,
+            base_url=base_url,
+            record_dir=record_dir)
         self.useCollisionsConfigurations = True
+        # Meshes built from the tessellation of the part studios (see
+        # fetch_tessellated_group) instead of the STL exports
+        self.useTessellation = False
+
+    def add_metrics_sink(self, sink):
+        '''
+        Registers a sink receiving the per-request metrics records, see metrics.RequestMetrics
+
+        Args:
+            - sink (callable): Called with each record (dict)
+        '''
+
+        self._api.metrics.add_sink(sink)
+
+    def metrics_summary(self, table=True):
+        '''
+        Args:
+            - table (bool, default=True): Human readable table, or the summary dict (see metrics.RequestMetrics.summary)
+
+        Returns:
+            - str: Table summarizing the requests and cache accesses
+        '''
+
+        if table:
+            return self._api.metrics.summary_table()
+        return self._api.metrics.summary()
+
+    def connection_stats(self):
+        '''
+        Reports how well the keep-alive connections to the API were reused.
+
+        Returns:
+            - dict: host -> {'requests': int, 'connections': int, 'reused': int}
+        '''
+
+        return self._api.connection_stats()
+
+    def trim_cache(self):
+        '''
+        Waits for the uploads to the cache server, if any, then evicts the least
+        recently used entries if the cache exceeds its maximum size, except the ones
+        used by this client, whose paths may still be in use. Called once the export
+        is done.
+
+        Returns:
+            - int: Number of entries removed
+        '''
+
+        self._cache.flush()
+        return self._cache.trim(accessed_before=self._started)
 
     def cache_get(self, method, key, callback, isString=False):
-        if isinstance(key, tuple):
-            key = '_'.join(list(key))
-        fileName = method + '__' + key
-        dirName = os.path.dirname(os.path.abspath(__file__)) + '/cache'
-        if not os.path.exists(dirName):
-            os.mkdir(dirName)
-        fileName = dirName + '/' + fileName
-        if os.path.exists(fileName):
-            f = open(fileName, 'rb')
-            result = f.read()
-            f.close()
+        result = self._cache.get(method, key)
+        if result is None:
+            # Another thread or process may be filling the same entry
+            with self._cache.lock(method, key):
+                result = self._cache.get(method, key)
+                self._api.metrics.cache(method, result is not None)
+                if result is None:
+                    result = callback().content
+                    self._cache.put(method, key, result)
         else:
-            result = callback().content
-            f = open(fileName, 'wb')
-            f.write(result)
-            f.close()
+            self._api.metrics.cache(method, True)
         if isString and isinstance(result, bytes):
             result = result.decode('utf-8')
         return result
 
+    def cache_revalidate(self, method, key, callback):
+        '''
+        Cache for the calls that are not pinned to a microversion, and can change
+        over time. The response is stored with its ETag / Last-Modified validators,
+        and sent back in If-None-Match / If-Modified-Since headers, so that an
+        unchanged response costs a 304 instead of a full download.
+
+        The validators are stored in the index, with the entry.
+
+        Args:
+            - method (str): Name of the cached call
+            - key (str or tuple): Key of the entry
+            - callback (callable): Issues the request, given the conditional headers
+
+        Returns:
+            - bytes: Content of the response
+        '''
+
+        result, validators = self._cache.get(method, key, with_meta=True)
+        validators = validators or {}
+
+        headers = {}
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'lastModified' in validators:
+            headers['If-Modified-Since'] = validators['lastModified']
+
+        res = callback(headers)
+        self._api.metrics.cache(method, res.status_code == 304 and result is not None)
+        if res.status_code == 304 and result is not None:
+            return result
+
+        result = res.content
+        validators = {}
+        if 'ETag' in res.headers:
+            validators['etag'] = res.headers['ETag']
+        if 'Last-Modified' in res.headers:
+            validators['lastModified'] = res.headers['Last-Modified']
+        self._cache.put(method, key, result, validators)
+
+        return result
+
+    def cache_wvm(self, method, key, type, callback):
+        '''
+        Caches a call made on a workspace, version or microversion: versions and
+        microversions are immutable and cached for good, while workspaces are
+        revalidated (see cache_revalidate)
+
+        Args:
+            - method (str): Name of the cached call
+            - key (str or tuple): Key of the entry
+            - type (str): 'w', 'v' or 'm'
+            - callback (callable): Issues the request, given the conditional headers
+
+        Returns:
+            - bytes: Content of the response
+        '''
+
+        if type in ('v', 'm'):
+            return self.cache_get(method, key, lambda: callback({}))
+        return self.cache_revalidate(method, key, callback)
+
+    def cache_get_file(self, method, key, callback):
+        '''
+        Same as cache_get, but the response (requested with stream=True) is streamed
+        to the cache entry and its path is returned instead of its content. This is used for large downloads
+        like meshes. The file is shared by all the entries with the same content, and must not be modified.
+
+        Returns:
+            - str: Path of the cache entry
+        '''
+
+        fileName = self._cache.path(method, key)
+        if fileName is None:
+            with self._cache.lock(method, key):
+                fileName = self._cache.path(method, key)
+                self._api.metrics.cache(method, fileName is not None)
+                if fileName is None:
+                    res = callback()
+                    fileName, length = cache_write_stream(self._cache, method, key, res)
+                    self._api.stream_done(res, length)
+        else:
+            self._api.metrics.cache(method, True)
+        return fileName
+
 #-------------------------------------------------------------------------------
 
     def list_documents(self):
@@ -88,17 +338,48 @@ class Client():
 
         return self._api.request('get', '/api/documents')
 
-    def get_document(self, did, args={}):
+    def get_document(self, did, args={}, revalidate=True):
         '''
         Get details for a specified document.
 
         Args:
             - did (str): Document ID
+            - revalidate (bool, default=True): If False, a cached response is used without checking it
 
         Returns:
-            - requests.Response: Onshape response data
+            - dict: Onshape response data
         '''
-        return self._api.request('get', '/api/documents/' + did, query=args)
+
+        def invoke(headers):
+            return self._api.request('get', '/api/documents/' + did, query=args, headers=headers)
+
+        key = (did, args_key(args))
+        if not revalidate:
+            result = self._cache.get('document', key)
+            if result is not None:
+                self._api.metrics.cache('document', True)
+                return codec.loads(result)
+
+        return codec.loads(self.cache_revalidate('document', key, invoke))
+
+    def get_current_microversion(self, did, wid, type='w'):
+        '''
+        Gets the current microversion of a workspace (or version), which fully
+        identifies the state of the document. This is never cached.
+
+        Args:
+            - did (str): Document ID
+            - wid (str): Workspace (or version) ID
+            - type (str, default='w'): 'w' or 'v'
+
+        Returns:
+            - str: Microversion ID
+        '''
+
+        res = self._api.request(
+            'get',
+            '/api/documents/d/' + did + '/' + type + '/' + wid + '/currentmicroversion')
+        return codec.loads(res.content)['microversion']
 
     def list_workspaces(self, did, args={}):
         '''
@@ -123,34 +404,61 @@ class Client():
     def list_elements(self, did, wid, type='w', args={}):
         '''
         Get the list of elements in a given document
+
+        Returns:
+            - list: Onshape response data
         '''
 
-        return self._api.request(
-            'get',
-            '/api/documents/d/' +
-            did +
-            '/' +
-            type +
-            '/' +
-            wid +
-            '/elements', query=args)
+        def invoke(headers):
+            return self._api.request(
+                'get',
+                '/api/documents/d/' +
+                did +
+                '/' +
+                type +
+                '/' +
+                wid +
+                '/elements', query=args, headers=headers)
+
+        return codec.loads(
+            self.cache_wvm(
+                'elements',
+                (did, type, wid, args_key(args)),
+                type,
+                invoke))
 
     def get_assembly(self, did, wid, eid, type='w', configuration='default', args={}):
-        return self._api.request(
-            'get',
-            '/api/assemblies/d/' +
-            did +
-            '/' +
-            type +
-            '/' +
-            wid +
-            '/e/' +
-            eid,
-            query={
-                'includeMateFeatures': 'true',
-                'includeMateConnectors': 'true',
-                'includeNonSolids': 'true',
-                'configuration': configuration} | args)
+        '''
+        Gets the assembly definition, with mate features, mate connectors and non solids
+
+        Returns:
+            - dict: Onshape response data
+        '''
+
+        def invoke(headers):
+            return self._api.request(
+                'get',
+                '/api/assemblies/d/' +
+                did +
+                '/' +
+                type +
+                '/' +
+                wid +
+                '/e/' +
+                eid,
+                query={
+                    'includeMateFeatures': 'true',
+                    'includeMateConnectors': 'true',
+                    'includeNonSolids': 'true',
+                    'configuration': configuration} | args,
+                headers=headers)
+
+        return codec.loads(
+            self.cache_wvm(
+                'assembly',
+                (did, type, wid, eid, configuration, args_key(args)),
+                type,
+                invoke))
 
     def get_features(self, did, wid, eid, type='w', args={}):
         '''
@@ -162,21 +470,30 @@ class Client():
             - eid (str): Element ID
 
         Returns:
-            - requests.Response: Onshape response data
+            - dict: Onshape response data
         '''
 
-        return self._api.request(
-            'get',
-            '/api/assemblies/d/' +
-            did +
-            '/' +
-            type +
-            '/' +
-            wid +
-            '/e/' +
-            eid +
-            '/features',
-            query=args)
+        def invoke(headers):
+            return self._api.request(
+                'get',
+                '/api/assemblies/d/' +
+                did +
+                '/' +
+                type +
+                '/' +
+                wid +
+                '/e/' +
+                eid +
+                '/features',
+                query=args,
+                headers=headers)
+
+        return codec.loads(
+            self.cache_wvm(
+                'features',
+                (did, type, wid, eid, args_key(args)),
+                type,
+                invoke))
 
     def get_assembly_features(self, did, wid, eid, args={}):
         '''
@@ -241,7 +558,7 @@ class Client():
                     'includeGeometry': 'true',
                     'configuration': configuration})
 
-        return json.loads(
+        return codec.loads(
             self.cache_get(
                 'sketches',
                 (did,
@@ -263,17 +580,36 @@ class Client():
                 query={
                     'configuration': configuration})
 
-        return json.loads(
-            self.cache_get(
-                'parts_list',
-                (did,
-                 mid,
-                 eid,
-                 configuration),
-                invoke))
+        return self._memo.get(
+            ('parts_list', did, mid, eid, configuration),
+            lambda: codec.loads(
+                self.cache_get(
+                    'parts_list',
+                    (did,
+                     mid,
+                     eid,
+                     configuration),
+                    invoke)))
 
 #-------------------------------------------------------------------------------
 
+    def get_parts_index(self, did, mid, eid, configuration):
+        '''
+        Indexes the parts list of an element, built once per (element, configuration)
+
+        Returns:
+            - dict: {'byId': partId -> name, 'byName': name -> partId}
+        '''
+
+        def build():
+            index = {'byId': {}, 'byName': {}}
+            for entry in self.get_parts(did, mid, eid, configuration):
+                index['byId'][entry['partId']] = entry['name']
+                index['byName'].setdefault(entry['name'], entry['partId'])
+            return index
+
+        return self._memo.get(('parts_index', did, mid, eid, configuration), build)
+
     def find_new_partid(
             self,
             did,
@@ -282,22 +618,161 @@ class Client():
             partid,
             configuration_before,
             configuration):
-        before = self.get_parts(did, mid, eid, configuration_before)
-        name = None
-        for entry in before:
-            if entry['partId'] == partid:
-                name = entry['name']
+        name = self.get_parts_index(did, mid, eid, configuration_before)['byId'].get(partid)
 
         if name is not None:
-            after = self.get_parts(did, mid, eid, configuration)
-            for entry in after:
-                if entry['name'] == name:
-                    return entry['partId']
+            after = self.get_parts_index(did, mid, eid, configuration)['byName']
+            if name in after:
+                return after[name]
         else:
             print("OnShape ERROR: Can't find new partid for " + str(partid))
 
         return partid
 
+    def part_studio_mass_properties(self, did, mid, eid, configuration='default'):
+        '''
+        Gets the mass properties of all the parts of a part studio, in one call
+
+        Returns:
+            - dict: Onshape response data, with a 'bodies' entry per partId
+        '''
+
+        def invoke():
+            return self._api.request(
+                'get',
+                '/api/partstudios/d/' +
+                did +
+                '/m/' +
+                mid +
+                '/e/' +
+                eid +
+                '/massproperties',
+                query={
+                    'configuration': configuration,
+                    'massAsGroup': 'false'})
+
+        return codec.loads(
+            self.cache_get(
+                'partstudio_massproperties',
+                (did,
+                 mid,
+                 eid,
+                 configuration),
+                invoke,
+                True))
+
+    def group_parts(self, parts):
+        '''
+        Groups parts by the part studio (and configuration) they come from
+
+        Args:
+            - parts (iterable): (documentId, microversion, elementId, partId, configuration) tuples
+
+        Returns:
+            - dict: (documentId, microversion, elementId, configuration) -> set of partIds
+        '''
+
+        groups = {}
+        for did, mid, eid, partid, configuration in parts:
+            groups.setdefault((did, mid, eid, configuration), set()).add(partid)
+        return groups
+
+    def fetch_parts_group(self, did, mid, eid, configuration, partids, metadata=True, massproperties=True):
+        '''
+        Fetches the metadata (from the parts list) and mass properties of all the parts
+        of a part studio in bulk, and fills the per-part cache entries used by
+        part_get_metadata and part_mass_properties. Nothing is fetched if the
+        entries of all the given parts are already in the cache.
+
+        Args:
+            - did (str): Document ID
+            - mid (str): Microversion ID
+            - eid (str): Element ID
+            - configuration (str): Configuration of the parts
+            - partids (iterable): Parts for which entries are wanted
+            - metadata (bool, default=True): Fill metadata entries
+            - massproperties (bool, default=True): Fill mass properties entries
+        '''
+
+        def missing(method):
+            keys = {partid: (did, mid, eid, self.hash_partid(partid), configuration) for partid in partids}
+            found = self._cache.contains_many(method, keys.values())
+            return {partid: key for partid, key in keys.items() if key not in found}
+
+        # Other processes exporting parts of the same part studio wait for this fill
+        group = (did, mid, eid, configuration)
+
+        if metadata and missing('metadata'):
+            with self._cache.lock('parts_group_metadata', group):
+                keys = missing('metadata')
+                if keys:
+                    for entry in self.get_parts(did, mid, eid, configuration):
+                        if entry['partId'] in keys:
+                            self._cache.put('metadata', keys[entry['partId']], codec.dumps_bytes(entry))
+
+        if massproperties and missing('massproperties'):
+            with self._cache.lock('parts_group_massproperties', group):
+                keys = missing('massproperties')
+                if keys:
+                    result = self.part_studio_mass_properties(did, mid, eid, configuration)
+                    for partid, key in keys.items():
+                        if partid in result['bodies']:
+                            entry = dict(result)
+                            entry['bodies'] = {partid: result['bodies'][partid]}
+                            self._cache.put('massproperties', key, codec.dumps_bytes(entry))
+
+    def fetch_tessellated_group(self, did, mid, eid, configuration, partids):
+        '''
+        Fetches the tessellated faces of all the parts of a part studio in one call,
+        and writes the 'part_tess_stl' binary STL cache entries used by part_studio_stl_m
+        (with useTessellation) for the given parts. Nothing is fetched if all the
+        entries are already in the cache.
+
+        Args:
+            - did (str): Document ID
+            - mid (str): Microversion ID
+            - eid (str): Element ID
+            - configuration (str): Configuration of the parts
+            - partids (iterable): Parts for which meshes are wanted
+        '''
+
+        # Parts and configuration actually exported, grouped by configuration
+        keys = {}
+        for partid in partids:
+            stl_partid, stl_configuration = self.stl_part(did, mid, eid, partid, configuration)
+            keys[(stl_partid, stl_configuration)] = (did, mid, eid, self.hash_partid(stl_partid), stl_configuration)
+
+        targets = {}
+        found = self._cache.contains_many('part_tess_stl', keys.values())
+        for (stl_partid, stl_configuration), key in keys.items():
+            if key not in found:
+                targets.setdefault(stl_configuration, {})[stl_partid] = key
+
+        for stl_configuration, keys in targets.items():
+            with self._cache.lock('tessellatedfaces', (did, mid, eid, stl_configuration)):
+                self._fetch_tessellated(did, mid, eid, stl_configuration, keys)
+
+    def _fetch_tessellated(self, did, mid, eid, stl_configuration, keys):
+        found = self._cache.contains_many('part_tess_stl', keys.values())
+        keys = {partid: key for partid, key in keys.items() if key not in found}
+        if keys:
+            res = self._api.request(
+                'get',
+                '/api/partstudios/d/' +
+                did +
+                '/m/' +
+                mid +
+                '/e/' +
+                eid +
+                '/tessellatedfaces',
+                query={
+                    'configuration': stl_configuration})
+
+            for body in codec.loads(res.content):
+                if body['id'] in keys:
+                    vertices, normals = tessellation.body_facets(body)
+                    self._cache.put('part_tess_stl', keys[body['id']], tessellation.stl_bytes(vertices, normals))
+
     def hash_partid(self, data):
         m = hashlib.sha1()
         m.update(data.encode('utf-8'))
@@ -337,24 +812,87 @@ class Client():
             eid,
             partid,
             configuration='default'):
+        '''
+        Exports the STL mesh of a part (in meters), streamed to the cache. With
+        useTessellation, the mesh is built from the tessellation of the part studio
+        instead (the STL is exported for the parts missing from it).
+
+        Returns:
+            - str: Path of the binary STL file in the cache
+        '''
+
+        key = ('part_tess_stl' if self.useTessellation else 'part_stl', did, mid, eid, partid, configuration)
+        fileName = self._memo.get(key, lambda: self._part_studio_stl_m(did, mid, eid, partid, configuration))
+        if not os.path.exists(fileName):
+            # Evicted (e.g. by another process) since it was memoized, resolved again
+            self._memo.discard(key)
+            fileName = self._memo.get(key, lambda: self._part_studio_stl_m(did, mid, eid, partid, configuration))
+        return fileName
+
+    def part_assets_cached(self, assets):
+        '''
+        Checks which meshes, metadata or mass properties of parts are in the cache,
+        with one lookup per kind of asset. The parts lists may be fetched to resolve
+        the parts of the collisions configuration.
+
+        Args:
+            - assets (iterable): (kind, documentId, microversion, elementId, partId, configuration)
+              tuples, kind being 'stl', 'metadata' or 'massproperties'
+
+        Returns:
+            - set: The assets in the cache
+        '''
+
+        keys = {}
+        for asset in assets:
+            kind, did, mid, eid, partid, configuration = asset
+            if kind == 'stl':
+                partid, configuration = self.stl_part(did, mid, eid, partid, configuration)
+                kind = 'part_tess_stl' if self.useTessellation else 'part_stl'
+            keys.setdefault(kind, {})[asset] = (did, mid, eid, self.hash_partid(partid), configuration)
+
+        cached = set()
+        for kind, kind_keys in keys.items():
+            found = self._cache.contains_many(kind, kind_keys.values())
+            cached.update(asset for asset, key in kind_keys.items() if key in found)
+
+        # The parts missing from the tessellation are exported as STL
+        missing = {asset: key for asset, key in keys.get('part_tess_stl', {}).items() if asset not in cached}
+        if missing:
+            found = self._cache.contains_many('part_stl', missing.values())
+            cached.update(asset for asset, key in missing.items() if key in found)
+        return cached
+
+    def stl_part(self, did, mid, eid, partid, configuration):
+        '''
+        Gets the part and configuration actually exported for the mesh of a part,
+        which differ when the collisions configuration is used
+
+        Returns:
+            - tuple: (partId, configuration)
+        '''
+
         if self.useCollisionsConfigurations:
             configuration_before = configuration
-            parts = configuration.split(';')
-            partIdChanged = False
-            result = ''
-            for k, part in enumerate(parts):
-                kv = part.split('=')
-                if len(kv) == 2:
-                    if kv[0] == 'collisions':
-                        kv[1] = 'true'
-                        partIdChanged = True
-                parts[k] = '='.join(kv)
-            configuration = ';'.join(parts)
+            configuration, partIdChanged = collisions_configuration(configuration)
 
             if partIdChanged:
                 partid = self.find_new_partid(
                     did, mid, eid, partid, configuration_before, configuration)
 
+        return partid, configuration
+
+    def _part_studio_stl_m(self, did, mid, eid, partid, configuration):
+        if self.useTessellation:
+            self.fetch_tessellated_group(did, mid, eid, configuration, [partid])
+            stl_partid, stl_configuration = self.stl_part(did, mid, eid, partid, configuration)
+            fileName = self._cache.path(
+                'part_tess_stl', (did, mid, eid, self.hash_partid(stl_partid), stl_configuration))
+            if fileName is not None:
+                return fileName
+
+        partid, configuration = self.stl_part(did, mid, eid, partid, configuration)
+
         def invoke():
             req_headers = {
                 'Accept': 'application/vnd.onshape.v1+octet-stream'
@@ -374,9 +912,10 @@ class Client():
                     'mode': 'binary',
                     'units': 'meter',
                     'configuration': configuration},
-                headers=req_headers)
+                headers=req_headers,
+                stream=True)
 
-        return self.cache_get(
+        return self.cache_get_file(
             'part_stl',
             (did,
              mid,
@@ -407,16 +946,18 @@ class Client():
                 query={
                     'configuration': configuration})
 
-        return json.loads(
-            self.cache_get(
-                'metadata',
-                (did,
-                 mid,
-                 eid,
-                 self.hash_partid(partid),
-                 configuration),
-                invoke,
-                True))
+        return self._memo.get(
+            ('metadata', did, mid, eid, partid, configuration),
+            lambda: codec.loads(
+                self.cache_get(
+                    'metadata',
+                    (did,
+                     mid,
+                     eid,
+                     self.hash_partid(partid),
+                     configuration),
+                    invoke,
+                    True)))
 
     def part_mass_properties(
             self,
@@ -440,13 +981,15 @@ class Client():
                 query={
                     'configuration': configuration})
 
-        return json.loads(
-            self.cache_get(
-                'massproperties',
-                (did,
-                 mid,
-                 eid,
-                 self.hash_partid(partid),
-                 configuration),
-                invoke,
-                True))
+        return self._memo.get(
+            ('massproperties', did, mid, eid, partid, configuration),
+            lambda: codec.loads(
+                self.cache_get(
+                    'massproperties',
+                    (did,
+                     mid,
+                     eid,
+                     self.hash_partid(partid),
+                     configuration),
+                    invoke,
+                    True)))
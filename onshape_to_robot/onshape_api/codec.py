@@ -0,0 +1,72 @@
+'''
+codec
+=====
+
+JSON encoding and decoding of the API payloads and cache entries, using orjson
+when it is installed and the standard library otherwise. Users config.json
+files (which may hold comments) are still read with commentjson.
+'''
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__all__ = [
+    'loads',
+    'dumps',
+    'dumps_bytes',
+    'backend'
+]
+
+if orjson is not None:
+    backend = 'orjson'
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+else:
+    backend = 'json'
+
+
+def loads(data):
+    '''
+    Args:
+        - data (bytes or str): JSON document
+
+    Returns:
+        - The decoded object
+    '''
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj):
+    '''
+    Args:
+        - obj: Object to encode
+
+    Returns:
+        - bytes: UTF-8 encoded JSON document
+    '''
+
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_OPTIONS)
+        except TypeError:
+            # e.g. integers over 64 bits, that the standard library handles
+            pass
+    return json.dumps(obj).encode('utf-8')
+
+
+def dumps(obj):
+    '''
+    Args:
+        - obj: Object to encode
+
+    Returns:
+        - str: JSON document
+    '''
+
+    return dumps_bytes(obj).decode('utf-8')
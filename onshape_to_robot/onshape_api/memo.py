@@ -0,0 +1,94 @@
+'''
+memo
+====
+
+In-memory memoization of the client calls
+'''
+
+import threading
+from collections import OrderedDict
+
+__all__ = [
+    'SingleFlightMemo'
+]
+
+
+class _Flight():
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightMemo():
+    '''
+    Bounded (least recently used) memo of resolved values. When several threads
+    ask for the same key at the same time, only one computes it while the others
+    wait for its result.
+
+    Attributes:
+        - maxsize (int, default=4096): Maximum number of values kept
+    '''
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._values = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        '''
+        Gets the value for a key, computing it if needed
+
+        Args:
+            - key (hashable): Key of the value
+            - compute (callable): Computes the value, called at most once for concurrent callers
+
+        Returns:
+            - The value
+        '''
+
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+
+            flight = self._inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = _Flight()
+                self._inflight[key] = flight
+
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if flight.error is None:
+                    self._values[key] = flight.value
+                    while len(self._values) > self.maxsize:
+                        self._values.popitem(last=False)
+            flight.event.set()
+
+        return flight.value
+
+    def discard(self, key):
+        '''
+        Forgets the value of a key, so that it is computed again
+        '''
+
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
@@ -0,0 +1,176 @@
+'''
+metrics
+=======
+
+Per-request instrumentation of the API client
+'''
+
+from . import codec
+
+import re
+import threading
+
+__all__ = [
+    'RequestMetrics',
+    'JsonLinesSink',
+    'endpoint_template'
+]
+
+# 24 hex chars identifiers (documents, workspaces, versions, microversions, elements)
+ID_RE = re.compile(r'/[0-9a-f]{24}(?=/|$)')
+WVM_RE = re.compile(r'/(d|w|v|m|e|partid)/[^/]+')
+
+
+def endpoint_template(path):
+    '''
+    Removes the identifiers from a request path, so that requests can be grouped
+
+    Args:
+        - path (str): e.g. /api/parts/d/abc.../m/def.../e/123.../partid/JHD/stl
+
+    Returns:
+        - str: e.g. /api/parts/d/:d/m/:m/e/:e/partid/:partid/stl
+    '''
+
+    path = WVM_RE.sub(lambda m: '/' + m.group(1) + '/:' + m.group(1), path)
+    return ID_RE.sub('/:id', path)
+
+
+class JsonLinesSink():
+    '''
+    Sink appending each record as a JSON line to a file
+
+    Attributes:
+        - path (str): Path of the file
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = codec.dumps(record)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class RequestMetrics():
+    '''
+    Collects the records of the requests and cache accesses, and forwards each of
+    them to the registered sinks (callables taking the record dict).
+
+    Request records have the fields: type ('request'), method, endpoint, status,
+    latency (s), bytes (transferred), decodedBytes (after decompression), redirects
+    and retries.
+
+    Cache records have the fields: type ('cache'), method (name of the cached call)
+    and hit (bool).
+    '''
+
+    def __init__(self):
+        self._sinks = []
+        self._records = []
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink):
+        '''
+        Args:
+            - sink (callable): Called with each record
+        '''
+
+        self._sinks.append(sink)
+
+    def record(self, record):
+        with self._lock:
+            self._records.append(record)
+        for sink in self._sinks:
+            sink(record)
+
+    def request(self, method, endpoint, status, latency, size, redirects=0, retries=0, decoded_size=None):
+        self.record({
+            'type': 'request',
+            'method': method,
+            'endpoint': endpoint,
+            'status': status,
+            'latency': latency,
+            'bytes': size,
+            'decodedBytes': size if decoded_size is None else decoded_size,
+            'redirects': redirects,
+            'retries': retries
+        })
+
+    def cache(self, method, hit):
+        self.record({
+            'type': 'cache',
+            'method': method,
+            'hit': hit
+        })
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def summary(self):
+        '''
+        Aggregates the records
+
+        Returns:
+            - dict: with 'requests' (endpoint -> {count, latency, bytes, decodedBytes, redirects, retries, errors})
+              and 'cache' (method -> {hits, misses})
+        '''
+
+        requests, cache = {}, {}
+        for record in self.records():
+            if record['type'] == 'request':
+                entry = requests.setdefault(record['endpoint'], {
+                    'count': 0, 'latency': 0., 'bytes': 0, 'decodedBytes': 0, 'redirects': 0, 'retries': 0,
+                    'errors': 0})
+                entry['count'] += 1
+                entry['latency'] += record['latency']
+                entry['bytes'] += record['bytes'] or 0
+                entry['decodedBytes'] += record['decodedBytes'] or 0
+                entry['redirects'] += record['redirects']
+                entry['retries'] += record['retries']
+                if record['status'] is None or record['status'] >= 400:
+                    entry['errors'] += 1
+            else:
+                entry = cache.setdefault(record['method'], {'hits': 0, 'misses': 0})
+                entry['hits' if record['hit'] else 'misses'] += 1
+
+        return {'requests': requests, 'cache': cache}
+
+    def summary_table(self):
+        '''
+        Returns:
+            - str: Human readable summary of the requests and cache accesses
+        '''
+
+        summary = self.summary()
+        lines = []
+        if summary['requests']:
+            lines.append('%-60s %6s %10s %10s %10s %5s %5s' %
+                         ('endpoint', 'count', 'total (s)', 'mean (ms)', 'kB', 'redir', 'retry'))
+            for endpoint, entry in sorted(summary['requests'].items(), key=lambda item: -item[1]['latency']):
+                lines.append('%-60s %6d %10.2f %10.1f %10.1f %5d %5d' % (
+                    endpoint[-60:],
+                    entry['count'],
+                    entry['latency'],
+                    1000 * entry['latency'] / entry['count'],
+                    entry['bytes'] / 1024.,
+                    entry['redirects'],
+                    entry['retries']))
+            downloaded = sum(entry['bytes'] for entry in summary['requests'].values())
+            decoded = sum(entry['decodedBytes'] for entry in summary['requests'].values())
+            lines.append('downloaded %.1f kB (%.1f kB decoded, %.1fx)' % (
+                downloaded / 1024., decoded / 1024., decoded / max(1, downloaded)))
+        if summary['cache']:
+            lines.append('%-60s %6s %6s' % ('cache', 'hits', 'misses'))
+            for method, entry in sorted(summary['cache'].items()):
+                lines.append('%-60s %6d %6d' % (method, entry['hits'], entry['misses']))
+
+        return '\n'.join(lines)
@@ -6,26 +6,49 @@ Provides access to the Onshape REST API
 '''
 
 from . import utils
+from . import codec
+from .scheduler import RequestScheduler, RETRY_STATUSES, FAILED, status_outcome
+from .metrics import RequestMetrics, endpoint_template
+from .replay import ResponseRecorder, record_response
 
 import os
 import random
 import string
-import commentjson as json
+import commentjson
 import hmac
 import hashlib
 import base64
 import urllib
 import datetime
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from colorama import Fore, Back, Style
 from urllib.parse import urlparse
 from urllib.parse import parse_qs
 
 __all__ = [
-    'Onshape'
+    'Onshape',
+    'OnshapeError'
 ]
 
 
+class OnshapeError(Exception):
+    '''
+    Raised when a request to the Onshape API fails for good
+
+    Attributes:
+        - url (str): Requested URL
+        - status (int): HTTP status, None if no response was received
+    '''
+
+    def __init__(self, message, url, status=None):
+        super().__init__(message + ' (' + url + ')')
+        self.url = url
+        self.status = status
+
+
 class Onshape():
     '''
     Provides access to the Onshape REST API.
@@ -34,9 +57,27 @@ class Onshape():
         - stack (str): Base URL
         - creds (str, default='./creds.json'): Credentials location
         - logging (bool, default=True): Turn logging on or off
+        - pool_connections (int, default=4): Number of hosts kept in each session's pool
+        - pool_maxsize (int, default=16): Maximum number of keep-alive connections per host
+        - requests_per_second (float, default=None): Requests budget shared by all callers, None for no limit
+        - max_retries (int, default=5): Number of retries of throttled or failed requests
+        - redirect_ttl (float, default=300): Time (s) redirect targets are remembered, 0 to disable
+        - base_url (str, default=None): Overrides the API URL of the credentials
+        - record_dir (str, default=None): Directory where the requests and responses are recorded
     '''
 
-    def __init__(self, stack, creds='./config.json', logging=True):
+    def __init__(
+            self,
+            stack,
+            creds='./config.json',
+            logging=True,
+            pool_connections=4,
+            pool_maxsize=16,
+            requests_per_second=None,
+            max_retries=5,
+            redirect_ttl=300,
+            base_url=None,
+            record_dir=None):
         '''
         Instantiates an instance of the Onshape class. Reads credentials from a JSON file
         of this format:
@@ -55,6 +96,13 @@ class Onshape():
         Args:
             - stack (str): Base URL
             - creds (str, default='./config.json'): Credentials location
+            - pool_connections (int, default=4): Number of hosts kept in each session's pool
+            - pool_maxsize (int, default=16): Maximum number of keep-alive connections per host
+            - requests_per_second (float, default=None): Requests budget shared by all callers, None for no limit
+            - max_retries (int, default=5): Number of retries of throttled or failed requests
+            - redirect_ttl (float, default=300): Time (s) redirect targets are remembered, 0 to disable
+            - base_url (str, default=None): Overrides the API URL of the credentials
+            - record_dir (str, default=None): Directory where the requests and responses are recorded
         '''
 
         if not os.path.isfile(creds):
@@ -62,9 +110,31 @@ class Onshape():
 
         self._logging = logging
 
+        # One keep-alive session per host (the API host and the hosts we get
+        # redirected to for blob downloads), shared by all threads
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+        # Hosts requests were redirected to (for the same path), per endpoint
+        # family, used directly until they expire or reject a request
+        self._redirect_ttl = redirect_ttl
+        self._redirects = {}
+        self._redirects_lock = threading.Lock()
+
+        # Per-request records, see metrics.RequestMetrics
+        self.metrics = RequestMetrics()
+
+        # Pacing and retries, the concurrency can't exceed the connections pool
+        self._scheduler = RequestScheduler(
+            requests_per_second=requests_per_second,
+            max_concurrency=pool_maxsize,
+            max_retries=max_retries)
+
         with open(creds) as f:
             try:
-                config = json.load(f)
+                config = commentjson.load(f)
                 self._url = config["onshape_api"]
                 self._access_key = config['onshape_access_key'].encode('utf-8')
                 self._secret_key = config['onshape_secret_key'].encode('utf-8')
@@ -105,11 +175,119 @@ class Onshape():
                 if self._url is None or self._access_key is None or self._secret_key is None:
                     exit('No key in config.json, and environment variables not set')
 
+        if base_url is not None:
+            self._url = base_url
+
+        # Recording of the request/response pairs, see replay.py
+        self._record_dir = record_dir
+        if record_dir is not None:
+            os.makedirs(record_dir, exist_ok=True)
+
         if self._logging:
             utils.log(
                 'onshape instance created: url = %s, access key = %s' %
                 (self._url, self._access_key))
 
+    def _session(self, base_url):
+        '''
+        Get the pooled session used to talk to a given host, creating it on first use.
+
+        Connections are kept alive and reused between requests; when all the
+        connections of a host are busy, callers wait for one to be released
+        instead of opening throwaway connections.
+
+        Args:
+            - base_url (str): Host, including scheme and port
+
+        Returns:
+            - requests.Session: Session bound to this host
+        '''
+
+        with self._sessions_lock:
+            session = self._sessions.get(base_url)
+            if session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=self._pool_connections,
+                    pool_maxsize=self._pool_maxsize,
+                    pool_block=True)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[base_url] = session
+
+                if self._logging:
+                    utils.log('session created for ' + base_url)
+
+            return session
+
+    def connection_stats(self):
+        '''
+        Reports how well connections were reused, per host
+
+        Returns:
+            - dict: host -> {'requests': int, 'connections': int, 'reused': int}
+        '''
+
+        stats = {}
+        with self._sessions_lock:
+            sessions = list(self._sessions.items())
+
+        for base_url, session in sessions:
+            adapter = session.get_adapter(base_url)
+            requests_count, connections_count = 0, 0
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+            stats[base_url] = {
+                'requests': requests_count,
+                'connections': connections_count,
+                'reused': requests_count - connections_count
+            }
+
+        return stats
+
+    def close(self):
+        '''
+        Closes all the pooled sessions
+        '''
+
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    def _redirect_target(self, endpoint):
+        '''
+        Gets the host requests of an endpoint family were last redirected to, if it is still valid
+
+        Args:
+            - endpoint (str): Endpoint template, see metrics.endpoint_template
+
+        Returns:
+            - str: Host, including scheme and port, None if unknown or expired
+        '''
+
+        with self._redirects_lock:
+            entry = self._redirects.get(endpoint)
+            if entry is None:
+                return None
+            target, expires = entry
+            if time.monotonic() > expires:
+                del self._redirects[endpoint]
+                return None
+            return target
+
+    def _learn_redirect(self, endpoint, target):
+        if self._redirect_ttl > 0:
+            with self._redirects_lock:
+                self._redirects[endpoint] = (target, time.monotonic() + self._redirect_ttl)
+
+    def _forget_redirect(self, endpoint):
+        with self._redirects_lock:
+            self._redirects.pop(endpoint, None)
+
     def _make_nonce(self):
         '''
         Generate a unique ID for the request, 25 chars in length
@@ -213,7 +391,10 @@ class Onshape():
             'On-Nonce': nonce,
             'Authorization': auth,
             'User-Agent': 'Onshape Python Sample App',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            # Large JSON payloads compress very well, bodies are decoded
+            # transparently (including when streamed)
+            'Accept-Encoding': 'gzip, deflate'
         }
 
         # add in user-defined headers
@@ -222,6 +403,66 @@ class Onshape():
 
         return req_headers
 
+    def _send(self, method, base_url, path, query, headers, body, stream):
+        '''
+        Sends a request through the scheduler, retrying it when the API throttles
+        or fails transiently
+
+        Returns:
+            - tuple: (requests.Response, number of retries)
+        '''
+
+        url = base_url + path + '?' + urllib.parse.urlencode(query)
+        session = self._session(base_url)
+        attempt = 0
+        while True:
+            # Signing again on each attempt, since the nonce can't be reused
+            req_headers = self._make_headers(method, path, query, headers)
+            if self._logging:
+                utils.log(req_headers)
+
+            self._scheduler.acquire()
+            # Any other error (or an interruption) also gives the slot back
+            outcome = FAILED
+            res = None
+            try:
+                res = session.request(
+                    method,
+                    url,
+                    headers=req_headers,
+                    data=body,
+                    allow_redirects=False,
+                    stream=True)
+                outcome = status_outcome(res.status_code)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt >= self._scheduler.max_retries:
+                    raise OnshapeError('Error while using OnShape API: ' + str(error), url)
+                reason = str(error)
+            finally:
+                self._scheduler.release(outcome)
+
+            if res is None:
+                delay = self._scheduler.retry_delay(attempt)
+            else:
+                if res.status_code not in RETRY_STATUSES or attempt >= self._scheduler.max_retries:
+                    break
+                reason = 'status ' + str(res.status_code)
+                delay = self._scheduler.retry_delay(attempt, res.headers.get('Retry-After'))
+                # Consuming the body releases the connection to the pool
+                res.content
+
+            print(Fore.YELLOW + 'WARNING: OnShape API request failed (' + reason + '), retrying in ' +
+                  ('%.1f' % delay) + 's' + Style.RESET_ALL)
+            time.sleep(delay)
+            attempt += 1
+
+        # Unless the caller streams the body, it is read here so that the
+        # transfer is accounted for in the request metrics
+        if not stream or res.status_code == 307 or not 200 <= res.status_code <= 206:
+            res.content
+
+        return res, attempt
+
     def request(
             self,
             method,
@@ -229,7 +470,8 @@ class Onshape():
             query={},
             headers={},
             body={},
-            base_url=None):
+            base_url=None,
+            stream=False):
         '''
         Issues a request to Onshape
 
@@ -240,62 +482,125 @@ class Onshape():
             - headers (dict, default={}): Key-value pairs of headers
             - body (dict, default={}): Body for POST request
             - base_url (str, default=None): Host, including scheme and port (if different from creds file)
+            - stream (bool, default=False): Leave the body unread, the caller has to iterate
+              over it (writing the chunks to res.recorder, if set) and then call stream_done()
 
         Returns:
             - requests.Response: Object containing the response from Onshape
         '''
 
-        req_headers = self._make_headers(method, path, query, headers)
         if base_url is None:
             base_url = self._url
-        url = base_url + path + '?' + urllib.parse.urlencode(query)
 
         if self._logging:
             utils.log(body)
-            utils.log(req_headers)
-            utils.log('request url: ' + url)
+            utils.log('request url: ' + base_url + path)
 
         # only parse as json string if we have to
-        body = json.dumps(body) if isinstance(body, dict) else body
+        body = codec.dumps(body) if isinstance(body, dict) else body
 
-        res = requests.request(
-            method,
-            url,
-            headers=req_headers,
-            data=body,
-            allow_redirects=False,
-            stream=True)
+        endpoint = endpoint_template(path)
+        request_path, request_query = path, query
+        start = time.monotonic()
+        redirects, retries = 0, 0
+        res = None
+
+        # Going directly to the host this kind of request was last redirected to
+        target = self._redirect_target(endpoint) if base_url == self._url else None
+        if target is not None:
+            try:
+                res, retries = self._send(method, target, path, query, headers, body, stream)
+            except OnshapeError:
+                res = None
+            if res is not None and not (200 <= res.status_code <= 206 or res.status_code == 304):
+                res.close()
+                res = None
+            if res is None:
+                if self._logging:
+                    utils.log('cached redirect target rejected the request: ' + target)
+                self._forget_redirect(endpoint)
+
+        while res is None:
+            res, attempts = self._send(method, base_url, path, query, headers, body, stream)
+            retries += attempts
+
+            if res.status_code != 307:
+                break
 
-        if res.status_code == 307:
             location = urlparse(res.headers["Location"])
             querystring = parse_qs(location.query)
 
             if self._logging:
                 utils.log('request redirected to: ' + location.geturl())
 
-            new_query = {}
             new_base_url = location.scheme + '://' + location.netloc
+            if redirects == 0 and location.path == path:
+                self._learn_redirect(endpoint, new_base_url)
+
+            query = {}
+            base_url = new_base_url
+            path = location.path
+            redirects += 1
+            res = None
 
             for key in querystring:
                 # won't work for repeated query params
-                new_query[key] = querystring[key][0]
-
-            return self.request(
-                method,
-                location.path,
-                query=new_query,
-                headers=headers,
-                base_url=new_base_url)
+                query[key] = querystring[key][0]
+
+        res.recorder = None
+        if self._record_dir is not None and (200 <= res.status_code <= 206):
+            if res._content_consumed:
+                record_response(self._record_dir, method, request_path, request_query, res)
+            else:
+                # Streamed, the caller records the chunks as it reads them (see client.cache_write_stream)
+                res.recorder = ResponseRecorder(self._record_dir, method, request_path, request_query, res)
+
+        res.metrics = {
+            'method': method,
+            'endpoint': endpoint,
+            'status': res.status_code,
+            'start': start,
+            'redirects': redirects,
+            'retries': retries
+        }
+        if res._content_consumed:
+            self.stream_done(res)
+
+        if res.status_code == 304:
+            # Only happens for conditional requests, the caller has the content
+            if self._logging:
+                utils.log('request not modified')
         elif not 200 <= res.status_code <= 206:
-            print(url)
-            print('! ERROR (' + str(res.status_code) + ') while using OnShape API')
-            if res.text:
-                print('! ' + res.text)
-            exit()
             if self._logging:
                 utils.log('request failed, details: ' + res.text, level=1)
-        else:
-            if self._logging:
-                utils.log('request succeeded, details: ' + res.text)
+            raise OnshapeError(
+                'ERROR (' + str(res.status_code) + ') while using OnShape API' +
+                ('\n! ' + res.text if res.text else ''),
+                res.url,
+                res.status_code)
+        elif self._logging:
+            utils.log('request succeeded, status %d' % res.status_code)
 
         return res
+
+    def stream_done(self, res, decoded_size=None):
+        '''
+        Records the metrics of a request once its body was read
+
+        Args:
+            - res (requests.Response): Response returned by request()
+            - decoded_size (int, default=None): Size of the decoded body, if it was streamed
+        '''
+
+        if decoded_size is None:
+            decoded_size = len(res.content)
+
+        self.metrics.request(
+            res.metrics['method'],
+            res.metrics['endpoint'],
+            res.metrics['status'],
+            time.monotonic() - res.metrics['start'],
+            res.raw.tell(),
+            res.metrics['redirects'],
+            res.metrics['retries'],
+            decoded_size)
@@ -0,0 +1,421 @@
+'''
+remote_cache
+============
+
+Cache of the API responses shared over HTTP: a client backend, a two-tier
+local+remote cache, and a small key/value server
+'''
+
+from .cache import CacheBackend, CacheStore, entry_key, workspace_entry
+from . import codec
+
+from colorama import Fore, Style
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import os
+import re
+import shutil
+import threading
+import requests
+
+__all__ = [
+    'HttpCache',
+    'TieredCache',
+    'CacheServer'
+]
+
+
+class HttpCache(CacheBackend):
+    '''
+    Cache backend stored on a cache server (see CacheServer), entries are
+    addressed as <url>/<method>/<document>/<sha256 of the key>
+
+    If the server can't be reached, a warning is printed and the backend
+    behaves as an empty cache from then on.
+
+    Attributes:
+        - url (str): URL of the server
+        - timeout (float, default=30): Timeout (s) of the requests
+    '''
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.available = True
+        self._session = requests.Session()
+
+    def entry_path(self, method, key):
+        document = key[0] if isinstance(key, tuple) and len(key) else '_'
+        digest = hashlib.sha256(entry_key(method, key).encode('utf-8')).hexdigest()
+        return '/' + method + '/' + document + '/' + digest
+
+    def entry_url(self, method, key):
+        return self.url + self.entry_path(method, key)
+
+    def _request(self, method, url, **kwargs):
+        # Returns the response, None if the server is not available
+        if not self.available:
+            return None
+        try:
+            return self._session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.available = False
+            print(Fore.YELLOW + 'WARNING: cache server ' + self.url + ' is not available (' + str(e) + ')' +
+                  Style.RESET_ALL)
+            return None
+
+    def get(self, method, key, with_meta=False):
+        res = self._request('get', self.entry_url(method, key))
+        data, meta = None, None
+        if res is not None and res.status_code == 200:
+            data = res.content
+            meta = codec.loads(res.headers['X-Cache-Meta']) if 'X-Cache-Meta' in res.headers else {}
+
+        if with_meta:
+            return data, meta
+        return data
+
+    def get_file(self, method, key, fileName):
+        '''
+        Streams an entry to a file
+
+        Returns:
+            - dict: Metadata of the entry, None if it doesn't exist (and the file isn't written)
+        '''
+
+        res = self._request('get', self.entry_url(method, key), stream=True)
+        if res is None or res.status_code != 200:
+            return None
+        with res, open(fileName, 'wb') as f:
+            for chunk in res.iter_content(1 << 16):
+                f.write(chunk)
+        return codec.loads(res.headers['X-Cache-Meta']) if 'X-Cache-Meta' in res.headers else {}
+
+    def put(self, method, key, data, meta=None, digest=None):
+        '''
+        Args:
+            - data (bytes or file): Content
+            - digest (str, default=None): sha256 of the content, checked by the server
+        '''
+
+        headers = {}
+        if meta:
+            headers['X-Cache-Meta'] = codec.dumps(meta)
+        if digest is None and isinstance(data, bytes):
+            digest = hashlib.sha256(data).hexdigest()
+        if digest is not None:
+            headers['X-Content-SHA256'] = digest
+        self._request('put', self.entry_url(method, key), data=data, headers=headers)
+
+    def contains(self, method, key):
+        res = self._request('head', self.entry_url(method, key))
+        return res is not None and res.status_code == 200
+
+    def contains_many(self, method, keys):
+        '''
+        Checks the entries in one request (POST /contains, with the list of their paths)
+
+        Returns:
+            - set: The keys on the server
+        '''
+
+        keys = list(keys)
+        if not keys:
+            return set()
+        res = self._request('post', self.url + '/contains',
+                            data=codec.dumps_bytes([self.entry_path(method, key) for key in keys]),
+                            headers={'Content-Type': 'application/json'})
+        if res is None or res.status_code != 200:
+            return set()
+        return set(key for key, found in zip(keys, codec.loads(res.content)) if found)
+
+    def remove(self, method, key):
+        self._request('delete', self.entry_url(method, key))
+
+
+class TieredCache(CacheBackend):
+    '''
+    Local cache in front of a remote one. Reads go through the local cache, the
+    missing entries are fetched from the remote cache and kept locally. Writes
+    go to the local cache, and are uploaded to the remote cache in background
+    threads (the process waits for them before exiting).
+
+    Only the entries that never change (the ones of versions and microversions)
+    are shared, see cache.workspace_entry. The other methods (lock,
+    temp_file_name, stats...) are the ones of the local cache.
+
+    Attributes:
+        - local (CacheStore): Local cache
+        - remote (CacheBackend): Remote cache, e.g. HttpCache
+        - workers (int, default=4): Number of upload threads
+    '''
+
+    def __init__(self, local, remote, workers=4):
+        self.local = local
+        self.remote = remote
+        self._uploads = ThreadPoolExecutor(max_workers=workers)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.local, name)
+
+    def shared(self, method, key):
+        return not workspace_entry(method, key)
+
+    def get(self, method, key, with_meta=False):
+        data, meta = self.local.get(method, key, with_meta=True)
+        if data is None and self.shared(method, key):
+            data, meta = self.remote.get(method, key, with_meta=True)
+            if data is not None:
+                self.local.put(method, key, data, meta)
+
+        if with_meta:
+            return data, meta
+        return data
+
+    def path(self, method, key, with_meta=False):
+        path, meta = self.local.path(method, key, with_meta=True)
+        if path is None and self.shared(method, key):
+            tmpFileName = self.local.temp_file_name()
+            meta = self.remote.get_file(method, key, tmpFileName)
+            if meta is not None:
+                path = self.local.put_raw_file(method, key, tmpFileName, meta=meta)
+            elif os.path.exists(tmpFileName):
+                os.remove(tmpFileName)
+
+        if with_meta:
+            return path, meta
+        return path
+
+    def contains(self, method, key):
+        return self.local.contains(method, key) or (self.shared(method, key) and self.remote.contains(method, key))
+
+    def contains_many(self, method, keys):
+        # The entries missing locally are checked on the server in one request
+        found = self.local.contains_many(method, keys)
+        remote = [key for key in keys if key not in found and self.shared(method, key)]
+        if remote:
+            found |= self.remote.contains_many(method, remote)
+        return found
+
+    def upload(self, method, key, blobPath, meta):
+        def run():
+            f = self.local.open_entry(method, key)
+            # None if evicted in the meantime
+            if f is not None:
+                with f:
+                    # Blobs are named after the sha256 of their raw content
+                    self.remote.put(method, key, f, meta, digest=os.path.basename(blobPath))
+
+        if self.shared(method, key):
+            future = self._uploads.submit(run)
+            with self._pending_lock:
+                self._pending.add(future)
+            future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def put(self, method, key, data, meta=None):
+        blobPath = self.local.put(method, key, data, meta)
+        self.upload(method, key, blobPath, meta)
+        return blobPath
+
+    def put_stream(self, method, key, chunks, meta=None):
+        blobPath = self.local.put_stream(method, key, chunks, meta)
+        self.upload(method, key, blobPath, meta)
+        return blobPath
+
+    def put_raw_file(self, method, key, tmpFileName, digest=None, meta=None, keep_copy=True):
+        path = self.local.put_raw_file(method, key, tmpFileName, digest, meta, keep_copy)
+        self.upload(method, key, path, meta)
+        return path
+
+    def put_file(self, method, key, tmpFileName, digest=None, meta=None, compression=None, raw_size=None):
+        blobPath = self.local.put_file(method, key, tmpFileName, digest, meta, compression, raw_size)
+        self.upload(method, key, blobPath, meta)
+        return blobPath
+
+    def remove(self, method, key):
+        self.local.remove(method, key)
+
+    def flush(self):
+        '''
+        Waits for the pending uploads
+        '''
+
+        with self._pending_lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.flush()
+        self._uploads.shutdown()
+        self.local.close()
+
+
+class CacheServerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    path_pattern = re.compile(r'^/([A-Za-z0-9_]+)/([A-Za-z0-9_]+)/([0-9a-f]{64})$')
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_empty(self, status, headers={}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def entry(self, path=None):
+        # (method, key) of the request path (or of the given one), None if it is not an entry
+        match = self.path_pattern.match(self.path if path is None else path)
+        if match is None:
+            return None
+        method, document, digest = match.groups()
+        # Keeping the document in the key, for the stats and pruning of the server cache
+        return method, digest if document == '_' else (document, digest)
+
+    def do_GET(self):
+        store = self.server.store
+        if self.path == '/stats':
+            body = codec.dumps_bytes(store.stats())
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        entry = self.entry()
+        if entry is None:
+            return self.send_empty(404)
+        f, meta = store.open_entry(*entry, with_meta=True)
+        if f is None:
+            return self.send_empty(404)
+
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(0)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(size))
+            if meta:
+                self.send_header('X-Cache-Meta', codec.dumps(meta))
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile)
+
+    def do_HEAD(self):
+        entry = self.entry()
+        self.send_empty(200 if entry is not None and self.server.store.contains(*entry) else 404)
+
+    def do_POST(self):
+        # Existence of several entries: list of paths in, list of booleans out
+        if self.path != '/contains':
+            return self.send_empty(404)
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            paths = codec.loads(self.rfile.read(length))
+        except ValueError:
+            return self.send_empty(400)
+
+        found = []
+        for path in paths:
+            entry = self.entry(path)
+            found.append(entry is not None and self.server.store.contains(*entry))
+
+        body = codec.dumps_bytes(found)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        store = self.server.store
+        length = int(self.headers.get('Content-Length') or 0)
+        entry = self.entry()
+
+        tmpFileName = store.temp_file_name()
+        sha256 = hashlib.sha256()
+        with open(tmpFileName, 'wb') as f:
+            while length > 0:
+                chunk = self.rfile.read(min(length, 1 << 16))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                sha256.update(chunk)
+                f.write(chunk)
+
+        expected = self.headers.get('X-Content-SHA256')
+        if entry is None or length > 0 or (expected is not None and expected != sha256.hexdigest()):
+            os.remove(tmpFileName)
+            return self.send_empty(400)
+
+        meta = codec.loads(self.headers['X-Cache-Meta']) if 'X-Cache-Meta' in self.headers else None
+        # Entries are served compressed or not, no decompressed copy is needed
+        store.put_raw_file(*entry, tmpFileName, sha256.hexdigest(), meta, keep_copy=False)
+        # Entries are served through open_entry, which handles the evicted ones
+        store.trim()
+        self.send_empty(204)
+
+    def do_DELETE(self):
+        entry = self.entry()
+        if entry is None:
+            return self.send_empty(404)
+        self.server.store.remove(*entry)
+        self.send_empty(204)
+
+
+class CacheServer():
+    '''
+    Key/value cache server shared by the clients of a team (see HttpCache), its
+    entries are kept in a CacheStore
+
+    Attributes:
+        - root (str): Directory of the cache of the server
+        - max_size (int, default=None): Maximum size (bytes) of the cache, None for no limit
+    '''
+
+    def __init__(self, root, max_size=None):
+        self.store = CacheStore(root, max_size)
+        self._server = None
+
+    def start(self, host='127.0.0.1', port=0, background=True):
+        '''
+        Starts serving, in a background thread or until interrupted
+
+        Returns:
+            - CacheServer: self
+        '''
+
+        self._server = ThreadingHTTPServer((host, port), CacheServerHandler)
+        self._server.daemon_threads = True
+        self._server.store = self.store
+        self.url = 'http://%s:%d' % (host, self._server.server_port)
+
+        if background:
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        else:
+            try:
+                self._server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,279 @@
+'''
+replay
+======
+
+Recording of Onshape API responses, and a local stand-in server replaying them,
+used to benchmark exports offline
+'''
+
+import gzip
+import hashlib
+import os
+import random
+import threading
+import time
+import urllib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from urllib.parse import parse_qs
+
+from . import codec
+
+__all__ = [
+    'ResponseRecorder',
+    'record_response',
+    'ReplayServer'
+]
+
+# Response headers kept in the fixtures
+RECORDED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+
+def fixture_key(method, path, query):
+    '''
+    Identifies a request in the fixtures directory
+
+    Args:
+        - method (str): HTTP method
+        - path (str): Request path, without the query string
+        - query (dict): Query params in key-value pairs
+
+    Returns:
+        - str: Key of the fixture
+    '''
+
+    request = method.upper() + ' ' + path + '?' + urllib.parse.urlencode(sorted(query.items()))
+    return hashlib.sha1(request.encode('utf-8')).hexdigest()
+
+
+class ResponseRecorder():
+    '''
+    Records a response in a fixtures directory, as a <key>.json description and a
+    <key>.body file with the (decoded) body. The body is written as it is given,
+    so that streamed responses are recorded without being held in memory.
+
+    Attributes:
+        - record_dir (str): Fixtures directory
+        - method (str): HTTP method
+        - path (str): Request path, as sent to the API host (before redirection)
+        - query (dict): Query params in key-value pairs
+        - res (requests.Response): Response, for its status and headers
+    '''
+
+    def __init__(self, record_dir, method, path, query, res):
+        self.fileName = os.path.join(record_dir, fixture_key(method, path, query))
+        self.description = {
+            'method': method.upper(),
+            'path': path,
+            'query': query,
+            'status': res.status_code,
+            'headers': {name: res.headers[name] for name in RECORDED_HEADERS if name in res.headers}
+        }
+        self._suffix = '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.' + str(id(self))
+        self._body = None
+
+    def write(self, chunk):
+        if self._body is None:
+            self._body = open(self.fileName + '.body' + self._suffix, 'wb')
+        self._body.write(chunk)
+
+    def close(self):
+        '''
+        Completes the recording, the body and description replace the previous ones
+        '''
+
+        self.write(b'')
+        self._body.close()
+        os.replace(self.fileName + '.body' + self._suffix, self.fileName + '.body')
+
+        tmpFileName = self.fileName + '.json' + self._suffix
+        with open(tmpFileName, 'wb') as f:
+            f.write(codec.dumps_bytes(self.description))
+        os.replace(tmpFileName, self.fileName + '.json')
+
+    def abort(self):
+        '''
+        Drops the recording, e.g. when the body couldn't be read completely
+        '''
+
+        if self._body is not None:
+            self._body.close()
+            os.remove(self.fileName + '.body' + self._suffix)
+
+
+def record_response(record_dir, method, path, query, res):
+    '''
+    Records a response whose body was read, see ResponseRecorder
+    '''
+
+    recorder = ResponseRecorder(record_dir, method, path, query, res)
+    recorder.write(res.content)
+    recorder.close()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_empty(self, status, headers={}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def handle_request(self):
+        replay = self.server.replay
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        replay.count('requests')
+
+        if replay.latency:
+            time.sleep(replay.latency)
+
+        if replay.should_throttle():
+            replay.count('throttled')
+            return self.send_empty(429, {'Retry-After': str(replay.retry_after)})
+
+        # Mesh downloads are redirected to the "blob" host, as Onshape does
+        if replay.redirect and not self.server.blob and url.path.endswith('/stl'):
+            replay.count('redirected')
+            return self.send_empty(307, {'Location': replay.blob_url + self.path})
+
+        description, body = replay.fixture(self.command, url.path, query)
+        if description is None:
+            replay.count('missing')
+            body = ('No fixture for ' + self.command + ' ' + self.path).encode('utf-8')
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        headers = description['headers']
+        if 'ETag' in headers and self.headers.get('If-None-Match') == headers['ETag']:
+            return self.send_empty(304, {'ETag': headers['ETag']})
+
+        if replay.compress and 'gzip' in (self.headers.get('Accept-Encoding') or '') \
+                and 'json' in headers.get('Content-Type', 'json'):
+            body = gzip.compress(body, 1)
+            headers = dict(headers, **{'Content-Encoding': 'gzip'})
+
+        self.send_response(description['status'])
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        replay.count('bytes', len(body))
+        chunk_size = 1 << 16
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset:offset + chunk_size]
+            if replay.bandwidth:
+                time.sleep(len(chunk) / replay.bandwidth)
+            self.wfile.write(chunk)
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+
+class ReplayServer():
+    '''
+    Local stand-in for the Onshape API, replaying a fixtures directory recorded
+    with the record_dir option of the client. It listens on two ports: the API
+    host, and a "blob" host mesh downloads are redirected to.
+
+    Attributes:
+        - fixtures_dir (str): Fixtures directory
+        - latency (float, default=0): Delay (s) added before each response
+        - bandwidth (float, default=None): Bytes per second of the responses bodies, None for no limit
+        - throttle_rate (float, default=0): Fraction of the requests answered with 429
+        - retry_after (int, default=1): Retry-After (s) sent with the 429 answers
+        - redirect (bool, default=True): Redirect the mesh downloads (307) to the blob host
+        - compress (bool, default=True): Gzip JSON bodies when the client accepts it
+        - seed (int, default=None): Seed of the throttling random generator
+    '''
+
+    def __init__(
+            self,
+            fixtures_dir,
+            latency=0.,
+            bandwidth=None,
+            throttle_rate=0.,
+            retry_after=1,
+            redirect=True,
+            compress=True,
+            seed=None):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.redirect = redirect
+        self.compress = compress
+
+        self.stats = {'requests': 0, 'throttled': 0, 'redirected': 0, 'missing': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._servers = []
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def should_throttle(self):
+        with self._lock:
+            return self._random.random() < self.throttle_rate
+
+    def fixture(self, method, path, query):
+        '''
+        Returns:
+            - tuple: (description dict, body bytes), (None, None) if there is no fixture
+        '''
+
+        fileName = os.path.join(self.fixtures_dir, fixture_key(method, path, query))
+        if not os.path.exists(fileName + '.json'):
+            return None, None
+        with open(fileName + '.json', 'rb') as f:
+            description = codec.loads(f.read())
+        with open(fileName + '.body', 'rb') as f:
+            body = f.read()
+        return description, body
+
+    def start(self, host='127.0.0.1'):
+        '''
+        Starts serving in background threads
+
+        Returns:
+            - ReplayServer: self
+        '''
+
+        for blob in [False, True]:
+            server = ThreadingHTTPServer((host, 0), ReplayHandler)
+            server.daemon_threads = True
+            server.replay = self
+            server.blob = blob
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+
+        self.url = 'http://%s:%d' % (host, self._servers[0].server_port)
+        self.blob_url = 'http://%s:%d' % (host, self._servers[1].server_port)
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
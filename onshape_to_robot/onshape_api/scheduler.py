@@ -0,0 +1,245 @@
+'''
+scheduler
+=========
+
+Pacing and retrying of the requests sent to the Onshape API
+'''
+
+import random
+import threading
+import time
+import email.utils
+
+__all__ = [
+    'RequestScheduler'
+]
+
+# Statuses for which the request is retried after a while
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Outcomes of the requests, see RequestScheduler.release
+SUCCEEDED = 'succeeded'
+THROTTLED = 'throttled'
+FAILED = 'failed'
+
+
+def status_outcome(status):
+    '''
+    Args:
+        - status (int): HTTP status of a response
+
+    Returns:
+        - str: THROTTLED for 429, FAILED for the other retried statuses (server
+          errors), SUCCEEDED otherwise
+    '''
+
+    if status == 429:
+        return THROTTLED
+    if status in RETRY_STATUSES:
+        return FAILED
+    return SUCCEEDED
+
+
+def parse_retry_after(value):
+    '''
+    Parses a Retry-After header
+
+    Args:
+        - value (str): Header value, either a number of seconds or an HTTP date
+
+    Returns:
+        - float: Number of seconds to wait, None if the header can't be parsed
+    '''
+
+    if value is None:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0., date.timestamp() - time.time())
+
+
+class RequestScheduler():
+    '''
+    Shared by all the callers of an Onshape instance, it:
+
+    - Enforces a requests per second budget
+    - Limits the number of requests in flight, adapting this limit to the throttling
+      observed (additive increase when requests succeed, multiplicative decrease on 429,
+      unchanged on server and transport errors)
+    - Computes the jittered exponential backoff before retrying, honouring Retry-After
+
+    Attributes:
+        - requests_per_second (float, default=None): Budget, None for no limit
+        - max_concurrency (int, default=16): Upper bound for requests in flight
+        - max_retries (int, default=5): Number of retries before giving up
+        - base_delay (float, default=0.5): First backoff delay (s)
+        - max_delay (float, default=60): Maximum backoff delay (s)
+    '''
+
+    def __init__(
+            self,
+            requests_per_second=None,
+            max_concurrency=16,
+            max_retries=5,
+            base_delay=0.5,
+            max_delay=60.):
+        self.requests_per_second = requests_per_second
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._condition = threading.Condition()
+        self._limit = float(max_concurrency)
+        self._active = 0
+        self._paused_until = 0.
+        self._next_slot = 0.
+        self._rate_lock = threading.Lock()
+        self._waiters = set()
+
+        self.throttled = 0
+        self.retries = 0
+
+    def concurrency_limit(self):
+        '''
+        Returns:
+            - int: Current number of requests allowed in flight
+        '''
+
+        return max(1, int(self._limit))
+
+    def _try_acquire(self):
+        # Called with the condition held
+        wait = self._paused_until - time.monotonic()
+        if wait > 0:
+            return wait
+        if self._active >= self.concurrency_limit():
+            return None
+        self._active += 1
+        return 0.
+
+    def try_acquire(self):
+        '''
+        Takes a slot without blocking, for the callers that can't block (asyncio). Once
+        the slot is taken, the request must still wait for pace() before being sent.
+
+        Returns:
+            - float: 0 if the slot was taken, otherwise the time (s) the callers are
+              paused for, None if they wait for a request to be released (see
+              add_waiter)
+        '''
+
+        with self._condition:
+            return self._try_acquire()
+
+    def pace(self):
+        '''
+        Books the next send in the requests per second budget
+
+        Returns:
+            - float: Delay (s) to wait before sending the request
+        '''
+
+        if not self.requests_per_second:
+            return 0.
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1. / self.requests_per_second
+        return slot - now
+
+    def acquire(self):
+        '''
+        Blocks until a request can be sent
+        '''
+
+        with self._condition:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    break
+                self._condition.wait(wait)
+
+        try:
+            delay = self.pace()
+            if delay > 0:
+                time.sleep(delay)
+        except BaseException:
+            self.release(FAILED)
+            raise
+
+    def add_waiter(self, callback):
+        '''
+        Registers a callback called (from any thread) each time a slot is released
+
+        Args:
+            - callback (callable): Called without arguments
+        '''
+
+        with self._condition:
+            self._waiters.add(callback)
+
+    def remove_waiter(self, callback):
+        '''
+        Unregisters a callback of add_waiter
+
+        Args:
+            - callback (callable): Registered callback
+        '''
+
+        with self._condition:
+            self._waiters.discard(callback)
+
+    def release(self, outcome):
+        '''
+        Signals that a request is done
+
+        Args:
+            - outcome (str): SUCCEEDED, THROTTLED (the API answered with 429) or FAILED
+              (server error, or no response at all), see status_outcome
+        '''
+
+        with self._condition:
+            self._active -= 1
+            if outcome == THROTTLED:
+                self.throttled += 1
+                self._limit = max(1., self._limit / 2)
+            elif outcome == SUCCEEDED:
+                self._limit = min(float(self.max_concurrency),
+                                  self._limit + 1. / self._limit)
+            self._condition.notify_all()
+            waiters = list(self._waiters)
+
+        for callback in waiters:
+            callback()
+
+    def retry_delay(self, attempt, retry_after=None):
+        '''
+        Computes how long to wait before retrying a request. When the API gave a
+        Retry-After, all the callers are paused until then.
+
+        Args:
+            - attempt (int): Number of the failed attempt, starting from 0
+            - retry_after (str, default=None): Retry-After header of the response
+
+        Returns:
+            - float: Delay (s)
+        '''
+
+        self.retries += 1
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = parse_retry_after(retry_after)
+
+        if retry_after is not None:
+            delay += retry_after
+            with self._condition:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self._condition.notify_all()
+
+        return delay
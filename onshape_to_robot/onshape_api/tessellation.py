@@ -0,0 +1,61 @@
+'''
+tessellation
+============
+
+Building binary STL meshes from the tessellated faces returned by Onshape
+'''
+
+import numpy as np
+
+__all__ = [
+    'body_facets',
+    'stl_bytes'
+]
+
+# Binary STL record: normal, 3 vertices, attribute byte count
+STL_DTYPE = np.dtype([
+    ('normals', '<f4', (3,)),
+    ('vectors', '<f4', (3, 3)),
+    ('attr', '<u2')
+])
+
+
+def body_facets(body):
+    '''
+    Collects the facets of a body of the tessellatedfaces response
+
+    Args:
+        - body (dict): Body entry, with 'faces' having 'facets' with 'vertices' and 'normal'
+
+    Returns:
+        - tuple: (vertices array (n, 3, 3), normals array (n, 3))
+    '''
+
+    vertices, normals = [], []
+    for face in body['faces']:
+        for facet in face['facets']:
+            vertices.append(facet['vertices'])
+            normals.append(facet.get('normal', [0., 0., 0.]))
+
+    return np.array(vertices, dtype=np.float32).reshape((-1, 3, 3)), \
+        np.array(normals, dtype=np.float32).reshape((-1, 3))
+
+
+def stl_bytes(vertices, normals):
+    '''
+    Encodes facets as a binary STL file
+
+    Args:
+        - vertices (np.array): (n, 3, 3) facets vertices, in meters
+        - normals (np.array): (n, 3) facets normals
+
+    Returns:
+        - bytes: Content of the binary STL file
+    '''
+
+    data = np.zeros(len(vertices), dtype=STL_DTYPE)
+    data['vectors'] = vertices
+    data['normals'] = normals
+
+    header = b'onshape-to-robot tessellation'.ljust(80, b' ')
+    return header + np.array(len(data), dtype='<u4').tobytes() + data.tobytes()
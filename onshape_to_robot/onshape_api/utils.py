@@ -13,6 +13,9 @@ __all__ = [
 ]
 
 
+_configured = False
+
+
 def log(msg, level=0):
     '''
     Logs a message to the console, with optional level paramater
@@ -22,40 +25,44 @@ def log(msg, level=0):
         - level (int): log level; 0 for info, 1 for error (default = 0)
     '''
 
-    red = '\033[91m'
-    endc = '\033[0m'
+    global _configured
+
+    if not _configured:
+        red = '\033[91m'
+        endc = '\033[0m'
 
-    # configure the logging module
-    cfg = {
-        'version': 1,
-        'disable_existing_loggers': False,
-        'formatters': {
-            'stdout': {
-                'format': '[%(levelname)s]: %(asctime)s - %(message)s',
-                'datefmt': '%x %X'},
-            'stderr': {
-                'format': red + '[%(levelname)s]: %(asctime)s - %(message)s' + endc,
-                'datefmt': '%x %X'}},
-        'handlers': {
-            'stdout': {
-                'class': 'logging.StreamHandler',
-                'level': 'DEBUG',
-                'formatter': 'stdout'},
-            'stderr': {
-                'class': 'logging.StreamHandler',
-                'level': 'ERROR',
-                'formatter': 'stderr'}},
-        'loggers': {
-            'info': {
-                'handlers': ['stdout'],
-                'level': 'INFO',
-                'propagate': True},
-            'error': {
-                'handlers': ['stderr'],
-                'level': 'ERROR',
-                'propagate': False}}}
+        # configure the logging module, only once
+        cfg = {
+            'version': 1,
+            'disable_existing_loggers': False,
+            'formatters': {
+                'stdout': {
+                    'format': '[%(levelname)s]: %(asctime)s - %(message)s',
+                    'datefmt': '%x %X'},
+                'stderr': {
+                    'format': red + '[%(levelname)s]: %(asctime)s - %(message)s' + endc,
+                    'datefmt': '%x %X'}},
+            'handlers': {
+                'stdout': {
+                    'class': 'logging.StreamHandler',
+                    'level': 'DEBUG',
+                    'formatter': 'stdout'},
+                'stderr': {
+                    'class': 'logging.StreamHandler',
+                    'level': 'ERROR',
+                    'formatter': 'stderr'}},
+            'loggers': {
+                'info': {
+                    'handlers': ['stdout'],
+                    'level': 'INFO',
+                    'propagate': True},
+                'error': {
+                    'handlers': ['stderr'],
+                    'level': 'ERROR',
+                    'propagate': False}}}
 
-    dictConfig(cfg)
+        dictConfig(cfg)
+        _configured = True
 
     lg = 'info' if level == 0 else 'error'
     lvl = 20 if level == 0 else 40
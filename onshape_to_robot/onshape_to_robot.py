@@ -1,34 +1,24 @@
 #!/usr/bin/env python
 import numpy as np
 from copy import copy
-import commentjson as json
+from .onshape_api import codec
 from colorama import Fore, Back, Style
 import sys
 from sys import exit
 import os
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from . import csg
 from .robot_description import RobotURDF, RobotSDF
+from .manifest import BuildManifest, fingerprint
+from .materialize import materialize
+from .lockfile import writeLockFile
 
 # Loading configuration, collecting occurrences and building robot tree
 from .load_robot import load_rob
 
-config, client, tree, occurrences, frames = load_rob('sample_export/')
-
-robot = RobotURDF(config['robotName'])
-robot.drawCollisions = config['drawCollisions']
-robot.jointMaxEffort = config['jointMaxEffort']
-robot.mergeSTLs = config['mergeSTLs']
-robot.maxSTLSize = config['maxSTLSize']
-robot.simplifySTLs = config['simplifySTLs']
-robot.jointMaxVelocity = config['jointMaxVelocity']
-robot.noDynamics = config['noDynamics']
-robot.packageName = config['packageName']
-robot.addDummyBaseLink = config['addDummyBaseLink']
-robot.robotName = config['robotName']
-robot.additionalXML = config['additionalXML']
-robot.useFixedLinks = config['useFixedLinks']
-robot.meshDir = config['outputDirectory']
+# Set by export()
+config, client, tree, occurrences, frames, robot = None, None, None, None, None, None
 
 
 def addPart(occurrence, matrix):
@@ -60,26 +50,17 @@ def addPart(occurrence, matrix):
           occurrence['instance']['name'] + extra + Style.RESET_ALL)
 
     stlFile = prefix.replace('/', '_') + '.stl'
-    # shorten the configuration to a maximum number of chars to prevent
-    # errors. Necessary for standard parts like screws
-    if len(part['configuration']) > 40:
-        shortend_configuration = hashlib.md5(
-            part['configuration'].encode('utf-8')).hexdigest()
-    else:
-        shortend_configuration = part['configuration']
-    stl = client.part_studio_stl_m(
-        part['documentId'],
-        part['documentMicroversion'],
-        part['elementId'],
-        part['partId'],
-        shortend_configuration)
-    f = open(config['outputDirectory'] + '/' + stlFile, 'wb')
-    f.write(stl)
-    f.close()
+    stl = partAsset('stl', part, stlConfiguration(part))
+    try:
+        materialize(stl, config['outputDirectory'], stlFile, config['hardlinkMeshes'], robot.manifest)
+    except FileNotFoundError:
+        # The blob was evicted by another process since it was fetched, resolving it again
+        stl = client.part_studio_stl_m(*partAssetKey('stl', part, stlConfiguration(part))[1:])
+        materialize(stl, config['outputDirectory'], stlFile, config['hardlinkMeshes'], robot.manifest)
 
     stlMetadata = prefix.replace('/', '_') + '.part'
     f = open(config['outputDirectory'] + '/' + stlMetadata, 'wb')
-    f.write(json.dumps(part).encode('UTF-8'))
+    f.write(codec.dumps_bytes(part))
     f.close()
 
     stlFile = config['outputDirectory'] + '/' + stlFile
@@ -97,12 +78,7 @@ def addPart(occurrence, matrix):
     if config['color'] is not None:
         color = config['color']
     else:
-        metadata = client.part_get_metadata(
-            part['documentId'],
-            part['documentMicroversion'],
-            part['elementId'],
-            part['partId'],
-            part['configuration'])
+        metadata = partAsset('metadata', part, part['configuration'])
         if 'appearance' in metadata:
             colors = metadata['appearance']['color']
             color = np.array(
@@ -122,12 +98,7 @@ def addPart(occurrence, matrix):
             com = entry['com']
             inertia = entry['inertia']
         else:
-            massProperties = client.part_mass_properties(
-                part['documentId'],
-                part['documentMicroversion'],
-                part['elementId'],
-                part['partId'],
-                part['configuration'])
+            massProperties = partAsset('massproperties', part, part['configuration'])
 
             if part['partId'] not in massProperties['bodies']:
                 print(
@@ -157,6 +128,95 @@ def addPart(occurrence, matrix):
     robot.addPart(pose, stlFile, mass, com, inertia, color, shapes, prefix)
 
 
+def stlConfiguration(part):
+    # shorten the configuration to a maximum number of chars to prevent
+    # errors. Necessary for standard parts like screws
+    if len(part['configuration']) > 40:
+        return hashlib.md5(part['configuration'].encode('utf-8')).hexdigest()
+    else:
+        return part['configuration']
+
+
+# Part assets (STL, metadata and mass properties) fetched ahead of the tree walk,
+# indexed by (kind, documentId, documentMicroversion, elementId, partId, configuration)
+partAssets = {}
+
+
+def partAssetKey(kind, part, configuration):
+    return (kind, part['documentId'], part['documentMicroversion'], part['elementId'], part['partId'], configuration)
+
+
+def partAsset(kind, part, configuration):
+    return partAssets[partAssetKey(kind, part, configuration)].result()
+
+
+def partAssetKeys(tree):
+    # Collecting the ids of the top-level instances that will become links
+    linkIds = set()
+
+    def collectLinkIds(node):
+        linkIds.add(node['id'])
+        for child in node['children']:
+            collectLinkIds(child)
+    collectLinkIds(tree)
+
+    # Listing all the requests addPart will need, identical parts are only fetched once
+    keys = set()
+    for occurrence in occurrences.values():
+        part = occurrence['instance']
+        if occurrence['assignation'] not in linkIds or part['type'] != 'Part' \
+                or part['suppressed'] or part['partId'] == '':
+            continue
+
+        keys.add(partAssetKey('stl', part, stlConfiguration(part)))
+        if config['color'] is None:
+            keys.add(partAssetKey('metadata', part, part['configuration']))
+        if not config['noDynamics']:
+            _, prefix = extractPartName(part['name'], part['configuration'])
+            if prefix not in config['dynamicsOverride']:
+                keys.add(partAssetKey('massproperties', part, part['configuration']))
+
+    return keys
+
+
+def prefetchPartAssets(keys):
+    methods = {
+        'stl': client.part_studio_stl_m,
+        'metadata': client.part_get_metadata,
+        'massproperties': client.part_mass_properties
+    }
+
+    print("\n" + Style.BRIGHT + '* Fetching ' + str(len(keys)) + ' part assets (' +
+          str(config['prefetchWorkers']) + ' workers)' + Style.RESET_ALL)
+
+    with ThreadPoolExecutor(max_workers=config['prefetchWorkers']) as executor:
+        # Metadata and mass properties are first fetched in bulk, per part studio
+        if config['bulkPartsFetch']:
+            metadataParts = [key[1:] for key in keys if key[0] == 'metadata']
+            massPropertiesParts = [key[1:] for key in keys if key[0] == 'massproperties']
+            groups = client.group_parts(metadataParts + massPropertiesParts)
+            metadataGroups = client.group_parts(metadataParts)
+            massPropertiesGroups = client.group_parts(massPropertiesParts)
+            futures = []
+            for group, partIds in groups.items():
+                futures.append(executor.submit(client.fetch_parts_group, *group, partIds,
+                                               metadata=group in metadataGroups,
+                                               massproperties=group in massPropertiesGroups))
+            for future in futures:
+                future.result()
+
+        # Meshes are built from the tessellation of whole part studios
+        if config['useTessellation']:
+            stlParts = [key[1:] for key in keys if key[0] == 'stl']
+            futures = [executor.submit(client.fetch_tessellated_group, *group, partIds)
+                       for group, partIds in client.group_parts(stlParts).items()]
+            for future in futures:
+                future.result()
+
+        for key in keys:
+            partAssets[key] = executor.submit(methods[key[0]], *key[1:])
+
+
 partNames = {}
 
 
@@ -191,6 +251,34 @@ def processPartName(name, configuration, overrideName=None):
         return overrideName
 
 
+def linkFingerprint(tree, matrix):
+    # Everything the meshes of a link are produced from: the parts (with their
+    # microversion and configuration), their poses, their pure shapes and the
+    # options changing the parts meshes
+    parts = []
+    for occurrence in occurrences.values():
+        part = occurrence['instance']
+        if occurrence['assignation'] != tree['id'] or part['type'] != 'Part':
+            continue
+
+        pose = occurrence['transform']
+        if robot.relative:
+            pose = np.linalg.inv(matrix) * pose
+
+        scad = None
+        if config['useScads']:
+            _, prefix = extractPartName(part['name'], part['configuration'])
+            scadFile = config['outputDirectory'] + '/' + prefix + '.scad'
+            if os.path.exists(scadFile):
+                scad = [os.path.getsize(scadFile), os.path.getmtime(scadFile)]
+
+        parts.append([part['documentId'], part['documentMicroversion'], part['elementId'], part['partId'],
+                      part['configuration'], part['suppressed'], np.asarray(pose).round(9).tolist(), scad])
+
+    return fingerprint([sorted(parts, key=str), config['useTessellation'], config['useCollisionsConfigurations'],
+                        config['pureShapeDilatation'], robot.drawCollisions, robot.useFixedLinks])
+
+
 def buildRobot(tree, matrix):
     occurrence = occurrences[tuple([tree['id']])]
     instance = occurrence['instance']
@@ -207,7 +295,7 @@ def buildRobot(tree, matrix):
 
     # Create the link, collecting all children in the tree assigned to this
     # top-level part
-    robot.startLink(link, matrix)
+    robot.startLink(link, matrix, linkFingerprint(tree, matrix) if robot.manifest is not None else None)
     for occurrence in occurrences.values():
         if occurrence['assignation'] == tree['id'] and occurrence['instance']['type'] == 'Part':
             addPart(occurrence, matrix)
@@ -244,23 +332,102 @@ def buildRobot(tree, matrix):
     return link
 
 
-# Start building the robot
-buildRobot(tree, np.matrix(np.identity(4)))
-robot.finalize()
-# print(tree)
+def export(robot_folder_path, base_url=None, cache_dir=None, locked=False):
+    global config, client, tree, occurrences, frames, robot
+
+    config, client, tree, occurrences, frames = load_rob(robot_folder_path, base_url, cache_dir, locked)
+
+    robot = RobotURDF(config['robotName'])
+    robot.drawCollisions = config['drawCollisions']
+    robot.jointMaxEffort = config['jointMaxEffort']
+    robot.mergeSTLs = config['mergeSTLs']
+    robot.maxSTLSize = config['maxSTLSize']
+    robot.simplifySTLs = config['simplifySTLs']
+    robot.jointMaxVelocity = config['jointMaxVelocity']
+    robot.noDynamics = config['noDynamics']
+    robot.packageName = config['packageName']
+    robot.addDummyBaseLink = config['addDummyBaseLink']
+    robot.robotName = config['robotName']
+    robot.additionalXML = config['additionalXML']
+    robot.useFixedLinks = config['useFixedLinks']
+    robot.meshDir = config['outputDirectory']
+    if config['incrementalBuild']:
+        robot.manifest = BuildManifest(config['outputDirectory'])
+
+    partAssets.clear()
+    partNames.clear()
+
+    # Fetching all the part assets, then building the robot
+    prefetchPartAssets(partAssetKeys(tree))
+    buildRobot(tree, np.matrix(np.identity(4)))
+    robot.finalize()
+    # print(tree)
+
+    print("\n" + Style.BRIGHT + "* Writing " +
+          robot.ext.upper() + " file" + Style.RESET_ALL)
+    f = open(config['outputDirectory'] + '/robot.' + robot.ext, 'w')
+    f.write(robot.xml)
+    f.close()
+    if robot.manifest is not None:
+        robot.manifest.save()
+    if config['lockFile']:
+        writeLockFile(config['outputDirectory'], config, config['resolved'], occurrences)
+    client.trim_cache()
+
+    print("\n" + Style.BRIGHT + "* API requests summary" + Style.RESET_ALL)
+    print(client.metrics_summary())
+    for host, stats in client.connection_stats().items():
+        print(Style.DIM + '* ' + host + ': ' + str(stats['requests']) + ' requests over ' +
+              str(stats['connections']) + ' connections' + Style.RESET_ALL)
+
+    if len(config['postImportCommands']):
+        print(
+            "\n" +
+            Style.BRIGHT +
+            "* Executing post-import commands" +
+            Style.RESET_ALL)
+        for command in config['postImportCommands']:
+            print("* " + command)
+            os.system(command)
 
-print("\n" + Style.BRIGHT + "* Writing " +
-      robot.ext.upper() + " file" + Style.RESET_ALL)
-f = open(config['outputDirectory'] + '/robot.' + robot.ext, 'w')
-f.write(robot.xml)
-f.close()
+    return client
 
-if len(config['postImportCommands']):
-    print(
-        "\n" +
-        Style.BRIGHT +
-        "* Executing post-import commands" +
-        Style.RESET_ALL)
-    for command in config['postImportCommands']:
-        print("* " + command)
-        os.system(command)
+
+def warm(robot_folder_path, base_url=None, cache_dir=None, locked=False):
+    '''
+    Fills the cache with everything the export of a robot needs (the assembly,
+    and the meshes, metadata, mass properties and parts lists of its parts),
+    without building it
+
+    Returns:
+        - dict: per kind of asset {'cached', 'fetched'}, and the requests and bytes transferred
+    '''
+
+    global config, client, tree, occurrences, frames
+
+    config, client, tree, occurrences, frames = load_rob(robot_folder_path, base_url, cache_dir, locked)
+    partAssets.clear()
+
+    keys = partAssetKeys(tree)
+    report = {kind: {'cached': 0, 'fetched': 0} for kind in ['stl', 'metadata', 'massproperties']}
+    cached = client.part_assets_cached(keys)
+    for key in keys:
+        report[key[0]]['cached' if key in cached else 'fetched'] += 1
+
+    prefetchPartAssets(keys)
+    for future in partAssets.values():
+        future.result()
+    client.trim_cache()
+
+    requests = client.metrics_summary(table=False)['requests'].values()
+    report['requests'] = sum(entry['count'] for entry in requests)
+    report['bytes'] = sum(entry['bytes'] for entry in requests)
+
+    return report
+
+
+def printWarmReport(report):
+    print("\n" + Style.BRIGHT + "* Cache warm-up" + Style.RESET_ALL)
+    for kind in ['stl', 'metadata', 'massproperties']:
+        print('%-16s %d already cached, %d fetched' % (kind, report[kind]['cached'], report[kind]['fetched']))
+    print('%d requests, %.1f kB transferred' % (report['requests'], report['bytes'] / 1024.))
@@ -3,6 +3,7 @@ import os
 import math
 import uuid
 from . import stl_combine
+from .manifest import fingerprint
 
 
 def rotationMatrixToEulerAngles(R):
@@ -62,6 +63,7 @@ class RobotDescription(object):
         self.addDummyBaseLink = False
         self.robotName = name
         self.meshDir = None
+        self.manifest = None
 
     def shouldMergeSTLs(self, node):
         return self.mergeSTLs == 'all' or self.mergeSTLs == node
@@ -90,8 +92,9 @@ class RobotDescription(object):
         else:
             return self.jointMaxVelocity
 
-    def resetLink(self):
-        self._mesh = {'visual': None, 'collision': None}
+    def resetLink(self, fingerprint=None):
+        self._merges = {'visual': [], 'collision': []}
+        self._link_fingerprint = fingerprint
         self._color = np.array([0., 0., 0.])
         self._color_mass = 0
         self._link_childs = 0
@@ -119,13 +122,36 @@ class RobotDescription(object):
             self._color += np.array(color) * mass
             self._color_mass += mass
 
-        m = stl_combine.load_mesh(stl)
-        stl_combine.apply_matrix(m, matrix)
+        # Meshes are only loaded and merged in linkMesh(), if needed
+        self._merges[node].append((stl, matrix))
+
+    def linkMesh(self, node):
+        filename = self._link_name + '_' + node + '.stl'
+
+        # Settings that change the produced file
+        linkFingerprint = None
+        if self.manifest is not None and self._link_fingerprint is not None:
+            linkFingerprint = fingerprint([self._link_fingerprint, self.mergeSTLs, self.simplifySTLs, self.maxSTLSize])
+            if self.manifest.unchanged(self._link_name, linkFingerprint, filename):
+                return filename
+
+        mesh = None
+        for stl, matrix in self._merges[node]:
+            m = stl_combine.load_mesh(stl)
+            stl_combine.apply_matrix(m, matrix)
+            if mesh is None:
+                mesh = m
+            else:
+                mesh = stl_combine.combine_meshes(mesh, m)
 
-        if self._mesh[node] is None:
-            self._mesh[node] = m
-        else:
-            self._mesh[node] = stl_combine.combine_meshes(self._mesh[node], m)
+        stl_combine.save_mesh(mesh, self.meshDir + '/' + filename)
+        if self.shouldSimplifySTLs(node):
+            stl_combine.simplify_stl(self.meshDir + '/' + filename, self.maxSTLSize)
+
+        if linkFingerprint is not None:
+            self.manifest.record(self._link_name, linkFingerprint, filename)
+
+        return filename
 
     def linkDynamics(self):
         mass = 0
@@ -196,9 +222,9 @@ class RobotURDF(RobotDescription):
         self.append('</joint>')
         self.append('')
 
-    def startLink(self, name, matrix):
+    def startLink(self, name, matrix, fingerprint=None):
         self._link_name = name
-        self.resetLink()
+        self.resetLink(fingerprint)
 
         if self.addDummyBaseLink:
             self.addDummyBaseLinkMethod(name)
@@ -209,18 +235,13 @@ class RobotURDF(RobotDescription):
         mass, com, inertia = self.linkDynamics()
 
         for node in ['visual', 'collision']:
-            if self._mesh[node] is not None:
+            if self._merges[node]:
                 if node == 'visual' and self._color_mass > 0:
                     color = self._color / self._color_mass
                 else:
                     color = [0.5, 0.5, 0.5]
 
-                filename = self._link_name + '_' + node + '.stl'
-                stl_combine.save_mesh(
-                    self._mesh[node], self.meshDir + '/' + filename)
-                if self.shouldSimplifySTLs(node):
-                    stl_combine.simplify_stl(
-                        self.meshDir + '/' + filename, self.maxSTLSize)
+                filename = self.linkMesh(node)
                 self.addSTL(
                     np.identity(4),
                     filename,
@@ -390,9 +411,9 @@ class RobotSDF(RobotDescription):
                         name + "_visual", "visual")
         self.append('</link>')
 
-    def startLink(self, name, matrix):
+    def startLink(self, name, matrix, fingerprint=None):
         self._link_name = name
-        self.resetLink()
+        self.resetLink(fingerprint)
         self.append('<link name="' + name + '">')
         self.append(pose(matrix, name))
 
@@ -400,14 +421,9 @@ class RobotSDF(RobotDescription):
         mass, com, inertia = self.linkDynamics()
 
         for node in ['visual', 'collision']:
-            if self._mesh[node] is not None:
+            if self._merges[node]:
                 color = self._color / self._color_mass
-                filename = self._link_name + '_' + node + '.stl'
-                stl_combine.save_mesh(
-                    self._mesh[node], self.meshDir + '/' + filename)
-                if self.shouldSimplifySTLs(node):
-                    stl_combine.simplify_stl(
-                        self.meshDir + '/' + filename, self.maxSTLSize)
+                filename = self.linkMesh(node)
                 self.addSTL(
                     np.identity(4),
                     filename,
@@ -13,7 +13,8 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/rhoban/onshape-to-robot/",
     packages=setuptools.find_packages(),
-    scripts=['onshape-to-robot', 'onshape-to-robot-clear-cache'],
+    scripts=['onshape-to-robot', 'onshape-to-robot-clear-cache', 'onshape-to-robot-cache',
+             'onshape-to-robot-cache-server', 'onshape-to-robot-bench'],
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -23,6 +24,10 @@ setuptools.setup(
     install_requires=[
         "numpy", "pybullet", "requests", "commentjson", "colorama", "numpy-stl", "transforms3d"
     ],
+    extras_require={
+        "async": ["aiohttp"],
+        "fast": ["orjson", "zstandard"],
+    },
     include_package_data=True,
     package_data={'': ['bullet/*', 'README.md']},
     python_requires='>=3.6',
@@ -0,0 +1,156 @@
+import json
+import os
+import struct
+
+import pytest
+
+from onshape_to_robot.onshape_api.client import Client
+from onshape_to_robot.onshape_api.replay import ReplayServer, fixture_key
+
+DOCUMENT = 'a' * 24
+WORKSPACE = 'b' * 24
+MICROVERSION = 'c' * 24
+ASSEMBLY = 'd' * 24
+PARTS_MICROVERSION = 'e' * 24
+PARTS_ELEMENT = 'f' * 24
+PARTS = ['JHD', 'JKD']
+
+
+def write_fixture(directory, path, query, body, headers={'Content-Type': 'application/json'}):
+    '''
+    Writes a response replayed by the ReplayServer, body being JSON-serializable data or bytes
+    '''
+
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+
+    fileName = os.path.join(directory, fixture_key('get', path, query))
+    with open(fileName + '.json', 'w') as f:
+        json.dump({'method': 'GET', 'path': path, 'query': query, 'status': 200, 'headers': headers}, f)
+    with open(fileName + '.body', 'wb') as f:
+        f.write(body)
+
+
+def stl(size):
+    # Binary STL with a single facet
+    return b'x' * 80 + struct.pack('<I', 1) + struct.pack('<12fH', 0, 0, 1, 0, 0, 0, size, 0, 0, 0, size, 0, 0)
+
+
+def part(index, partId):
+    return {
+        'id': 'I%d' % index,
+        'type': 'Part',
+        'name': 'Part %d <1>' % index,
+        'partId': partId,
+        'documentId': DOCUMENT,
+        'documentMicroversion': PARTS_MICROVERSION,
+        'elementId': PARTS_ELEMENT,
+        'configuration': 'default',
+        'suppressed': False,
+        'isStandardContent': False
+    }
+
+
+def write_robot_fixtures(directory):
+    '''
+    Writes the responses of the export of a robot: one link made of two fastened parts
+    '''
+
+    instances = [part(1, PARTS[0]), part(2, PARTS[1])]
+    assembly = {
+        'rootAssembly': {
+            'instances': instances,
+            'occurrences': [{'path': [instance['id']], 'transform': [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1],
+                             'hidden': False} for instance in instances],
+            'features': [{
+                'featureType': 'mate',
+                'suppressed': False,
+                'featureData': {
+                    'name': 'Fastened 1',
+                    'mateType': 'FASTENED',
+                    'matedEntities': [{'matedOccurrence': ['I1']}, {'matedOccurrence': ['I2']}]
+                }
+            }],
+            'fullConfiguration': 'default'
+        },
+        'subAssemblies': []
+    }
+
+    documentPath = '/api/documents/d/' + DOCUMENT
+    partsPath = '/api/parts/d/' + DOCUMENT + '/m/' + PARTS_MICROVERSION + '/e/' + PARTS_ELEMENT
+    assemblyPath = '/api/assemblies/d/' + DOCUMENT + '/m/' + MICROVERSION + '/e/' + ASSEMBLY
+
+    write_fixture(directory, '/api/documents/' + DOCUMENT, {}, {'defaultWorkspace': {'id': WORKSPACE}},
+                  {'Content-Type': 'application/json', 'ETag': '"document"'})
+    write_fixture(directory, documentPath + '/w/' + WORKSPACE + '/currentmicroversion', {},
+                  {'microversion': MICROVERSION})
+    write_fixture(directory, documentPath + '/m/' + MICROVERSION + '/elements', {'elementType': 'ASSEMBLY'},
+                  [{'name': 'robot', 'id': ASSEMBLY}])
+    write_fixture(directory, assemblyPath, {'includeMateFeatures': 'true', 'includeMateConnectors': 'true',
+                                            'includeNonSolids': 'true', 'configuration': 'default'}, assembly)
+    write_fixture(directory, assemblyPath + '/features', {}, {'features': []})
+    write_fixture(directory, partsPath, {'configuration': 'default'},
+                  [{'partId': partId, 'name': 'Part %d' % (index + 1),
+                    'appearance': {'color': {'red': 10, 'green': 20, 'blue': 30}}}
+                   for index, partId in enumerate(PARTS)])
+    write_fixture(directory, '/api/partstudios/d/' + DOCUMENT + '/m/' + PARTS_MICROVERSION + '/e/' + PARTS_ELEMENT +
+                  '/massproperties', {'configuration': 'default', 'massAsGroup': 'false'},
+                  {'bodies': {partId: {'mass': [1.0], 'centroid': [0, 0, 0], 'inertia': [1, 0, 0, 0, 1, 0, 0, 0, 1]}
+                              for partId in PARTS}})
+    for index, partId in enumerate(PARTS):
+        write_fixture(directory, partsPath + '/partid/' + partId + '/stl',
+                      {'mode': 'binary', 'units': 'meter', 'configuration': 'default'}, stl(index + 1),
+                      {'Content-Type': 'application/octet-stream'})
+
+
+def make_client(creds, url, cache_dir, **kwargs):
+    return Client(logging=False, creds=creds, base_url=url, cache_dir=cache_dir, **kwargs)
+
+
+def fetch_parts(client):
+    # Metadata and mass properties are fetched in bulk, as the export does
+    client.fetch_parts_group(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, 'default', PARTS)
+    paths = [client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, partId) for partId in PARTS]
+    metadata = [client.part_get_metadata(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, partId) for partId in PARTS]
+    return paths, metadata
+
+
+@pytest.fixture
+def fixtures_dir(tmp_path):
+    directory = str(tmp_path / 'fixtures')
+    os.makedirs(directory)
+    write_robot_fixtures(directory)
+    return directory
+
+
+@pytest.fixture
+def replay(fixtures_dir):
+    with ReplayServer(fixtures_dir, seed=0) as server:
+        yield server
+
+
+@pytest.fixture
+def creds(tmp_path):
+    fileName = str(tmp_path / 'creds.json')
+    with open(fileName, 'w') as f:
+        json.dump({'onshape_api': 'http://127.0.0.1:1', 'onshape_access_key': 'access',
+                   'onshape_secret_key': 'secret'}, f)
+    return fileName
+
+
+@pytest.fixture
+def robot_dir(tmp_path):
+    directory = str(tmp_path / 'robot')
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'config.json'), 'w') as f:
+        json.dump({
+            'onshape_api': 'http://127.0.0.1:1',
+            'onshape_access_key': 'access',
+            'onshape_secret_key': 'secret',
+            'documentId': DOCUMENT,
+            'assemblyName': 'robot',
+            'useScads': False,
+            'cacheDirectory': str(tmp_path / 'cache'),
+            'lockFile': True
+        }, f)
+    return directory
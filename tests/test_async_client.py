@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from onshape_to_robot.onshape_api.replay import ReplayServer
+
+from conftest import ASSEMBLY, DOCUMENT, MICROVERSION, PARTS, PARTS_ELEMENT, PARTS_MICROVERSION, stl
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from onshape_to_robot.onshape_api.async_client import AsyncClient  # noqa: E402
+from onshape_to_robot.onshape_api.scheduler import FAILED  # noqa: E402
+
+
+async def fetch(creds, url, cache_dir, max_retries=5):
+    async with AsyncClient(logging=False, creds=creds, cache_dir=cache_dir, max_retries=max_retries) as client:
+        client._api._url = url
+        client._scheduler.base_delay = 0.001
+        client.useCollisionsConfigurations = False
+        assemblies = await asyncio.gather(*[client.get_assembly(DOCUMENT, MICROVERSION, ASSEMBLY, type='m')
+                                            for _ in range(4)])
+        paths = await asyncio.gather(*[client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, partId)
+                                       for partId in PARTS])
+        return assemblies[0], paths
+
+
+def test_cached_like_the_client(replay, creds, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    assembly, paths = asyncio.run(fetch(creds, replay.url, cache_dir))
+    assert len(assembly['rootAssembly']['instances']) == len(PARTS)
+    with open(paths[1], 'rb') as f:
+        assert f.read() == stl(2)
+    requests = replay.stats['requests']
+
+    # Identical concurrent calls were sent once, and are then served by the cache
+    assert asyncio.run(fetch(creds, replay.url, cache_dir))[0] == assembly
+    assert replay.stats['requests'] == requests
+
+
+def test_throttled_requests_are_retried(fixtures_dir, creds, tmp_path):
+    with ReplayServer(fixtures_dir, throttle_rate=0.5, retry_after=0, seed=1) as server:
+        assembly, _ = asyncio.run(fetch(creds, server.url, str(tmp_path / 'cache'), max_retries=20))
+        assert server.stats['throttled'] > 0
+        assert len(assembly['rootAssembly']['instances']) == len(PARTS)
+
+
+async def cancel_waiting_request(creds, cache_dir):
+    async with AsyncClient(logging=False, creds=creds, cache_dir=cache_dir, max_connections=1) as client:
+        scheduler = client._scheduler
+        scheduler.acquire()
+        task = asyncio.ensure_future(client._acquire())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        scheduler.release(FAILED)
+
+        # The slot can be taken again
+        await asyncio.wait_for(client._acquire(), 1)
+        scheduler.release(FAILED)
+        return scheduler._active
+
+
+def test_cancelled_acquire_keeps_no_slot(creds, tmp_path):
+    assert asyncio.run(cancel_waiting_request(creds, str(tmp_path))) == 0
+
+
+class FailingSession():
+    def __init__(self, error):
+        self.error = error
+
+    async def request(self, *args, **kwargs):
+        raise self.error
+
+
+async def send_failing_request(creds, cache_dir, error):
+    async with AsyncClient(logging=False, creds=creds, cache_dir=cache_dir) as client:
+        client._get_session = lambda: FailingSession(error)
+        with pytest.raises(type(error)):
+            await client._send('GET', 'http://localhost/', '/', {}, {}, b'')
+        return client._scheduler._active
+
+
+def test_unexpected_errors_release_the_slot(creds, tmp_path):
+    cache_dir = str(tmp_path)
+    assert asyncio.run(send_failing_request(creds, cache_dir, aiohttp.ClientPayloadError('truncated'))) == 0
+    assert asyncio.run(send_failing_request(creds, cache_dir, asyncio.CancelledError())) == 0
+
+
+async def fill_locked_entry(creds, cache_dir, cancel):
+    async with AsyncClient(logging=False, creds=creds, cache_dir=cache_dir) as client:
+        store = client._cache
+        key = (DOCUMENT, 'm', PARTS_MICROVERSION, PARTS_ELEMENT, 'p', 'default')
+        # Held as another process filling the entry would
+        lock = store.lock('metadata', key)
+        lock.__enter__()
+
+        calls = []
+
+        async def callback():
+            calls.append(key)
+            return b'fetched'
+
+        async def hold():
+            async with client._entry_lock('metadata', key):
+                calls.append(key)
+
+        task = asyncio.ensure_future(hold() if cancel else client.cache_get('metadata', key, callback))
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        if cancel:
+            task.cancel()
+            await asyncio.sleep(0.01)
+        store.put('metadata', key, b'filled')
+        lock.__exit__(None, None, None)
+
+        if cancel:
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            # Taken by the waiting thread, the lock was then given back
+            def take():
+                with store.lock('metadata', key):
+                    pass
+            await asyncio.wait_for(asyncio.to_thread(take), 1)
+            return None, calls
+
+        return await task, calls
+
+
+def test_fill_waits_for_the_entry_lock(creds, tmp_path):
+    assert asyncio.run(fill_locked_entry(creds, str(tmp_path), False)) == (b'filled', [])
+
+
+def test_cancelled_lock_wait_releases_the_lock(creds, tmp_path):
+    assert asyncio.run(fill_locked_entry(creds, str(tmp_path), True)) == (None, [])
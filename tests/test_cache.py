@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import time
+
+from onshape_to_robot.onshape_api import cache, codec
+from onshape_to_robot.onshape_api.cache import CacheStore, entry_key
+
+JSON = b'{"key": "value"}' * 100
+MESH = os.urandom(1000)
+
+
+def test_put_get(tmp_path):
+    store = CacheStore(str(tmp_path))
+    assert store.get('assembly', ('D', 'm', 'M')) is None
+
+    store.put('assembly', ('D', 'm', 'M'), JSON, {'etag': '"1"'})
+    assert store.get('assembly', ('D', 'm', 'M')) == JSON
+    assert store.get('assembly', ('D', 'm', 'M'), with_meta=True) == (JSON, {'etag': '"1"'})
+    assert store.contains('assembly', ('D', 'm', 'M'))
+    assert store.contains_many('assembly', [('D', 'm', 'M'), ('D', 'm', 'X')]) == {('D', 'm', 'M')}
+
+    store.remove('assembly', ('D', 'm', 'M'))
+    assert store.get('assembly', ('D', 'm', 'M')) is None
+    assert store.stats()['blobs'] == 0
+
+
+def test_identical_contents_are_stored_once(tmp_path):
+    store = CacheStore(str(tmp_path))
+    first = store.put('part_stl', ('D', 'm', 'M', 'a'), MESH)
+    second = store.put('part_stl', ('D', 'm', 'M', 'b'), MESH)
+    assert first == second
+    stats = store.stats()
+    assert (stats['entries'], stats['blobs'], stats['size']) == (2, 1, len(MESH))
+
+
+def test_missing_blob_is_a_miss(tmp_path):
+    store = CacheStore(str(tmp_path))
+    path = store.put('part_stl', ('D', 'm', 'M', 'a'), MESH)
+    os.remove(path)
+    assert store.path('part_stl', ('D', 'm', 'M', 'a')) is None
+    assert not store.contains('part_stl', ('D', 'm', 'M', 'a'))
+
+
+def test_writes_dont_evict(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'ACCESS_GRANULARITY', 0.)
+    store = CacheStore(str(tmp_path), max_size=1500)
+    paths = [store.put('part_stl', ('D', 'm', 'M', str(index)), os.urandom(1000)) for index in range(3)]
+    assert all(os.path.exists(path) for path in paths)
+
+    # Least recently used first
+    store.get('part_stl', ('D', 'm', 'M', '0'))
+    assert store.trim() == 2
+    assert store.contains('part_stl', ('D', 'm', 'M', '0'))
+    assert store.size() <= 1500
+
+
+def test_evict_keeps_entries_in_use(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'ACCESS_GRANULARITY', 0.)
+    store = CacheStore(str(tmp_path), max_size=1500)
+    store.put('part_stl', ('D', 'm', 'M', 'old'), os.urandom(1000))
+    time.sleep(0.01)
+    started = time.time()
+    store.put('part_stl', ('D', 'm', 'M', 'a'), os.urandom(1000))
+    store.put('part_stl', ('D', 'm', 'M', 'b'), os.urandom(1000))
+
+    assert store.trim(accessed_before=started) == 1
+    assert store.contains_many('part_stl', [('D', 'm', 'M', key) for key in ['old', 'a', 'b']]) == \
+        {('D', 'm', 'M', 'a'), ('D', 'm', 'M', 'b')}
+
+
+def last_access(tmp_path):
+    db = sqlite3.connect(str(tmp_path / 'index.sqlite'))
+    value = db.execute('SELECT last_access FROM entries').fetchone()[0]
+    db.close()
+    return value
+
+
+def test_hits_write_the_access_time_coarsely(tmp_path):
+    store = CacheStore(str(tmp_path), max_size=1500)
+    store.put('part_stl', ('D', 'm', 'M', 'a'), os.urandom(1000))
+    written = last_access(tmp_path)
+    time.sleep(0.01)
+    started = time.time()
+    assert store.get('part_stl', ('D', 'm', 'M', 'a')) is not None
+    assert last_access(tmp_path) == written
+
+    # Accessed within the granularity of the start, the entry is in use
+    store.put('part_stl', ('D', 'm', 'M', 'b'), os.urandom(1000))
+    assert store.trim(accessed_before=started) == 0
+
+
+def test_entry_keys_dont_depend_on_the_codec(monkeypatch):
+    key = ('D', 'm', 'M', 'p\u00e9', 1)
+    expected = '["part_stl","D","m","M","p\u00e9",1]'
+    assert entry_key('part_stl', key) == expected
+    monkeypatch.setattr(codec, 'orjson', None)
+    assert entry_key('part_stl', key) == expected
+
+
+def test_spaced_keys_are_migrated(tmp_path):
+    store = CacheStore(str(tmp_path))
+    store.put('assembly', ('D', 'm', 'M', 'A'), JSON)
+    store.put('assembly', ('D', 'w', 'W', 'A'), JSON)
+
+    # As written by the standard json backend, before the keys were canonical
+    db = sqlite3.connect(str(tmp_path / 'index.sqlite'))
+    db.execute("UPDATE entries SET key = replace(key, '\",\"', '\", \"')")
+    db.execute('PRAGMA user_version = 0')
+    db.commit()
+    db.close()
+
+    store = CacheStore(str(tmp_path))
+    assert store.get('assembly', ('D', 'm', 'M', 'A')) == JSON
+    assert len(store.select(element='A')) == 2
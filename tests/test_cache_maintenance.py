@@ -0,0 +1,77 @@
+import os
+
+from onshape_to_robot.onshape_api.cache import CacheStore, entry_key
+
+JSON = b'{"key": "value"}' * 100
+MESH = os.urandom(1000)
+
+
+def test_verify(tmp_path):
+    store = CacheStore(str(tmp_path))
+    corrupted = store.put('part_stl', ('D', 'm', 'M', 'a'), MESH)
+    missing = store.put('part_stl', ('D', 'm', 'M', 'b'), os.urandom(100))
+    store.put('assembly', ('D', 'm', 'M'), JSON)
+    with open(corrupted, 'r+b') as f:
+        f.write(b'corrupted')
+    os.remove(missing)
+    orphan = store.blob_path('0' * 64)
+    os.makedirs(os.path.dirname(orphan), exist_ok=True)
+    with open(orphan, 'wb') as f:
+        f.write(b'orphan')
+
+    report = store.verify()
+    assert report['checked'] == 3
+    assert report['corrupted'] == [os.path.basename(corrupted)]
+    assert report['missing'] == [os.path.basename(missing)]
+    assert report['orphans'] == ['0' * 64]
+
+    store.verify(fix=True)
+    report = store.verify()
+    assert (report['checked'], report['corrupted'], report['missing'], report['orphans']) == (1, [], [], [])
+    assert store.get('assembly', ('D', 'm', 'M')) == JSON
+    assert not store.contains('part_stl', ('D', 'm', 'M', 'a'))
+
+
+def test_export_import(tmp_path):
+    source = CacheStore(str(tmp_path / 'source'))
+    source.put('assembly', ('D', 'm', 'M'), JSON, {'etag': '"1"'})
+    source.put('part_stl', ('D', 'm', 'M', 'a'), MESH)
+    source.put('part_stl', ('E', 'm', 'M', 'a'), MESH)
+
+    archive = str(tmp_path / 'cache.tar.gz')
+    assert source.export_archive(archive, source.select(document='D')) == 2
+
+    target = CacheStore(str(tmp_path / 'target'))
+    assert target.import_archive(archive) == 2
+    assert target.get('assembly', ('D', 'm', 'M'), with_meta=True) == (JSON, {'etag': '"1"'})
+    with open(target.path('part_stl', ('D', 'm', 'M', 'a')), 'rb') as f:
+        assert f.read() == MESH
+    assert not target.contains('part_stl', ('E', 'm', 'M', 'a'))
+    assert target.verify()['corrupted'] == []
+
+
+def test_select(tmp_path):
+    store = CacheStore(str(tmp_path))
+    store.put('assembly', ('D', 'w', 'W', 'A'), JSON)
+    store.put('assembly', ('D', 'm', 'M', 'A'), JSON)
+    store.put('part_stl', ('D', 'm', 'M', 'B'), MESH)
+
+    assert sorted(store.select(workspace=True)) == [entry_key('assembly', ('D', 'w', 'W', 'A'))]
+    assert len(store.select(element='A')) == 2
+    assert store.select(endpoint='part_stl') == [entry_key('part_stl', ('D', 'm', 'M', 'B'))]
+    assert store.remove_entries(store.select(endpoint='part_stl')) == len(MESH)
+
+
+def test_stats(tmp_path):
+    store = CacheStore(str(tmp_path))
+    store.put('assembly', ('D', 'm', 'M'), JSON)
+    store.put('part_stl', ('D', 'm', 'M', 'a'), MESH)
+    store.put('part_stl', ('E', 'm', 'M', 'a'), MESH)
+
+    stats = store.stats()
+    assert (stats['entries'], stats['blobs']) == (3, 2)
+    assert stats['rawSize'] == len(JSON) + len(MESH)
+    assert stats['size'] < stats['rawSize']
+    assert stats['endpoints']['part_stl']['entries'] == 2
+    assert stats['documents']['D']['entries'] == 2
+    assert sum(age['entries'] for age in stats['ages'].values()) == 3
@@ -0,0 +1,39 @@
+import os
+import stat
+
+import pytest
+
+from onshape_to_robot.onshape_api.cache import CacheStore
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason='POSIX permissions')
+
+
+def group_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode) & 0o070
+
+
+def test_files_are_writable_by_the_group(tmp_path):
+    umask = os.umask(0o077)
+    try:
+        root = str(tmp_path / 'cache')
+        store = CacheStore(root)
+        path = store.put('assembly', ('D', 'm', 'M', 'A'), b'{}' * 100)
+        with store.lock('assembly', ('D', 'm', 'M', 'A')):
+            pass
+    finally:
+        os.umask(umask)
+
+    for directory in [root, os.path.join(root, 'blobs'), os.path.join(root, 'tmp'), os.path.dirname(path)]:
+        assert group_mode(directory) == 0o070
+    assert group_mode(os.path.join(root, 'index.sqlite')) == 0o060
+    assert group_mode(path) == 0o060
+    for directory, _, files in os.walk(os.path.join(root, 'locks')):
+        for name in files:
+            assert group_mode(os.path.join(directory, name)) == 0o060
+
+
+def test_stores_share_entries(tmp_path):
+    first = CacheStore(str(tmp_path))
+    second = CacheStore(str(tmp_path))
+    first.put('assembly', ('D', 'm', 'M', 'A'), b'{}')
+    assert second.get('assembly', ('D', 'm', 'M', 'A')) == b'{}'
@@ -0,0 +1,54 @@
+import pytest
+
+from onshape_to_robot.onshape_api import cache
+
+from conftest import DOCUMENT, PARTS, PARTS_ELEMENT, PARTS_MICROVERSION, fetch_parts, make_client, stl
+
+
+def test_cold_then_warm(replay, creds, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    client = make_client(creds, replay.url, cache_dir)
+    client.useCollisionsConfigurations = False
+    paths, _ = fetch_parts(client)
+    cold = replay.stats['requests']
+    assert cold > 0
+    for index, path in enumerate(paths):
+        with open(path, 'rb') as f:
+            assert f.read() == stl(index + 1)
+
+    # A new client (e.g. the next export) is served by the on-disk cache
+    client = make_client(creds, replay.url, cache_dir)
+    client.useCollisionsConfigurations = False
+    assert fetch_parts(client)[0] == paths
+    assert replay.stats['requests'] == cold
+    assert replay.stats['missing'] == 0
+
+
+def test_evicted_blob_is_fetched_again(replay, creds, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'ACCESS_GRANULARITY', 0.)
+    cache_dir = str(tmp_path / 'cache')
+    client = make_client(creds, replay.url, cache_dir, cache_max_size=100)
+    client.useCollisionsConfigurations = False
+    paths, _ = fetch_parts(client)
+
+    # The cache is over its size, but the entries used by the client are kept
+    assert client.trim_cache() == 0
+    assert client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, PARTS[0]) == paths[0]
+
+    # Evicted by another client, the memoized path is resolved again
+    other = make_client(creds, replay.url, cache_dir, cache_max_size=100)
+    assert other.trim_cache() > 0
+    requests = replay.stats['requests']
+    path = client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, PARTS[0])
+    with open(path, 'rb') as f:
+        assert f.read() == stl(1)
+    assert replay.stats['requests'] > requests
+
+
+def test_missing_fixture_raises(replay, creds, tmp_path):
+    from onshape_to_robot.onshape_api.onshape import OnshapeError
+
+    client = make_client(creds, replay.url, str(tmp_path / 'cache'))
+    with pytest.raises(OnshapeError) as error:
+        client.part_get_metadata(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, 'unknown')
+    assert error.value.status == 404
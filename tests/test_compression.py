@@ -0,0 +1,129 @@
+import hashlib
+import os
+
+import pytest
+
+from onshape_to_robot.onshape_api import cache
+from onshape_to_robot.onshape_api.cache import CacheStore, decompress
+
+JSON = b'{"key": "value"}' * 100
+# A compressible mesh, ASCII STLs are
+STL = b''.join(b'facet normal 0 0 %d\n' % index for index in range(500))
+NOISE = os.urandom(1000)
+
+
+def test_compressible_contents_are_compressed(tmp_path):
+    store = CacheStore(str(tmp_path))
+    store.put('assembly', ('D', 'm', 'M'), JSON)
+    store.put('part_stl', ('D', 'm', 'M', 'a'), STL)
+    store.put('part_stl', ('D', 'm', 'M', 'b'), NOISE)
+    stats = store.stats()
+    assert stats['endpoints']['assembly']['size'] < len(JSON)
+    assert stats['endpoints']['assembly']['rawSize'] == len(JSON)
+    # Incompressible contents are stored raw
+    assert stats['endpoints']['part_stl']['size'] < len(STL) + len(NOISE)
+    assert stats['endpoints']['part_stl']['rawSize'] == len(STL) + len(NOISE)
+    assert store.path('part_stl', ('D', 'm', 'M', 'b')) == store.blob_path(os.path.basename(
+        store.path('part_stl', ('D', 'm', 'M', 'b'))))
+
+
+def test_path_of_compressed_entry(tmp_path):
+    store = CacheStore(str(tmp_path))
+    store.put('assembly', ('D', 'm', 'M'), JSON)
+    size = store.size()
+
+    path = store.path('assembly', ('D', 'm', 'M'))
+    with open(path, 'rb') as f:
+        assert f.read() == JSON
+    # The blob stays compressed, its copy is counted
+    assert store.size() == size + len(JSON)
+    assert store.stats()['copies'] == 1
+    assert store.get('assembly', ('D', 'm', 'M')) == JSON
+
+    store.remove('assembly', ('D', 'm', 'M'))
+    assert not os.path.exists(path)
+    assert store.size() == 0
+
+
+def test_streamed_meshes_keep_their_raw_file(tmp_path):
+    store = CacheStore(str(tmp_path))
+    path = store.put_stream('part_stl', ('D', 'm', 'M', 'a'), iter([STL[:1000], STL[1000:]]))
+    with open(path, 'rb') as f:
+        assert f.read() == STL
+    assert path == store.path('part_stl', ('D', 'm', 'M', 'a'))
+
+    digest = os.path.basename(path)
+    with open(store.blob_path(digest), 'rb') as f:
+        blob = f.read()
+    assert len(blob) < len(STL)
+    stats = store.stats()
+    assert (stats['copies'], stats['copySize']) == (1, len(STL))
+    assert store.size() == len(blob) + len(STL)
+    assert os.listdir(str(tmp_path / 'tmp')) == []
+
+
+def test_trim_removes_the_copies_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'ACCESS_GRANULARITY', 0.)
+    store = CacheStore(str(tmp_path))
+    paths = [store.put_stream('part_stl', ('D', 'm', 'M', str(index)), iter([STL + str(index).encode()]))
+             for index in range(2)]
+    blobs = store.size() - store.stats()['copySize']
+
+    # The copy of the least recently used entry goes first, no entry is removed
+    store.path('part_stl', ('D', 'm', 'M', '1'))
+    assert store.evict(store.size() - 1, slack=1.) == 0
+    assert not os.path.exists(paths[0])
+    assert os.path.exists(paths[1])
+    assert store.get('part_stl', ('D', 'm', 'M', '0')) == STL + b'0'
+
+    # Once the copies are gone, the entries are evicted
+    assert store.evict(blobs, slack=1.) == 0
+    assert store.stats()['copies'] == 0
+    assert store.evict(blobs - 1, slack=1.) == 1
+
+    assert store.contains_many('part_stl', [('D', 'm', 'M', '0'), ('D', 'm', 'M', '1')]) == {('D', 'm', 'M', '0')}
+
+    # The copy is made again when the entry is used as a file
+    path = store.path('part_stl', ('D', 'm', 'M', '0'))
+    with open(path, 'rb') as f:
+        assert f.read() == STL + b'0'
+
+
+def test_copies_in_use_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'ACCESS_GRANULARITY', 0.)
+    store = CacheStore(str(tmp_path))
+    path = store.put_stream('part_stl', ('D', 'm', 'M', 'a'), iter([STL]))
+    assert store.evict(0, accessed_before=0.) == 0
+    assert os.path.exists(path)
+
+
+def test_verify_corrupted_copy(tmp_path):
+    store = CacheStore(str(tmp_path))
+    path = store.put_stream('part_stl', ('D', 'm', 'M', 'a'), iter([STL]))
+    # For instance a hardlinked mesh edited in the output directory
+    with open(path, 'ab') as f:
+        f.write(b'edited')
+
+    report = store.verify(fix=True)
+    assert report['corruptedCopies'] == [os.path.basename(path)]
+    assert report['corrupted'] == []
+    assert store.stats()['copies'] == 0
+    with open(store.path('part_stl', ('D', 'm', 'M', 'a')), 'rb') as f:
+        assert f.read() == STL
+    assert store.verify()['corruptedCopies'] == []
+
+
+def test_truncated_blob_is_a_miss(tmp_path):
+    store = CacheStore(str(tmp_path))
+    store.put('assembly', ('D', 'm', 'M'), JSON)
+    blobPath = store.blob_path(hashlib.sha256(JSON).hexdigest())
+    with open(blobPath, 'rb') as f:
+        blob = f.read()
+    with pytest.raises(ValueError):
+        decompress(blob[:len(blob) // 2], cache.DEFAULT_COMPRESSION)
+
+    with open(blobPath, 'wb') as f:
+        f.write(blob[:len(blob) // 2])
+    assert store.verify()['corrupted'] == [os.path.basename(blobPath)]
+    assert store.get('assembly', ('D', 'm', 'M')) is None
+    assert not store.contains('assembly', ('D', 'm', 'M'))
@@ -0,0 +1,50 @@
+import json
+import os
+
+from onshape_to_robot.onshape_to_robot import export
+from onshape_to_robot.onshape_api.replay import ReplayServer
+
+from conftest import MICROVERSION, write_fixture
+
+VERSION = '9' * 24
+
+
+def test_export_cold_then_warm(replay, robot_dir):
+    export(robot_dir, base_url=replay.url)
+    cold = replay.stats['requests']
+    assert replay.stats['missing'] == 0
+    for fileName in ['robot.urdf', 'part_1.stl', 'part_2.stl']:
+        assert os.path.exists(os.path.join(robot_dir, fileName))
+
+    # Only the current microversion of the workspace is checked
+    export(robot_dir, base_url=replay.url)
+    assert replay.stats['requests'] - cold == 1
+
+
+def test_version_export_is_fully_cached(fixtures_dir, robot_dir):
+    # The version holds the same assembly as the microversion
+    for name in os.listdir(fixtures_dir):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(fixtures_dir, name)) as f:
+            description = json.load(f)
+        if '/m/' + MICROVERSION in description['path']:
+            with open(os.path.join(fixtures_dir, name[:-len('.json')] + '.body'), 'rb') as f:
+                body = f.read()
+            write_fixture(fixtures_dir, description['path'].replace('/m/' + MICROVERSION, '/v/' + VERSION),
+                          description['query'], body, description['headers'])
+    with open(os.path.join(robot_dir, 'config.json')) as f:
+        config = json.load(f)
+    config['versionId'] = VERSION
+    with open(os.path.join(robot_dir, 'config.json'), 'w') as f:
+        json.dump(config, f)
+
+    with ReplayServer(fixtures_dir) as server:
+        export(robot_dir, base_url=server.url)
+        assert server.stats['missing'] == 0
+        requests = server.stats['requests']
+
+        # Versions never change, nothing is checked
+        export(robot_dir, base_url=server.url)
+        assert server.stats['requests'] == requests
+
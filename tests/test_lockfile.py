@@ -0,0 +1,38 @@
+import json
+import os
+
+import pytest
+
+from onshape_to_robot.onshape_to_robot import export
+from onshape_to_robot.lockfile import fileName as lockFileName
+
+from conftest import MICROVERSION, PARTS
+
+
+def test_locked_export_makes_no_request(replay, robot_dir):
+    export(robot_dir, base_url=replay.url)
+    with open(os.path.join(robot_dir, lockFileName)) as f:
+        lock = json.load(f)
+    assert lock['microversion'] == MICROVERSION
+    assert sorted(part[3] for part in lock['parts']) == PARTS
+
+    requests = replay.stats['requests']
+    export(robot_dir, base_url=replay.url, locked=True)
+    assert replay.stats['requests'] == requests
+
+
+def test_locked_export_needs_lockfile(replay, robot_dir):
+    with pytest.raises(Exception, match=lockFileName):
+        export(robot_dir, base_url=replay.url, locked=True)
+
+
+def test_lockfile_must_match_the_config(replay, robot_dir):
+    export(robot_dir, base_url=replay.url)
+    with open(os.path.join(robot_dir, 'config.json')) as f:
+        config = json.load(f)
+    config['assemblyName'] = 'other'
+    with open(os.path.join(robot_dir, 'config.json'), 'w') as f:
+        json.dump(config, f)
+
+    with pytest.raises(Exception, match='match'):
+        export(robot_dir, base_url=replay.url, locked=True)
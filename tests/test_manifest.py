@@ -0,0 +1,33 @@
+import os
+
+from onshape_to_robot.manifest import BuildManifest, fingerprint
+
+
+def test_fingerprint():
+    data = [['D', 'M', 'E', 'JHD', 'default'], True, {'mass': 1.5}]
+    assert fingerprint(data) == fingerprint([list(item) if isinstance(item, list) else item for item in data])
+    assert len(fingerprint(data)) == 64
+    assert fingerprint(data) != fingerprint([['D', 'M', 'E', 'JKD', 'default'], True, {'mass': 1.5}])
+    assert fingerprint(('a', 1)) == fingerprint(['a', 1])
+
+
+def test_unchanged_links(tmp_path):
+    directory = str(tmp_path)
+    with open(os.path.join(directory, 'link.stl'), 'wb') as f:
+        f.write(b'merged mesh')
+
+    manifest = BuildManifest(directory)
+    assert not manifest.unchanged('link', 'inputs', 'link.stl')
+    manifest.record('link', 'inputs', 'link.stl')
+    manifest.save()
+
+    manifest = BuildManifest(directory)
+    assert manifest.unchanged('link', 'inputs', 'link.stl')
+    assert not manifest.unchanged('link', 'other inputs', 'link.stl')
+    assert not manifest.unchanged('other', 'inputs', 'link.stl')
+    # Changed, or removed, in the output directory
+    with open(os.path.join(directory, 'link.stl'), 'wb') as f:
+        f.write(b'edited merged mesh')
+    assert not manifest.unchanged('link', 'inputs', 'link.stl')
+    os.remove(os.path.join(directory, 'link.stl'))
+    assert not manifest.unchanged('link', 'inputs', 'link.stl')
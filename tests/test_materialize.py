@@ -0,0 +1,76 @@
+import os
+
+from onshape_to_robot.manifest import BuildManifest
+from onshape_to_robot.materialize import materialize
+
+
+def write(fileName, data):
+    with open(fileName, 'wb') as f:
+        f.write(data)
+
+
+def read(fileName):
+    with open(fileName, 'rb') as f:
+        return f.read()
+
+
+def test_materialize(tmp_path):
+    directory = str(tmp_path / 'output')
+    os.makedirs(directory)
+    source = str(tmp_path / 'source.stl')
+    write(source, b'mesh')
+
+    assert materialize(source, directory, 'part.stl')
+    assert read(os.path.join(directory, 'part.stl')) == b'mesh'
+    assert not os.path.samefile(source, os.path.join(directory, 'part.stl'))
+    # Same content, nothing is written
+    assert not materialize(source, directory, 'part.stl')
+
+    other = str(tmp_path / 'other.stl')
+    write(other, b'other mesh')
+    assert materialize(other, directory, 'part.stl')
+    assert read(os.path.join(directory, 'part.stl')) == b'other mesh'
+    assert not os.path.exists(os.path.join(directory, 'part.stl.tmp'))
+
+
+def test_materialize_hardlink(tmp_path):
+    directory = str(tmp_path)
+    source = str(tmp_path / 'source.stl')
+    write(source, b'mesh')
+
+    assert materialize(source, directory, 'part.stl', link=True)
+    assert os.path.samefile(source, os.path.join(directory, 'part.stl'))
+
+
+def test_manifest_skips_materialized_files(tmp_path):
+    directory = str(tmp_path)
+    source = str(tmp_path / 'source.stl')
+    write(source, b'mesh')
+
+    manifest = BuildManifest(directory)
+    assert materialize(source, directory, 'part.stl', manifest=manifest)
+    assert not materialize(source, directory, 'part.stl', manifest=manifest)
+    write(os.path.join(directory, 'part.stl'), b'edited mesh')
+    assert materialize(source, directory, 'part.stl', manifest=manifest)
+    assert read(os.path.join(directory, 'part.stl')) == b'mesh'
+
+
+def test_materialized_files(tmp_path):
+    directory = str(tmp_path)
+    source = str(tmp_path / 'source.stl')
+    with open(source, 'wb') as f:
+        f.write(b'mesh')
+    with open(os.path.join(directory, 'part.stl'), 'wb') as f:
+        f.write(b'mesh')
+
+    manifest = BuildManifest(directory)
+    assert not manifest.materialized('part.stl', source)
+    manifest.recordMaterialized('part.stl', source)
+    manifest.save()
+
+    manifest = BuildManifest(directory)
+    assert manifest.materialized('part.stl', source)
+    # Changed in the output directory
+    with open(os.path.join(directory, 'part.stl'), 'wb') as f:
+        f.write(b'edited mesh')
+    assert not manifest.materialized('part.stl', source)
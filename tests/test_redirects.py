@@ -0,0 +1,34 @@
+import time
+
+from conftest import DOCUMENT, PARTS, PARTS_ELEMENT, PARTS_MICROVERSION, make_client
+
+
+def test_redirect_target_is_remembered(replay, creds, tmp_path):
+    client = make_client(creds, replay.url, str(tmp_path / 'cache'))
+    client.useCollisionsConfigurations = False
+    for partId in PARTS:
+        client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, partId)
+
+    # Only the first mesh download goes through the 307 hop
+    assert replay.stats['redirected'] == 1
+    summary = client.metrics_summary(table=False)['requests']
+    assert sum(entry['redirects'] for entry in summary.values()) == 1
+
+
+def test_redirects_disabled(replay, creds, tmp_path):
+    client = make_client(creds, replay.url, str(tmp_path / 'cache'), redirect_ttl=0)
+    client.useCollisionsConfigurations = False
+    for partId in PARTS:
+        client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, partId)
+
+    assert replay.stats['redirected'] == len(PARTS)
+
+
+def test_expired_redirect_is_followed_again(replay, creds, tmp_path):
+    client = make_client(creds, replay.url, str(tmp_path / 'cache'), redirect_ttl=0.05)
+    client.useCollisionsConfigurations = False
+    client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, PARTS[0])
+    time.sleep(0.1)
+    client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, PARTS[1])
+
+    assert replay.stats['redirected'] == 2
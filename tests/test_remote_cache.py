@@ -0,0 +1,56 @@
+from onshape_to_robot.onshape_api import codec
+from onshape_to_robot.onshape_api.cache import CacheStore
+from onshape_to_robot.onshape_api.remote_cache import CacheServer, HttpCache, TieredCache
+
+from conftest import DOCUMENT, PARTS, PARTS_ELEMENT, PARTS_MICROVERSION, fetch_parts, make_client
+
+MESH = b'mesh' * 100
+
+
+def test_shared_entries(tmp_path):
+    with CacheServer(str(tmp_path / 'server')) as server:
+        first = TieredCache(CacheStore(str(tmp_path / 'first')), HttpCache(server.url))
+        first.put('part_stl', ('D', 'm', 'M', 'a'), MESH)
+        first.put('assembly', ('D', 'w', 'W', 'A'), b'{}')
+        first.close()
+
+        second = TieredCache(CacheStore(str(tmp_path / 'second')), HttpCache(server.url))
+        # Only the entries of versions and microversions are shared
+        assert second.contains_many('part_stl', [('D', 'm', 'M', 'a'), ('D', 'm', 'M', 'b')]) == \
+            {('D', 'm', 'M', 'a')}
+        assert not second.contains('assembly', ('D', 'w', 'W', 'A'))
+
+        with open(second.path('part_stl', ('D', 'm', 'M', 'a')), 'rb') as f:
+            assert f.read() == MESH
+        assert second.local.contains('part_stl', ('D', 'm', 'M', 'a'))
+        second.close()
+
+
+def test_unavailable_server(tmp_path, capsys):
+    cache = TieredCache(CacheStore(str(tmp_path)), HttpCache('http://127.0.0.1:1', timeout=1))
+    assert cache.get('part_stl', ('D', 'm', 'M', 'a')) is None
+    assert cache.contains_many('part_stl', [('D', 'm', 'M', 'a')]) == set()
+    cache.put('part_stl', ('D', 'm', 'M', 'a'), MESH)
+    assert cache.get('part_stl', ('D', 'm', 'M', 'a')) == MESH
+    cache.close()
+    assert 'not available' in capsys.readouterr().out
+
+
+def test_uploads_are_flushed_when_the_client_is_done(replay, creds, tmp_path):
+    with CacheServer(str(tmp_path / 'server')) as server:
+        client = make_client(creds, replay.url, str(tmp_path / 'cache'), cache_server=server.url)
+        client.useCollisionsConfigurations = False
+        fetch_parts(client)
+        client.trim_cache()
+
+        assert client._cache._pending == set()
+        keys = [(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, client.hash_partid(partId), 'default')
+                for partId in PARTS]
+        assert HttpCache(server.url).contains_many('part_stl', keys) == set(keys)
+
+
+def test_entry_paths_dont_depend_on_the_codec(monkeypatch):
+    cache = HttpCache('http://127.0.0.1:1')
+    path = cache.entry_path('part_stl', ('D', 'm', 'M', 'a'))
+    monkeypatch.setattr(codec, 'orjson', None)
+    assert cache.entry_path('part_stl', ('D', 'm', 'M', 'a')) == path
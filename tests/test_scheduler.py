@@ -0,0 +1,97 @@
+import email.utils
+import time
+
+import pytest
+import requests
+
+from onshape_to_robot.onshape_api.replay import ReplayServer
+from onshape_to_robot.onshape_api.scheduler import (RequestScheduler, parse_retry_after, status_outcome,
+                                                    SUCCEEDED, THROTTLED, FAILED)
+
+from conftest import PARTS, fetch_parts, make_client, stl
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after('3') == 3.
+    assert parse_retry_after('1.5') == 1.5
+    assert parse_retry_after('-2') == 0.
+
+
+def test_parse_retry_after_date():
+    date = email.utils.formatdate(time.time() + 10, usegmt=True)
+    assert parse_retry_after(date) == pytest.approx(10, abs=2)
+    assert parse_retry_after(email.utils.formatdate(time.time() - 10, usegmt=True)) == 0.
+
+
+def test_parse_retry_after_invalid():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+
+
+def test_status_outcome():
+    assert status_outcome(200) == SUCCEEDED
+    assert status_outcome(404) == SUCCEEDED
+    assert status_outcome(429) == THROTTLED
+    for status in [500, 502, 503, 504]:
+        assert status_outcome(status) == FAILED
+
+
+def release(scheduler, outcome):
+    scheduler.acquire()
+    scheduler.release(outcome)
+    return scheduler.concurrency_limit()
+
+
+def test_concurrency_limit():
+    scheduler = RequestScheduler(max_concurrency=8)
+    assert release(scheduler, THROTTLED) == 4
+    assert release(scheduler, THROTTLED) == 2
+
+    # Server and transport errors don't raise the limit
+    for _ in range(10):
+        assert release(scheduler, FAILED) == 2
+
+    for _ in range(10):
+        release(scheduler, SUCCEEDED)
+    assert scheduler.concurrency_limit() > 2
+    assert scheduler.throttled == 2
+
+
+def test_retry_delay_pauses_all_callers():
+    scheduler = RequestScheduler(base_delay=0.)
+    assert scheduler.retry_delay(0, '0.2') == pytest.approx(0.2)
+    start = time.monotonic()
+    scheduler.acquire()
+    scheduler.release(SUCCEEDED)
+    assert time.monotonic() - start >= 0.15
+    assert scheduler.retries == 1
+
+
+def test_throttled_requests_are_retried(fixtures_dir, creds, tmp_path):
+    with ReplayServer(fixtures_dir, throttle_rate=0.5, retry_after=0, seed=1) as server:
+        client = make_client(creds, server.url, str(tmp_path / 'cache'), max_retries=20)
+        client.useCollisionsConfigurations = False
+        scheduler = client._api._scheduler
+        scheduler.base_delay = 0.001
+
+        paths, metadata = fetch_parts(client)
+
+        assert server.stats['throttled'] > 0
+        assert scheduler.throttled == server.stats['throttled']
+        assert len(metadata) == len(PARTS)
+        with open(paths[0], 'rb') as f:
+            assert f.read() == stl(1)
+
+
+def test_unexpected_errors_release_the_slot(creds, tmp_path):
+    client = make_client(creds, 'http://127.0.0.1:1', str(tmp_path / 'cache'))
+    api = client._api
+
+    class FailingSession():
+        def request(self, *args, **kwargs):
+            raise requests.exceptions.ChunkedEncodingError('truncated')
+
+    api._session = lambda base_url: FailingSession()
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        api.request('get', '/api/documents')
+    assert api._scheduler._active == 0
@@ -0,0 +1,73 @@
+import struct
+
+import numpy as np
+
+from onshape_to_robot.onshape_api.replay import ReplayServer
+from onshape_to_robot.onshape_api.tessellation import body_facets, stl_bytes
+
+from conftest import DOCUMENT, PARTS, PARTS_ELEMENT, PARTS_MICROVERSION, make_client, stl, write_fixture
+
+
+def test_stl_bytes():
+    vertices = np.array([[[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+                         [[0, 0, 1], [1, 0, 1], [0, 1, 1]]], dtype=np.float32)
+    normals = np.array([[0, 0, 1], [0, 0, -1]], dtype=np.float32)
+    data = stl_bytes(vertices, normals)
+
+    assert len(data) == 80 + 4 + 2 * 50
+    assert struct.unpack('<I', data[80:84])[0] == 2
+    record = struct.unpack('<12fH', data[84:134])
+    assert record[:3] == (0., 0., 1.)
+    assert record[3:12] == (0., 0., 0., 1., 0., 0., 0., 1., 0.)
+    assert record[12] == 0
+    assert struct.unpack('<3f', data[134:146]) == (0., 0., -1.)
+
+
+def test_stl_bytes_empty():
+    data = stl_bytes(np.zeros((0, 3, 3)), np.zeros((0, 3)))
+    assert len(data) == 84
+    assert struct.unpack('<I', data[80:84])[0] == 0
+
+
+def test_body_facets():
+    body = {'faces': [
+        {'facets': [{'vertices': [[0, 0, 0], [1, 0, 0], [0, 1, 0]], 'normal': [0, 0, 1]}]},
+        {'facets': [{'vertices': [[0, 0, 1], [1, 0, 1], [0, 1, 1]]}]}
+    ]}
+    vertices, normals = body_facets(body)
+    assert vertices.shape == (2, 3, 3)
+    assert normals.tolist() == [[0, 0, 1], [0, 0, 0]]
+
+
+def tessellated_body(partId, z):
+    return {'id': partId, 'faces': [
+        {'facets': [{'vertices': [[0, 0, z], [1, 0, z], [0, 1, z]], 'normal': [0, 0, 1]}]}
+    ]}
+
+
+def test_tessellated_meshes_have_their_own_entries(fixtures_dir, creds, tmp_path):
+    # Only the first part is in the tessellation
+    write_fixture(fixtures_dir, '/api/partstudios/d/' + DOCUMENT + '/m/' + PARTS_MICROVERSION + '/e/' +
+                  PARTS_ELEMENT + '/tessellatedfaces', {'configuration': 'default'}, [tessellated_body(PARTS[0], 1)])
+    cache_dir = str(tmp_path / 'cache')
+
+    with ReplayServer(fixtures_dir) as server:
+        client = make_client(creds, server.url, cache_dir)
+        client.useCollisionsConfigurations = False
+        client.useTessellation = True
+        client.fetch_tessellated_group(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, 'default', PARTS)
+        paths = [client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, partId) for partId in PARTS]
+        with open(paths[0], 'rb') as f:
+            vertices, normals = body_facets(tessellated_body(PARTS[0], 1))
+            assert f.read() == stl_bytes(vertices, normals)
+        # Exported as STL, since it is missing from the tessellation
+        with open(paths[1], 'rb') as f:
+            assert f.read() == stl(2)
+        assets = [('stl', DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, partId, 'default') for partId in PARTS]
+        assert client.part_assets_cached(assets) == set(assets)
+
+        # The tessellated mesh doesn't stand for the STL export
+        client = make_client(creds, server.url, cache_dir)
+        client.useCollisionsConfigurations = False
+        with open(client.part_studio_stl_m(DOCUMENT, PARTS_MICROVERSION, PARTS_ELEMENT, PARTS[0]), 'rb') as f:
+            assert f.read() == stl(1)
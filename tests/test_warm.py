@@ -0,0 +1,22 @@
+from onshape_to_robot.onshape_to_robot import export, warm
+
+from conftest import PARTS
+
+
+def test_warm_fills_the_cache(replay, robot_dir):
+    report = warm(robot_dir, base_url=replay.url)
+    assert report['stl'] == {'cached': 0, 'fetched': len(PARTS)}
+
+    report = warm(robot_dir, base_url=replay.url)
+    assert report['stl'] == {'cached': len(PARTS), 'fetched': 0}
+
+    requests = replay.stats['requests']
+    export(robot_dir, base_url=replay.url)
+    assert replay.stats['requests'] - requests == 1
+
+
+def test_warm_report(replay, robot_dir):
+    report = warm(robot_dir, base_url=replay.url)
+    assert report['metadata'] == {'cached': 0, 'fetched': len(PARTS)}
+    assert report['massproperties'] == {'cached': 0, 'fetched': len(PARTS)}
+    assert replay.stats['missing'] == 0